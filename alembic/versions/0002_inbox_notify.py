@@ -0,0 +1,27 @@
+"""Trigger de NOTIFY em inserções na inbox (coalescência orientada a eventos)."""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "0002_inbox_notify"
+down_revision = "0001_init"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE OR REPLACE FUNCTION inbox_notify() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('inbox_new', NEW.conversation_id || ':' || NEW.id);
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER trg_inbox_notify
+        AFTER INSERT ON inbox_messages
+        FOR EACH ROW EXECUTE FUNCTION inbox_notify();
+    """)
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS trg_inbox_notify ON inbox_messages")
+    op.execute("DROP FUNCTION IF EXISTS inbox_notify()")
@@ -0,0 +1,25 @@
+"""Agendamento de reenvio no outbox: next_attempt_at + índice parcial das mensagens enfileiradas."""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0003_outbox_next_attempt"
+down_revision = "0002_inbox_notify"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column("outbox_messages", sa.Column("next_attempt_at", sa.TIMESTAMP(timezone=False), nullable=True))
+    op.execute("UPDATE outbox_messages SET next_attempt_at = COALESCE(created_at, now() at time zone 'utc')")
+    op.alter_column(
+        "outbox_messages", "next_attempt_at",
+        nullable=False, server_default=sa.text("(now() at time zone 'utc')"),
+    )
+    op.create_index(
+        "ix_outbox_queued_due", "outbox_messages", ["next_attempt_at", "id"],
+        postgresql_where=sa.text("status = 'queued'"),
+    )
+
+def downgrade() -> None:
+    op.drop_index("ix_outbox_queued_due", table_name="outbox_messages")
+    op.drop_column("outbox_messages", "next_attempt_at")
@@ -0,0 +1,45 @@
+
+"""Índices das queries quentes por conversa + chave única do carrinho.
+
+- ``(conversation_id, id)`` em inbox/eventos: coalescência, preflight, últimas mensagens e load do turno
+  filtram por conversa e ordenam/limitam por ``id``.
+- Parcial ``(conversation_id, id) WHERE status='queued'`` no outbox: cabeças por conversa do claim do
+  dispatcher (complementa ``ix_outbox_queued_due`` da 0003, que ordena por vencimento).
+- ``received_at`` na inbox: janela de ``list_pending_conversations`` (pool de workers).
+- ``uq_cart_item`` ``(conversation_id, sku)``: duplicatas existentes são somadas na linha mais antiga antes.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0004_conversation_indexes"
+down_revision = "0003_outbox_next_attempt"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_index("ix_inbox_conv_id", "inbox_messages", ["conversation_id", "id"])
+    op.create_index("ix_inbox_received_at", "inbox_messages", ["received_at"])
+    op.create_index("ix_events_conv_id", "conversation_events", ["conversation_id", "id"])
+    op.create_index(
+        "ix_outbox_queued_conv", "outbox_messages", ["conversation_id", "id"],
+        postgresql_where=sa.text("status = 'queued'"),
+    )
+    op.execute("""
+        WITH dup AS (
+            SELECT conversation_id, sku, min(id) AS keep_id, sum(qty) AS qty
+            FROM cart_items GROUP BY conversation_id, sku HAVING count(*) > 1
+        ), merged AS (
+            UPDATE cart_items c SET qty = dup.qty FROM dup WHERE c.id = dup.keep_id
+        )
+        DELETE FROM cart_items c USING dup
+        WHERE c.conversation_id = dup.conversation_id AND c.sku = dup.sku AND c.id <> dup.keep_id
+    """)
+    op.create_unique_constraint("uq_cart_item", "cart_items", ["conversation_id", "sku"])
+
+def downgrade() -> None:
+    op.drop_constraint("uq_cart_item", "cart_items", type_="unique")
+    op.drop_index("ix_outbox_queued_conv", table_name="outbox_messages")
+    op.drop_index("ix_events_conv_id", table_name="conversation_events")
+    op.drop_index("ix_inbox_received_at", table_name="inbox_messages")
+    op.drop_index("ix_inbox_conv_id", table_name="inbox_messages")
@@ -0,0 +1,24 @@
+
+"""conversation_state.snapshot JSON → JSONB (atualizações parciais com ``||``/``jsonb_set`` no servidor)."""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "0005_snapshot_jsonb"
+down_revision = "0004_conversation_indexes"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.alter_column("conversation_state", "snapshot", server_default=None)
+    op.alter_column(
+        "conversation_state", "snapshot",
+        type_=postgresql.JSONB(), postgresql_using="COALESCE(snapshot::jsonb, '{}'::jsonb)",
+    )
+    op.alter_column("conversation_state", "snapshot", server_default=sa.text("'{}'::jsonb"))
+
+def downgrade() -> None:
+    op.alter_column("conversation_state", "snapshot", server_default=None)
+    op.alter_column("conversation_state", "snapshot", type_=sa.JSON(), postgresql_using="snapshot::json")
+    op.alter_column("conversation_state", "snapshot", server_default=sa.text("'{}'::json"))
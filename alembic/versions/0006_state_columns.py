@@ -0,0 +1,43 @@
+
+"""Colunas tipadas em conversation_state: handoff_paused, handoff_reason, last_processed_inbox_id.
+
+Backfill a partir do snapshot (as chaves migradas saem do JSONB) e índice parcial das conversas pausadas.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0006_state_columns"
+down_revision = "0005_snapshot_jsonb"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column("conversation_state", sa.Column("handoff_paused", sa.Boolean(), nullable=False, server_default=sa.text("false")))
+    op.add_column("conversation_state", sa.Column("handoff_reason", sa.String(), nullable=True))
+    op.add_column("conversation_state", sa.Column("last_processed_inbox_id", sa.BigInteger(), nullable=True))
+    op.execute("""
+        UPDATE conversation_state
+        SET handoff_paused = COALESCE((snapshot->>'handoff_paused')::boolean, false),
+            handoff_reason = snapshot->>'handoff_reason',
+            last_processed_inbox_id = (snapshot->>'last_processed_inbox_id')::bigint,
+            snapshot = snapshot - 'handoff_paused' - 'handoff_reason' - 'last_processed_inbox_id'
+        WHERE snapshot ?| array['handoff_paused', 'handoff_reason', 'last_processed_inbox_id']
+    """)
+    op.create_index(
+        "ix_state_handoff_paused", "conversation_state", ["conversation_id"],
+        postgresql_where=sa.text("handoff_paused"),
+    )
+
+def downgrade() -> None:
+    op.execute("""
+        UPDATE conversation_state
+        SET snapshot = snapshot || jsonb_strip_nulls(jsonb_build_object(
+            'handoff_paused', CASE WHEN handoff_paused THEN true END,
+            'handoff_reason', handoff_reason,
+            'last_processed_inbox_id', last_processed_inbox_id))
+    """)
+    op.drop_index("ix_state_handoff_paused", table_name="conversation_state")
+    op.drop_column("conversation_state", "last_processed_inbox_id")
+    op.drop_column("conversation_state", "handoff_reason")
+    op.drop_column("conversation_state", "handoff_paused")
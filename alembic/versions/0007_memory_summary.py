@@ -0,0 +1,24 @@
+
+"""Resumo incremental da conversa: marca d'água do resumo + índice das respostas por conversa.
+
+- ``conversation_state.summary_upto_inbox_id``: última mensagem de inbox já incorporada ao ``memory_summary``
+  (``tasks/memory_summarizer.py`` resume só o que vem depois e grava com compare-and-set nessa coluna).
+- ``ix_outbox_conv_id`` ``(conversation_id, id)``: respostas recentes do bot no load do turno e no resumo
+  (``ix_outbox_queued_conv`` da 0004 só cobre as enfileiradas).
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0007_memory_summary"
+down_revision = "0006_state_columns"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column("conversation_state", sa.Column("summary_upto_inbox_id", sa.BigInteger(), nullable=True))
+    op.create_index("ix_outbox_conv_id", "outbox_messages", ["conversation_id", "id"])
+
+def downgrade() -> None:
+    op.drop_index("ix_outbox_conv_id", table_name="outbox_messages")
+    op.drop_column("conversation_state", "summary_upto_inbox_id")
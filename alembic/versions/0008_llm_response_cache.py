@@ -0,0 +1,31 @@
+
+"""Camada compartilhada do cache de respostas do LLM (``core/llm_cache.py``, ``HB_LLM_CACHE_SHARED``).
+
+- ``llm_response_cache``: chave (sha256) → resposta JSONB, com ``expires_at`` (TTL) e ``catalog_version`` (linhas de
+  outras versões do catálogo são apagadas quando o catálogo troca).
+- ``ix_llm_cache_expires``: limpeza periódica dos expirados.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+# revision identifiers, used by Alembic.
+revision = "0008_llm_response_cache"
+down_revision = "0007_memory_summary"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        "llm_response_cache",
+        sa.Column("key", sa.String(64), primary_key=True),
+        sa.Column("kind", sa.String(48), nullable=False),
+        sa.Column("catalog_version", sa.String(16), nullable=False),
+        sa.Column("value", JSONB(), nullable=False),
+        sa.Column("expires_at", sa.TIMESTAMP(timezone=False), nullable=False),
+    )
+    op.create_index("ix_llm_cache_expires", "llm_response_cache", ["expires_at"])
+
+def downgrade() -> None:
+    op.drop_index("ix_llm_cache_expires", table_name="llm_response_cache")
+    op.drop_table("llm_response_cache")
@@ -0,0 +1,29 @@
+
+"""Status ``sending`` no outbox (lease do dispatcher).
+
+- O dispatcher marca as linhas reivindicadas como ``sending`` (``next_attempt_at`` = fim do lease) e faz commit
+  antes dos envios; os índices parciais do claim (0003/0004) passam a cobrir ``queued`` e ``sending``.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "0009_outbox_sending_lease"
+down_revision = "0008_llm_response_cache"
+branch_labels = None
+depends_on = None
+
+def _recreate(where: str) -> None:
+    op.drop_index("ix_outbox_queued_due", table_name="outbox_messages")
+    op.drop_index("ix_outbox_queued_conv", table_name="outbox_messages")
+    op.create_index("ix_outbox_queued_due", "outbox_messages", ["next_attempt_at", "id"],
+                    postgresql_where=sa.text(where))
+    op.create_index("ix_outbox_queued_conv", "outbox_messages", ["conversation_id", "id"],
+                    postgresql_where=sa.text(where))
+
+def upgrade() -> None:
+    _recreate("status IN ('queued', 'sending')")
+
+def downgrade() -> None:
+    op.execute("UPDATE outbox_messages SET status = 'queued' WHERE status = 'sending'")
+    _recreate("status = 'queued'")
@@ -0,0 +1,106 @@
+
+"""Benchmark do ``search_catalog``: catálogo sintético (padrão 10k itens), consultas com ruído de cliente.
+
+Cada consulta vem de um item conhecido com ruído típico de WhatsApp: sem acento, ordem trocada, "x" na
+frente, erro de digitação, palavra colada. Reporta tempo de construção do índice, p50/p99 por consulta (µs)
+e acerto@1 / acerto@5 (o item de origem — ou um homônimo, já que nomes sintéticos repetidos só diferem
+pelo sufixo numérico — aparece no topo / entre os 5 primeiros).
+
+    PYTHONPATH=src python scripts/bench_catalog_search.py --items 10000 --queries 2000
+"""
+from __future__ import annotations
+import argparse, random, statistics, time
+from typing import Any, Dict, List, Tuple
+from hamburgueria_bot.core.catalog import Catalog
+from hamburgueria_bot.core.text import fold
+
+BASES = ["Burger", "Cheese Burger", "Bacon", "Frango", "Costela", "Picanha", "Veggie", "Smash", "Salada", "Calabresa"]
+EXTRAS = ["Duplo", "Triplo", "Especial", "da Casa", "Crispy", "Barbecue", "Cheddar", "Gorgonzola", "Jalapeño",
+          "Catupiry", "Onion", "Defumado", "Trufado", "Mostarda e Mel", "Pimenta", "Tradicional"]
+SIDES = ["Batata", "Onion Rings", "Nuggets", "Mandioca", "Polenta"]
+SIZES = ["Pequena", "Média", "Grande", "Família"]
+DRINKS = ["Refrigerante", "Suco", "Água", "Chá Gelado", "Milkshake"]
+FLAVORS = ["Laranja", "Limão", "Uva", "Morango", "Chocolate", "Baunilha", "Maracujá", "Cola", "Guaraná"]
+TAGS = ["carne", "queijo", "pão", "bacon", "frango", "vegano", "picante", "crocante", "gelado", "lata", "frita",
+        "artesanal", "sem glúten", "zero", "duplo", "molho"]
+
+def synthetic_catalog(n: int, seed: int = 7) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    cats = {"burgers": [], "sides": [], "drinks": []}
+    seen = set()
+    i = 0
+    while sum(len(v) for v in cats.values()) < n:
+        kind = rng.choices(["burgers", "sides", "drinks"], weights=[6, 2, 2])[0]
+        if kind == "burgers":
+            name = f"{rng.choice(BASES)} {' '.join(rng.sample(EXTRAS, rng.randint(1, 2)))}"
+        elif kind == "sides":
+            name = f"{rng.choice(SIDES)} {rng.choice(SIZES)} {rng.choice(EXTRAS)}"
+        else:
+            name = f"{rng.choice(DRINKS)} {rng.choice(FLAVORS)} {rng.choice(SIZES)}"
+        name = f"{name} {i}" if name in seen else name  # nomes únicos
+        seen.add(name)
+        cats[kind].append({"sku": f"S{i:05d}", "name": name, "price_cents": rng.randint(500, 6000),
+                           "tags": rng.sample(TAGS, rng.randint(1, 4))})
+        i += 1
+    return {"currency": "BRL", "categories": [{"id": k, "name": k.title(), "items": v} for k, v in cats.items()]}
+
+def _typo(word: str, rng: random.Random) -> str:
+    if len(word) < 5:
+        return word
+    j = rng.randrange(1, len(word) - 1)
+    return rng.choice([word[:j] + word[j + 1:], word[:j] + word[j] + word[j:], word[:j] + "u" + word[j:]])
+
+def _base_name(name: str) -> str:
+    return " ".join(w for w in fold(name).split() if not w.isdigit())
+
+def noisy_query(name: str, rng: random.Random) -> str:
+    words = fold(name).split()
+    words = [w for w in words if not w.isdigit()]
+    if len(words) > 1 and rng.random() < 0.4:
+        rng.shuffle(words)
+    if rng.random() < 0.5:
+        k = rng.randrange(len(words))
+        words[k] = _typo(words[k], rng)
+    if len(words) > 1 and rng.random() < 0.2:
+        words = ["".join(words[:2])] + words[2:]
+    if rng.random() < 0.3:
+        words = ["x"] + words
+    return " ".join(words)
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--items", type=int, default=10_000)
+    ap.add_argument("--queries", type=int, default=2000)
+    args = ap.parse_args()
+
+    data = synthetic_catalog(args.items)
+    t0 = time.perf_counter()
+    cat = Catalog(data)
+    build_ms = (time.perf_counter() - t0) * 1000
+    print(f"catálogo: {len(cat)} itens, índice construído em {build_ms:.0f} ms (versão {cat.version})")
+
+    base = {it["sku"]: _base_name(it["name"]) for it in cat.items}
+    rng = random.Random(11)
+    cases: List[Tuple[str, str]] = []
+    for it in rng.sample(list(cat.items), min(args.queries, len(cat))):
+        cases.append((noisy_query(it["name"], rng), it["sku"]))
+    for q, _ in cases[:50]:
+        cat.search(q)  # aquecimento
+
+    lat: List[float] = []
+    top1 = top5 = 0
+    for q, sku in cases:
+        t = time.perf_counter()
+        res = cat.search(q, limit=5)
+        lat.append((time.perf_counter() - t) * 1e6)
+        names = [base[r["sku"]] for r in res]
+        top1 += bool(names) and names[0] == base[sku]
+        top5 += base[sku] in names
+    q = statistics.quantiles(lat, n=100)
+    print(f"consultas: {len(cases)}  p50 {q[49]:.0f} µs  p99 {q[98]:.0f} µs  média {statistics.mean(lat):.0f} µs")
+    print(f"acerto@1 {top1 / len(cases):.1%}  acerto@5 {top5 / len(cases):.1%}")
+    for qtext, sku in cases[:5]:
+        print(f"  {qtext!r:40} → {[r['sku'] for r in cat.search(qtext, 3)]} (esperado {sku})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+
+"""Benchmark: coalescência por polling (coalesce_window) vs. orientada a eventos (DebounceScheduler).
+
+Simula C conversas concorrentes, cada uma recebendo uma rajada de M mensagens espaçadas por
+``gap_ms`` (< janela). Para cada implementação, um consumidor por conversa espera o pacote e
+contamos os statements SQL executados pelo consumidor (``core.db.count_queries``).
+
+Requer Postgres acessível em HB_DATABASE_URL (demais HB_* obrigatórios podem ser fictícios):
+    python scripts/bench_coalesce.py --conversations 50 --messages 4 --gap-ms 300
+"""
+from __future__ import annotations
+import argparse, statistics, threading, time, uuid
+from kink import di
+from hamburgueria_bot.core.di import bootstrap_di
+from hamburgueria_bot.core.settings import Settings
+from hamburgueria_bot.core.db import count_queries
+from hamburgueria_bot.core.coalesce import coalesce_window
+from hamburgueria_bot.core.coalesce_events import DebounceScheduler
+from hamburgueria_bot.repo.models import Base, InboxMessage
+
+def _insert(cid: str, i: int) -> int:
+    Session = di["session_factory"]
+    with Session() as s, s.begin():
+        im = InboxMessage(conversation_id=cid, provider_message_id=f"b-{i}", wa_id=cid[:32],
+                          payload={"texto": f"msg {i}"})
+        s.add(im)
+    return im.id
+
+def _scenario(name: str, consume, on_insert, args) -> dict:
+    run = uuid.uuid4().hex[:8]
+    queries: list[int] = []
+    latencies: list[float] = []
+    sizes: list[int] = []
+    lock = threading.Lock()
+
+    def conversation(idx: int) -> None:
+        cid = f"bench-{run}-{idx}"
+        last_insert = [0.0]
+
+        def producer() -> None:
+            for i in range(args.messages):
+                on_insert(cid, _insert(cid, i))
+                last_insert[0] = time.monotonic()
+                time.sleep(args.gap_ms / 1000.0)
+
+        prod = threading.Thread(target=producer)
+        prod.start()
+        time.sleep(0.01)
+        with count_queries() as qc:
+            pacote = consume(cid)
+        done = time.monotonic()
+        prod.join()
+        with lock:
+            queries.append(qc.n)
+            sizes.append(len(pacote["message_ids"]))
+            latencies.append((done - last_insert[0]) * 1000)
+
+    threads = [threading.Thread(target=conversation, args=(i,)) for i in range(args.conversations)]
+    t0 = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.monotonic() - t0
+    return {
+        "impl": name,
+        "batches": len(queries),
+        "queries_per_batch": round(sum(queries) / max(len(queries), 1), 2),
+        "queries_per_s": round(sum(queries) / wall, 1),
+        "avg_msgs_per_batch": round(statistics.mean(sizes), 2),
+        "flush_after_last_msg_ms_p50": round(statistics.median(latencies), 1),
+        "wall_s": round(wall, 2),
+    }
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--conversations", type=int, default=50)
+    ap.add_argument("--messages", type=int, default=4)
+    ap.add_argument("--gap-ms", type=int, default=300)
+    args = ap.parse_args()
+
+    bootstrap_di()
+    Base.metadata.create_all(di["session_factory"].kw["bind"])
+
+    results = [_scenario("poll", lambda cid: coalesce_window(cid, None), lambda cid, iid: None, args)]
+    sched = DebounceScheduler(di[Settings].coalesce_window_ms).start()
+    results.append(_scenario("events", lambda cid: sched.wait_batch(cid, None), sched.touch, args))
+    sched.stop()
+
+    print(f"{'impl':8} {'batches':>8} {'q/batch':>8} {'q/s':>8} {'msgs/batch':>11} {'p50 flush ms':>13} {'wall s':>7}")
+    for r in results:
+        print(f"{r['impl']:8} {r['batches']:>8} {r['queries_per_batch']:>8} {r['queries_per_s']:>8} "
+              f"{r['avg_msgs_per_batch']:>11} {r['flush_after_last_msg_ms_p50']:>13} {r['wall_s']:>7}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+
+"""Benchmark do envio do outbox contra o Graph stub (sem banco): sequencial vs. dispatcher concorrente.
+
+- ``sequencial``: ``WhatsAppCloudAdapter.send`` um a um (comportamento anterior do ``dispatch_once``);
+- ``concorrente``: ``OutboxDispatcher._send_all`` — conversas em paralelo, ordem preservada por conversa,
+  limitado pelo token bucket (``--rate``; 0 desliga).
+Confere a ordem por conversa e reporta msgs/s.
+
+    PYTHONPATH=src python scripts/bench_dispatcher.py --conversations 50 --per-conversation 4 --latency-ms 80
+"""
+from __future__ import annotations
+import argparse, os, sys, time
+
+sys.path.insert(0, os.path.dirname(__file__))
+from stub_graph import start_stub_graph  # noqa: E402
+
+for k, v in {"HB_DATABASE_URL": "postgresql+psycopg://x@localhost/x", "HB_WHATSAPP_TOKEN": "x",
+             "HB_WHATSAPP_PHONE_NUMBER_ID": "123", "HB_APP_SECRET": "x", "HB_VERIFY_TOKEN": "x",
+             "HB_LITELLM_BASE_URL": "http://127.0.0.1:9"}.items():
+    os.environ.setdefault(k, v)
+
+from kink import di  # noqa: E402
+from hamburgueria_bot.core.settings import Settings  # noqa: E402
+from hamburgueria_bot.ports.interfaces import MensagemSaidaDTO  # noqa: E402
+from hamburgueria_bot.connectors.whatsapp.cloud_api_adapter import WhatsAppCloudAdapter  # noqa: E402
+from hamburgueria_bot.tasks.outbox_dispatcher import OutboxDispatcher  # noqa: E402
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--conversations", type=int, default=50)
+    ap.add_argument("--per-conversation", type=int, default=4)
+    ap.add_argument("--latency-ms", type=float, default=80.0)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--rate", type=float, default=80.0)
+    args = ap.parse_args()
+    srv = start_stub_graph(0, args.latency_ms)
+    di[Settings] = Settings(whatsapp_graph_base_url=f"http://127.0.0.1:{srv.server_address[1]}")
+    plan = {f"c{c}": [(c * 1000 + i, MensagemSaidaDTO(wa_id=f"c{c}", texto=f"{i}")) for i in range(args.per_conversation)]
+            for c in range(args.conversations)}
+    total = args.conversations * args.per_conversation
+
+    adapter = WhatsAppCloudAdapter()
+    t0 = time.perf_counter()
+    for items in plan.values():
+        for _, dto in items:
+            adapter.send(dto)
+    seq = time.perf_counter() - t0
+    print(f"sequencial   {total} msgs em {seq:6.2f}s → {total / seq:7.1f} msgs/s")
+
+    srv.sent.clear()
+    d = OutboxDispatcher(concurrency=args.concurrency, rate_per_s=args.rate)
+    t0 = time.perf_counter()
+    out = d._run(d._send_all(plan))
+    conc = time.perf_counter() - t0
+    d.close()
+    for cid in plan:
+        order = [b["text"]["body"] for b in srv.sent if b["to"] == cid]
+        assert order == [str(i) for i in range(args.per_conversation)], (cid, order)
+    ok = sum(r.ok for r in out.values())
+    print(f"concorrente  {ok} msgs em {conc:6.2f}s → {ok / conc:7.1f} msgs/s "
+          f"(concurrency={args.concurrency}, rate={args.rate}/s) — ordem por conversa ok")
+    srv.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+
+"""Benchmark: latência das queries por conversa sem e com os índices da migração 0004.
+
+Popula (via ``generate_series``, no próprio Postgres) milhões de linhas em inbox/eventos/outbox/carrinho,
+mede p50/p99 de cada query quente do repositório para conversas aleatórias sem os índices novos,
+cria os índices (``ANALYZE`` em seguida) e mede de novo. Mostra também se o plano usa Seq Scan.
+
+Requer Postgres local em HB_DATABASE_URL (demais HB_* obrigatórios podem ser fictícios). Use um banco
+descartável: as tabelas são truncadas no seed.
+    python scripts/bench_indexes.py --conversations 200000 --inbox-per-conv 10 --samples 300
+    python scripts/bench_indexes.py --skip-seed          # reaproveita os dados do run anterior
+"""
+from __future__ import annotations
+import argparse, random, statistics, time
+from typing import Callable, Dict, List
+from kink import di
+from sqlalchemy import text
+from hamburgueria_bot.core.di import bootstrap_di
+from hamburgueria_bot.core.context import last_messages
+from hamburgueria_bot.core.coalesce_events import read_batch
+from hamburgueria_bot.repo import repo
+from hamburgueria_bot.repo.models import Base
+from hamburgueria_bot.repo.turn_context import TurnContext
+from hamburgueria_bot.domain.services import cart_service
+from hamburgueria_bot.tasks.outbox_dispatcher import _CLAIM_SQL
+
+NEW_INDEXES = ("ix_inbox_conv_id", "ix_inbox_received_at", "ix_events_conv_id", "ix_outbox_queued_conv")
+
+SEED_SQL = [
+    """INSERT INTO conversation_state (conversation_id, memory_summary, snapshot)
+       SELECT 'c' || g, NULL, '{}'::json FROM generate_series(0, :conv - 1) g""",
+    """INSERT INTO inbox_messages (conversation_id, provider_message_id, wa_id, payload, received_at, trace_id)
+       SELECT 'c' || (g % :conv), 'p' || g, 'c' || (g % :conv), json_build_object('texto', 'mensagem ' || g),
+              (now() at time zone 'utc') - make_interval(secs => (:conv * :inbox - g) / 50.0), '-'
+       FROM generate_series(1, :conv * :inbox) g""",
+    """INSERT INTO conversation_events (conversation_id, kind, data, ts)
+       SELECT 'c' || (g % :conv), 'coalesce_done', json_build_object('n', g), 1700000000000 + g
+       FROM generate_series(1, :conv * :events) g""",
+    """INSERT INTO outbox_messages (conversation_id, body, status, attempts, created_at, next_attempt_at)
+       SELECT 'c' || (g % :conv), json_build_object('wa_id', 'c' || (g % :conv), 'texto', 'ok'),
+              CASE WHEN g % 100 = 0 THEN 'queued' ELSE 'sent' END, 0,
+              now() at time zone 'utc', now() at time zone 'utc'
+       FROM generate_series(1, :conv * :outbox) g""",
+    """INSERT INTO cart_items (conversation_id, sku, name, qty, unit_price_cents)
+       SELECT 'c' || (g % :conv), 'SKU' || (g / :conv), 'Item ' || (g / :conv), 1, 2500
+       FROM generate_series(0, :conv * :cart - 1) g""",
+]
+
+def _set_indexes(engine, present: bool) -> None:
+    indexes = [ix for t in Base.metadata.sorted_tables for ix in t.indexes if ix.name in NEW_INDEXES]
+    with engine.begin() as conn:
+        for ix in indexes:
+            (ix.create if present else ix.drop)(conn, checkfirst=True)
+        conn.execute(text("ALTER TABLE cart_items DROP CONSTRAINT IF EXISTS uq_cart_item"))
+        if present:
+            conn.execute(text("ALTER TABLE cart_items ADD CONSTRAINT uq_cart_item UNIQUE (conversation_id, sku)"))
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+
+def _seed(engine, args) -> None:
+    params = {"conv": args.conversations, "inbox": args.inbox_per_conv, "events": args.events_per_conv,
+              "outbox": args.outbox_per_conv, "cart": args.cart_per_conv}
+    with engine.begin() as conn:
+        conn.execute(text("TRUNCATE inbox_messages, conversation_events, outbox_messages, cart_items, "
+                          "conversation_state RESTART IDENTITY"))
+        for sql in SEED_SQL:
+            t0 = time.perf_counter()
+            n = conn.execute(text(sql), params).rowcount
+            print(f"seed {sql.split()[2]:20} {n:>10} linhas em {time.perf_counter() - t0:6.1f}s")
+
+def _claim(_cid: str) -> None:
+    Session = di["session_factory"]
+    with Session() as s:
+        s.execute(_CLAIM_SQL, {"limit": 50}).all()
+        s.rollback()  # só mede o claim; solta locks sem marcar nada
+
+def _events_recent(cid: str) -> None:
+    Session = di["session_factory"]
+    with Session() as s:
+        s.execute(text("SELECT id, kind, data FROM conversation_events WHERE conversation_id = :cid "
+                       "ORDER BY id DESC LIMIT 20"), {"cid": cid}).all()
+
+QUERIES: Dict[str, Callable[[str], object]] = {
+    "has_newer_inbox": lambda cid: repo.has_newer_inbox(cid, 0),
+    "last_messages": lambda cid: last_messages(cid),
+    "read_batch": lambda cid: read_batch(cid, None),
+    "turn_context.load": lambda cid: TurnContext.load(cid),
+    "events_recent": _events_recent,
+    "cart.get_items": lambda cid: cart_service.get_items(cid),
+    "list_pending": lambda cid: repo.list_pending_conversations(),
+    "dispatcher.claim": _claim,
+}
+
+EXPLAIN_SQL = {
+    "has_newer_inbox": "SELECT id FROM inbox_messages WHERE conversation_id = 'c1' AND id > 0 ORDER BY id DESC LIMIT 1",
+    "events_recent": "SELECT id FROM conversation_events WHERE conversation_id = 'c1' ORDER BY id DESC LIMIT 20",
+    "cart.get_items": "SELECT * FROM cart_items WHERE conversation_id = 'c1'",
+}
+
+def _measure(args, label: str) -> Dict[str, List[float]]:
+    rng = random.Random(42)
+    cids = [f"c{rng.randrange(args.conversations)}" for _ in range(args.samples)]
+    out: Dict[str, List[float]] = {}
+    for name, fn in QUERIES.items():
+        fn(cids[0])  # aquece pool/cache de plano
+        samples = []
+        for cid in cids:
+            t0 = time.perf_counter()
+            fn(cid)
+            samples.append((time.perf_counter() - t0) * 1000)
+        out[name] = samples
+    engine = di["session_factory"].kw["bind"]
+    with engine.connect() as conn:
+        for name, sql in EXPLAIN_SQL.items():
+            plan = "\n".join(r[0] for r in conn.execute(text("EXPLAIN " + sql)))
+            print(f"[{label}] {name:16} {'SEQ SCAN' if 'Seq Scan' in plan else 'index'}")
+    return out
+
+def _pct(xs: List[float], p: int) -> float:
+    return statistics.quantiles(xs, n=100)[p - 1] if len(xs) > 1 else xs[0]
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--conversations", type=int, default=200_000)
+    ap.add_argument("--inbox-per-conv", type=int, default=10)
+    ap.add_argument("--events-per-conv", type=int, default=10)
+    ap.add_argument("--outbox-per-conv", type=int, default=3)
+    ap.add_argument("--cart-per-conv", type=int, default=2)
+    ap.add_argument("--samples", type=int, default=300)
+    ap.add_argument("--skip-seed", action="store_true")
+    args = ap.parse_args()
+
+    bootstrap_di()
+    engine = di["session_factory"].kw["bind"]
+    Base.metadata.create_all(engine)
+    _set_indexes(engine, present=False)
+    if not args.skip_seed:
+        _seed(engine, args)
+
+    before = _measure(args, "sem índices")
+    _set_indexes(engine, present=True)
+    after = _measure(args, "com índices")
+
+    print(f"\n{'query':18} {'p50 antes':>10} {'p99 antes':>10} {'p50 depois':>11} {'p99 depois':>11}  (ms)")
+    for name in QUERIES:
+        b, a = before[name], after[name]
+        print(f"{name:18} {_pct(b, 50):>10.2f} {_pct(b, 99):>10.2f} {_pct(a, 50):>11.2f} {_pct(a, 99):>11.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+
+"""Benchmark do cache de respostas do LLM (``core/llm_cache.py``) contra o gateway stub.
+
+Carga: turnos de conversas novas (roteador LLM + agente escolhido), ``--faq-share`` deles com perguntas
+frequentes em variações de caixa/acentos/pontuação ("oi", "Oi!", "tá aberto?", "qual o cardápio?"...) e o resto
+com mensagens únicas. Compara sem cache e com cache (LRU local): chamadas ao LLM, hit ratio e latência do turno.
+Confere também que a troca do catálogo invalida o cache. Pré-roteador desligado (todo turno iria ao LLM).
+    PYTHONPATH=src python scripts/bench_llm_cache.py --turns 300 --base-ms 250
+"""
+from __future__ import annotations
+import argparse, os, random, statistics, sys, time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(__file__))
+from stub_gateway import start_stub  # noqa: E402
+
+for k, v in {"HB_DATABASE_URL": "postgresql+psycopg://x@localhost/x", "HB_WHATSAPP_TOKEN": "x",
+             "HB_WHATSAPP_PHONE_NUMBER_ID": "x", "HB_APP_SECRET": "x", "HB_VERIFY_TOKEN": "x"}.items():
+    os.environ.setdefault(k, v)
+
+from kink import di  # noqa: E402
+from hamburgueria_bot.core.settings import Settings  # noqa: E402
+from hamburgueria_bot.core.llm_client import LLMClient, track_usage  # noqa: E402
+from hamburgueria_bot.core.llm_cache import ResponseCache  # noqa: E402
+from hamburgueria_bot.core.prompting import PromptBuilder  # noqa: E402
+from hamburgueria_bot.core.catalog import Catalog, load_catalog  # noqa: E402
+from hamburgueria_bot.core.metrics import metrics  # noqa: E402
+from hamburgueria_bot.adk.orchestrator import Orchestrator  # noqa: E402
+from hamburgueria_bot.adk.agents.saudacao import AgenteSaudacao  # noqa: E402
+from hamburgueria_bot.adk.agents.cardapio import AgenteCardapio  # noqa: E402
+from hamburgueria_bot.adk.agents.carrinho import AgenteCarrinho  # noqa: E402
+from hamburgueria_bot.adk.agents.endereco import AgenteEndereco  # noqa: E402
+from hamburgueria_bot.adk.agents.pagamento import AgentePagamento  # noqa: E402
+
+FAQ = ["oi", "Oi!", "olá", "Olá, boa noite", "boa noite", "tá aberto?", "ta aberto", "Vocês estão abertos?",
+       "qual o cardápio?", "Qual o cardapio", "cardápio", "quais os lanches?", "tem opção vegetariana?"]
+
+def _workload(n: int, faq_share: float, seed: int = 7) -> List[str]:
+    rnd = random.Random(seed)
+    return [rnd.choice(FAQ) if rnd.random() < faq_share else f"quero saber sobre o pedido {rnd.randrange(10**6)}"
+            for _ in range(n)]
+
+def _turn(i: int, msg: str) -> None:
+    contexto = {"memory_summary": "", "snapshot": {}, "wa_id": f"55{i:09d}"}
+    rot = Orchestrator().route(contexto=contexto, mensagem=msg, conversa={"ultimas": [f"cliente: {msg}"]})
+    di["agents"][rot.agente_escolhido].processar(msg, contexto)
+
+def _run(turns: List[str]) -> dict:
+    lat: List[float] = []
+    with track_usage() as usage:
+        for i, msg in enumerate(turns):
+            t0 = time.perf_counter()
+            _turn(i, msg)
+            lat.append((time.perf_counter() - t0) * 1000)
+    lat.sort()
+    return {"llm_calls": usage.calls, "mean": statistics.mean(lat), "p50": statistics.median(lat),
+            "p95": lat[int(len(lat) * 0.95) - 1]}
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=300)
+    ap.add_argument("--faq-share", type=float, default=0.5)
+    ap.add_argument("--base-ms", type=float, default=250)
+    args = ap.parse_args()
+
+    srv = start_stub(0, {"primary": (args.base_ms, args.base_ms, 0.0), "fallback": (args.base_ms, args.base_ms, 0.0)})
+    settings = Settings(litellm_base_url=f"http://127.0.0.1:{srv.server_address[1]}", litellm_model_primary="primary",
+                        litellm_model_fallback="fallback", litellm_hedge_enabled=False)
+    di[Settings] = settings
+    di[LLMClient] = LLMClient(settings)
+    di[PromptBuilder] = PromptBuilder()
+    di[Catalog] = Catalog(load_catalog())
+    di["agents"] = {"saudacao": AgenteSaudacao, "cardapio": AgenteCardapio, "carrinho": AgenteCarrinho,
+                    "endereco": AgenteEndereco, "pagamento": AgentePagamento}
+    turns = _workload(args.turns, args.faq_share)
+
+    off = _run(turns)
+    di[ResponseCache] = cache = ResponseCache(settings=settings)
+    on = _run(turns)
+    print(f"turnos: {args.turns} ({args.faq_share:.0%} FAQ); latência do gateway {args.base_ms:.0f} ms")
+    print(f"{'cache':6} {'chamadas LLM':>13} {'turno média ms':>15} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, r in (("off", off), ("on", on)):
+        print(f"{name:6} {r['llm_calls']:13} {r['mean']:15.1f} {r['p50']:8.1f} {r['p95']:8.1f}")
+    snap = metrics.snapshot("llm.cache.")
+    print(f"hit ratio {snap['gauges'].get('llm.cache.hit_ratio')}; entradas {len(cache)}; "
+          f"hits por tipo: { {k[14:]: v for k, v in snap['counters'].items() if k.startswith('llm.cache.hit.')} }")
+
+    data = load_catalog()
+    data["categories"][0]["items"][0]["price_cents"] += 100
+    di[Catalog] = Catalog(data)
+    hits = metrics.counter("llm.cache.hit")
+    _turn(0, turns[0])
+    print(f"após troca do catálogo: entradas {len(cache)}, hits novos {metrics.counter('llm.cache.hit') - hits:.0f}")
+    di[LLMClient].close()
+    srv.shutdown()
+
+if __name__ == "__main__":
+    main()
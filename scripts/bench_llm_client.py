@@ -0,0 +1,94 @@
+
+"""Benchmark do cliente LLM contra o gateway stub (sem rede externa, sem chaves).
+
+Compara:
+- ``legacy``: um ``httpx.Client`` novo por requisição (comportamento anterior), fallback só após erro;
+- ``pooled``: ``LLMClient`` (pool persistente) sem hedging;
+- ``hedged``: ``LLMClient`` com hedging no percentil configurado.
+
+O primário tem cauda lenta (``--tail-ms`` em ``--tail-prob`` das chamadas); o fallback é estável.
+    PYTHONPATH=src python scripts/bench_llm_client.py --requests 200 --concurrency 8
+"""
+from __future__ import annotations
+import argparse, os, statistics, sys, time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from pydantic import BaseModel
+
+sys.path.insert(0, os.path.dirname(__file__))
+from stub_gateway import start_stub  # noqa: E402
+
+for k, v in {"HB_DATABASE_URL": "postgresql+psycopg://x@localhost/x", "HB_WHATSAPP_TOKEN": "x",
+             "HB_WHATSAPP_PHONE_NUMBER_ID": "x", "HB_APP_SECRET": "x", "HB_VERIFY_TOKEN": "x"}.items():
+    os.environ.setdefault(k, v)
+
+from hamburgueria_bot.core.settings import Settings  # noqa: E402
+from hamburgueria_bot.core.llm_client import LLMClient  # noqa: E402
+from hamburgueria_bot.core.metrics import metrics  # noqa: E402
+
+class Out(BaseModel):
+    agente_escolhido: str
+    motivo: str
+
+def _legacy(settings: Settings):
+    def call() -> None:
+        payload = {"model": settings.litellm_model_primary, "response_format": {"type": "json_object"},
+                   "messages": [{"role": "user", "content": "oi"}]}
+        try:
+            with httpx.Client(base_url=settings.litellm_base_url, timeout=settings.litellm_timeout_s) as cli:
+                cli.post("/chat/completions", json=payload).raise_for_status()
+        except Exception:
+            payload["model"] = settings.litellm_model_fallback
+            with httpx.Client(base_url=settings.litellm_base_url, timeout=settings.litellm_timeout_s) as cli:
+                cli.post("/chat/completions", json=payload).raise_for_status()
+    return call
+
+def _client(settings: Settings):
+    cli = LLMClient(settings)
+    return lambda: cli.complete_json("sistema", "oi", Out)
+
+def _run(name: str, call, n: int, conc: int) -> dict:
+    lat: list[float] = []
+
+    def one(_):
+        t0 = time.perf_counter()
+        call()
+        lat.append((time.perf_counter() - t0) * 1000)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(conc) as ex:
+        list(ex.map(one, range(n)))
+    wall = time.perf_counter() - t0
+    lat.sort()
+    return {"impl": name, "rps": round(n / wall, 1), "p50": round(statistics.median(lat), 1),
+            "p99": round(lat[int(len(lat) * 0.99) - 1], 1), "max": round(lat[-1], 1)}
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--base-ms", type=float, default=40)
+    ap.add_argument("--tail-ms", type=float, default=1500)
+    ap.add_argument("--tail-prob", type=float, default=0.05)
+    args = ap.parse_args()
+
+    srv = start_stub(0, {"primary": (args.base_ms, args.tail_ms, args.tail_prob),
+                         "fallback": (args.base_ms * 1.5, args.base_ms * 1.5, 0.0)})
+    url = f"http://127.0.0.1:{srv.server_address[1]}"
+    common = dict(litellm_base_url=url, litellm_model_primary="primary", litellm_model_fallback="fallback",
+                  litellm_hedge_min_samples=20, litellm_hedge_percentile=0.9)
+
+    results = [_run("legacy", _legacy(Settings(**common)), args.requests, args.concurrency)]
+    results.append(_run("pooled", _client(Settings(**common, litellm_hedge_enabled=False)), args.requests, args.concurrency))
+    results.append(_run("hedged", _client(Settings(**common, litellm_hedge_enabled=True)), args.requests, args.concurrency))
+
+    print(f"{'impl':8} {'req/s':>7} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for r in results:
+        print(f"{r['impl']:8} {r['rps']:>7} {r['p50']:>8} {r['p99']:>8} {r['max']:>8}")
+    snap = metrics.snapshot("llm.")
+    print("hedge:", {k: v for k, v in snap["counters"].items() if "hedge" in k})
+    print("latência por modelo:", snap["histograms"])
+    srv.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+
+"""Micro-benchmark do PromptBuilder: template monolítico recompilado por turno vs. segmentos compilados + memo.
+
+"Legado" reproduz o comportamento anterior (``env.from_string`` do template inteiro a cada chamada)
+usando os mesmos segmentos concatenados, e confere que a saída é byte a byte idêntica.
+Mede tempo por turno (router + agente) e alocação (pico do tracemalloc) por turno.
+
+    PYTHONPATH=src python scripts/bench_prompting.py --turns 2000
+"""
+from __future__ import annotations
+import argparse, statistics, time, tracemalloc
+from typing import Any, Callable, Dict, List
+from hamburgueria_bot.core import prompting as P
+from hamburgueria_bot.core.catalog import load_catalog, flatten_for_prompt
+
+ROUTER_SRC = "".join((P.ROUTER_HEAD, P.ROUTER_CONTEXTO, P.ROUTER_AGENTES, P.ROUTER_CATALOGO, P.ROUTER_ULTIMAS, P.ROUTER_TAREFA))
+AGENT_SRC = "".join((P.AGENT_HEAD, P.AGENT_CONTEXTO, P.AGENT_TAIL))
+
+def legacy_router(b: P.PromptBuilder, *, contexto: Dict[str, Any], agentes: List[Dict[str, Any]], conversa: Dict[str, Any] | None) -> str:
+    return b.env.from_string(ROUTER_SRC).render(
+        **b._base_vars(), contexto=contexto, agentes=agentes, conversa=conversa or {},
+        catalog_text=contexto.get("catalog_text", ""))
+
+def legacy_agent(b: P.PromptBuilder, *, nome: str, objetivo: str, ferramentas: List[Dict[str, str]],
+                 contexto: Dict[str, Any], exemplos, tool_policy) -> str:
+    tools = [{"nome": f["name"], "descricao": f.get("description", "")} for f in ferramentas]
+    return b.env.from_string(AGENT_SRC).render(
+        **b._base_vars(), nome=nome, objetivo=objetivo, ferramentas=tools, contexto=contexto,
+        exemplos=exemplos, tool_policy=tool_policy, default_tool_policy=P.DEFAULT_TOOL_POLICY)
+
+def _fixtures(i: int) -> Dict[str, Any]:
+    agentes = [{"nome": n, "objetivo": f"objetivo do agente {n}",
+                "tools": [{"name": f"{n}_tool_{k}", "description": "..."} for k in range(3)]}
+               for n in ("saudacao", "cardapio", "carrinho", "endereco", "pagamento")]
+    exemplos = [{"user": "quero 2 BX2", "resposta": "Adicionei 2x X-Bacon ao carrinho."},
+                {"user": "tem vegano?", "plano": "listar categoria", "resposta": "Temos o Veggie."}]
+    return {
+        "contexto": {"memory_summary": f"cliente recorrente #{i}", "snapshot": {"cart": [{"sku": "BX2", "qty": i % 3}]}},
+        "conversa": {"ultimas": [f"msg {i}", "quero um x-bacon", "sem cebola"]},
+        "agentes": agentes,
+        "ferramentas": [{"name": f"tool_{k}", "description": "descrição da tool"} for k in range(4)],
+        "exemplos": exemplos,
+    }
+
+def _turn(router: Callable, agent: Callable, b: P.PromptBuilder, fx: Dict[str, Any], catalog_text: str) -> str:
+    ctx = fx["contexto"] | {"catalog_text": catalog_text}
+    r = router(b, contexto=ctx, agentes=fx["agentes"], conversa=fx["conversa"])
+    a = agent(b, nome="cardapio", objetivo="apresentar o cardápio", ferramentas=fx["ferramentas"],
+              contexto=fx["contexto"], exemplos=fx["exemplos"], tool_policy=None)
+    return r + a
+
+def _run(name: str, router: Callable, agent: Callable, turns: int, catalog_text: str) -> List[str]:
+    b = P.PromptBuilder()
+    fxs = [_fixtures(i) for i in range(turns)]
+    _turn(router, agent, b, fxs[0], catalog_text)  # aquecimento (compila/memoiza)
+    lat: List[float] = []
+    outs: List[str] = []
+    for fx in fxs:
+        t0 = time.perf_counter()
+        outs.append(_turn(router, agent, b, fx, catalog_text))
+        lat.append((time.perf_counter() - t0) * 1e6)
+    peaks: List[int] = []
+    for fx in fxs[:200]:
+        tracemalloc.start()
+        _turn(router, agent, b, fx, catalog_text)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    lat.sort()
+    print(f"{name:10} p50={statistics.median(lat):8.1f}µs p99={lat[int(len(lat) * 0.99) - 1]:8.1f}µs "
+          f"alloc pico/turno={statistics.median(peaks) / 1024:7.1f} KiB")
+    return outs
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=2000)
+    ap.add_argument("--catalog-items", type=int, default=120)
+    args = ap.parse_args()
+    try:
+        catalog_text = flatten_for_prompt(load_catalog(), max_items=args.catalog_items)
+    except FileNotFoundError:
+        catalog_text = "\n".join(f"- SKU{i}: Item {i} — R$ {i}.90" for i in range(args.catalog_items))
+
+    legacy = _run("legado", legacy_router, legacy_agent, args.turns, catalog_text)
+    current = _run("compilado", P.PromptBuilder.router_system, P.PromptBuilder.agent_system, args.turns, catalog_text)
+    assert legacy == current, "saída divergente entre legado e compilado"
+    print(f"saídas idênticas ({len(current)} turnos, {len(current[0])} chars/turno)")
+
+if __name__ == "__main__":
+    main()
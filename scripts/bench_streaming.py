@@ -0,0 +1,112 @@
+
+"""Benchmark do modo streaming do LLM contra o gateway stub (sem rede externa, sem chaves).
+
+Cada turno = um passo de tool (a 1ª tool do registro, ``--tool-ms`` de trabalho) + resposta longa
+``{"texto": ...}``. Compara:
+- ``blocking``: ``complete_with_tools_loop`` — a 1ª mensagem só sai com a resposta inteira;
+- ``stream``: ``stream_with_tools_loop`` + ``EarlyFlush`` — a tool começa quando os argumentos fecham
+  (antes do fim do stream) e o 1º trecho completo da resposta sai durante a geração.
+
+Mede TTFT (``llm.stream.ttft_ms``), tempo até a 1ª mensagem entregue e tempo total, e confere que o texto
+entregue (trecho + restante) é igual ao da resposta não-streaming.
+    PYTHONPATH=src python scripts/bench_streaming.py --turns 30 --base-ms 300 --token-ms 15
+"""
+from __future__ import annotations
+import argparse, json, os, statistics, sys, time
+from typing import Dict, List
+from pydantic import BaseModel
+
+sys.path.insert(0, os.path.dirname(__file__))
+from stub_gateway import start_stub  # noqa: E402
+
+for k, v in {"HB_DATABASE_URL": "postgresql+psycopg://x@localhost/x", "HB_WHATSAPP_TOKEN": "x",
+             "HB_WHATSAPP_PHONE_NUMBER_ID": "x", "HB_APP_SECRET": "x", "HB_VERIFY_TOKEN": "x"}.items():
+    os.environ.setdefault(k, v)
+
+from hamburgueria_bot.core.settings import Settings  # noqa: E402
+from hamburgueria_bot.core.llm_client import LLMClient  # noqa: E402
+from hamburgueria_bot.core.llm_stream import EarlyFlush  # noqa: E402
+from hamburgueria_bot.core.metrics import metrics  # noqa: E402
+from hamburgueria_bot.adk.runtime.toolkit import ToolRegistry, ToolSpec  # noqa: E402
+
+class _NoArgs(BaseModel):
+    pass
+
+def _registry(tool_ms: float, marks: Dict[str, float]) -> ToolRegistry:
+    def consultar(_: _NoArgs) -> dict:
+        marks["tool_start"] = time.perf_counter()
+        time.sleep(tool_ms / 1000.0)
+        return {"ok": True}
+    reg = ToolRegistry()
+    reg.register(ToolSpec(name="consultar_cardapio", description="Consulta o cardápio", args_schema=_NoArgs,
+                          func=consultar))
+    return reg
+
+def _texto(msg: dict) -> str:
+    return json.loads(msg["content"])["texto"]
+
+def _pct(xs: List[float], q: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * q))]
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=30)
+    ap.add_argument("--base-ms", type=float, default=300, help="latência até o 1º chunk/resposta")
+    ap.add_argument("--token-ms", type=float, default=15, help="intervalo entre chunks")
+    ap.add_argument("--tool-ms", type=float, default=80)
+    ap.add_argument("--min-chars", type=int, default=280, help="HB_STREAM_FLUSH_MIN_CHARS")
+    args = ap.parse_args()
+
+    srv = start_stub(0, {"primary": (args.base_ms, args.base_ms, 0.0), "fallback": (args.base_ms, args.base_ms, 0.0)},
+                     token_ms=args.token_ms, tool_first=True, long_reply=True)
+    url = f"http://127.0.0.1:{srv.server_address[1]}"
+    cli = LLMClient(Settings(litellm_base_url=url, litellm_model_primary="primary", litellm_model_fallback="fallback",
+                             litellm_hedge_enabled=False))
+    rows: Dict[str, Dict[str, List[float]]] = {"blocking": {"first": [], "total": []},
+                                              "stream": {"first": [], "total": [], "tool_lead": []}}
+    mismatches = flushed = 0
+    for _ in range(args.turns):
+        marks: Dict[str, float] = {}
+        t0 = time.perf_counter()
+        msg = cli.complete_with_tools_loop(system="sistema", user="oi", tools_registry=_registry(args.tool_ms, marks))
+        total = (time.perf_counter() - t0) * 1000
+        expected = _texto(msg)
+        rows["blocking"]["first"].append(total)
+        rows["blocking"]["total"].append(total)
+
+        marks = {}
+        parts: List[str] = []
+        first: List[float] = []
+
+        def deliver(t: str) -> None:
+            first.append(time.perf_counter())
+            parts.append(t)
+        flush = EarlyFlush(deliver, args.min_chars)
+        t0 = time.perf_counter()
+        msg = cli.stream_with_tools_loop(system="sistema", user="oi", tools_registry=_registry(args.tool_ms, marks),
+                                         on_text=flush.feed)
+        end = time.perf_counter()
+        rest = flush.remainder(_texto(msg))
+        flushed += bool(flush.sent)
+        delivered = "\n\n".join(p for p in parts + [rest] if p)
+        mismatches += " ".join(delivered.split()) != " ".join(expected.split())
+        rows["stream"]["first"].append(((first[0] if first else end) - t0) * 1000)
+        rows["stream"]["total"].append((end - t0) * 1000)
+        # a tool começou antes do fim do passo de tool? (stub segue gerando ``5 * token_ms`` após os argumentos)
+        rows["stream"]["tool_lead"].append((marks.get("tool_start", end) - t0) * 1000)
+
+    print(f"turnos: {args.turns}; latência base {args.base_ms:.0f} ms, {args.token_ms:.0f} ms/chunk, tool {args.tool_ms:.0f} ms")
+    print(f"{'modo':9} {'1ª msg p50':>11} {'1ª msg p95':>11} {'total p50':>10} {'total p95':>10}")
+    for name, r in rows.items():
+        print(f"{name:9} {_pct(r['first'], .5):11.0f} {_pct(r['first'], .95):11.0f} "
+              f"{_pct(r['total'], .5):10.0f} {_pct(r['total'], .95):10.0f}")
+    h = metrics.snapshot("llm.stream.")["histograms"].get("llm.stream.ttft_ms", {})
+    print(f"TTFT (stream): {h}")
+    print(f"tool iniciada em (stream, p50): {statistics.median(rows['stream']['tool_lead']):.0f} ms após o início")
+    print(f"trecho antecipado em {flushed}/{args.turns} turnos; texto divergente: {mismatches}")
+    cli.close()
+    srv.shutdown()
+
+if __name__ == "__main__":
+    main()
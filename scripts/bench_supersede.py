@@ -0,0 +1,108 @@
+
+"""Benchmark do cancelamento cooperativo de turnos superados (``core/supersede.py``) contra o gateway stub.
+
+Cada turno = roteador (``complete_json``) + agente com um passo de tool (``--tool-ms``) e resposta final. No meio
+do turno (``--arrive-ms`` após o início) chega nova mensagem da mesma conversa. Compara:
+- ``antes``: o turno vai até o fim (a resposta é descartada pelo dispatcher, ``has_newer_inbox``) e depois roda o
+  turno do texto unido;
+- ``depois``: a inbox nova cancela o turno em voo (``notify_inbox``), que para no ``await`` HTTP/fronteira do
+  passo, e o turno do texto unido começa em seguida.
+Mede tokens por cenário (usage do stub; chamadas abortadas não contam), tempo até a resposta do texto unido e
+projeta os tokens economizados por hora para ``--turns-per-h`` turnos com ``--followup-share`` superados.
+    PYTHONPATH=src python scripts/bench_supersede.py --turns 20 --base-ms 300 --arrive-ms 450
+"""
+from __future__ import annotations
+import argparse, os, statistics, sys, threading, time
+from typing import Dict, List
+from pydantic import BaseModel
+
+sys.path.insert(0, os.path.dirname(__file__))
+from stub_gateway import start_stub  # noqa: E402
+
+for k, v in {"HB_DATABASE_URL": "postgresql+psycopg://x@localhost/x", "HB_WHATSAPP_TOKEN": "x",
+             "HB_WHATSAPP_PHONE_NUMBER_ID": "x", "HB_APP_SECRET": "x", "HB_VERIFY_TOKEN": "x"}.items():
+    os.environ.setdefault(k, v)
+
+from hamburgueria_bot.core.settings import Settings  # noqa: E402
+from hamburgueria_bot.core.llm_client import LLMClient, TokenUsage, track_usage  # noqa: E402
+from hamburgueria_bot.core.supersede import TurnSuperseded, notify_inbox, supersedable  # noqa: E402
+from hamburgueria_bot.adk.runtime.toolkit import ToolRegistry, ToolSpec  # noqa: E402
+
+class _NoArgs(BaseModel):
+    pass
+
+class _Rota(BaseModel):
+    agente_escolhido: str = "cardapio"
+
+def _registry(tool_ms: float) -> ToolRegistry:
+    def consultar(_: _NoArgs) -> dict:
+        time.sleep(tool_ms / 1000.0)
+        return {"ok": True}
+    reg = ToolRegistry()
+    reg.register(ToolSpec(name="consultar_cardapio", description="Consulta o cardápio", args_schema=_NoArgs,
+                          func=consultar, read_only=True))
+    return reg
+
+def _turn(cli: LLMClient, texto: str, tool_ms: float) -> None:
+    cli.complete_json(system="roteador", user=texto, schema=_Rota)
+    cli.complete_with_tools_loop(system="agente", user=texto, tools_registry=_registry(tool_ms))
+
+def _tokens(u: TokenUsage) -> int:
+    return u.prompt + u.completion
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=20)
+    ap.add_argument("--base-ms", type=float, default=300, help="latência de cada chamada ao gateway")
+    ap.add_argument("--tool-ms", type=float, default=50)
+    ap.add_argument("--arrive-ms", type=float, default=450, help="quando a mensagem nova chega, desde o início do turno")
+    ap.add_argument("--turns-per-h", type=float, default=2000)
+    ap.add_argument("--followup-share", type=float, default=0.15, help="fração de turnos superados por mensagem nova")
+    args = ap.parse_args()
+
+    srv = start_stub(0, {"primary": (args.base_ms, args.base_ms, 0.0), "fallback": (args.base_ms, args.base_ms, 0.0)},
+                     tool_first=True)
+    cli = LLMClient(Settings(litellm_base_url=f"http://127.0.0.1:{srv.server_address[1]}", litellm_model_primary="primary",
+                             litellm_model_fallback="fallback", litellm_hedge_enabled=False))
+    rows: Dict[str, Dict[str, List[float]]] = {"antes": {"tokens": [], "ms": []}, "depois": {"tokens": [], "ms": [],
+                                                                                          "abort_ms": []}}
+    for i in range(args.turns):
+        cid = f"bench-{i}"
+        with track_usage() as u:
+            t0 = time.perf_counter()
+            _turn(cli, "quero um x-bacon", args.tool_ms)
+            time.sleep(max(0.0, args.arrive_ms / 1000.0 - (time.perf_counter() - t0)))
+            _turn(cli, "quero um x-bacon sem cebola", args.tool_ms)
+        rows["antes"]["tokens"].append(_tokens(u))
+        rows["antes"]["ms"].append((time.perf_counter() - t0) * 1000 - args.arrive_ms)
+
+        timer = threading.Timer(args.arrive_ms / 1000.0, notify_inbox, args=(cid, 2))
+        with track_usage() as u:
+            t0 = time.perf_counter()
+            timer.start()
+            try:
+                with supersedable(cid, 1):
+                    _turn(cli, "quero um x-bacon", args.tool_ms)
+            except TurnSuperseded:
+                rows["depois"]["abort_ms"].append((time.perf_counter() - t0) * 1000 - args.arrive_ms)
+            timer.join()
+            _turn(cli, "quero um x-bacon sem cebola", args.tool_ms)
+        rows["depois"]["tokens"].append(_tokens(u))
+        rows["depois"]["ms"].append((time.perf_counter() - t0) * 1000 - args.arrive_ms)
+
+    print(f"turnos: {args.turns}; gateway {args.base_ms:.0f} ms/chamada; mensagem nova aos {args.arrive_ms:.0f} ms")
+    print(f"{'modo':7} {'tokens/turno':>13} {'resposta final após msg nova p50 ms':>36}")
+    for name, r in rows.items():
+        print(f"{name:7} {statistics.mean(r['tokens']):13.0f} {statistics.median(r['ms']):36.0f}")
+    aborted = rows["depois"]["abort_ms"]
+    print(f"turnos abortados: {len(aborted)}/{args.turns}; parada após o sinal p50 "
+          f"{statistics.median(aborted) if aborted else float('nan'):.0f} ms")
+    saved = statistics.mean(rows["antes"]["tokens"]) - statistics.mean(rows["depois"]["tokens"])
+    print(f"economia: {saved:.0f} tokens por turno superado → "
+          f"{saved * args.turns_per_h * args.followup_share:,.0f} tokens/h "
+          f"({args.turns_per_h:.0f} turnos/h, {args.followup_share:.0%} superados)")
+    cli.close()
+    srv.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+
+"""Benchmark do ``ToolBatch``: tool calls de um passo em sequência (antes) vs. em paralelo sem conflito (depois).
+
+Tools sintéticas com ``--tool-ms`` de "I/O de banco" (sleep), declaradas como as reais: ``get_cart_state``
+(leitura de ``cart``), ``get_address`` (leitura de ``address``), ``add_item_by_sku`` (escrita em ``cart``) e
+``search_catalog`` (leitura sem recurso). Cenários = listas de chamadas que o modelo pede num único passo.
+Confere também que a ordem dos resultados e a ordem das escritas conflitantes são as pedidas.
+    PYTHONPATH=src python scripts/bench_tool_batch.py --tool-ms 15 --rounds 50
+"""
+from __future__ import annotations
+import argparse, asyncio, json, statistics, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+from pydantic import BaseModel
+
+from hamburgueria_bot.adk.runtime.toolkit import ToolBatch, ToolRegistry, ToolSpec
+from hamburgueria_bot.core.metrics import metrics
+
+class _Args(BaseModel):
+    conversation_id: str = "c1"
+    sku: str = ""
+
+Call = Tuple[str, str]
+
+SCENARIOS: dict[str, List[Call]] = {
+    "cart+address": [("get_cart_state", '{"conversation_id": "c1"}'), ("get_address", '{"conversation_id": "c1"}')],
+    "3 buscas": [("search_catalog", '{}')] * 3,
+    "3 adds (conflito)": [("add_item_by_sku", json.dumps({"conversation_id": "c1", "sku": s})) for s in ("A", "B", "C")],
+    "busca+add+estado": [("search_catalog", '{}'), ("add_item_by_sku", '{"conversation_id": "c1", "sku": "X"}'),
+                         ("get_cart_state", '{"conversation_id": "c1"}'), ("get_address", '{"conversation_id": "c1"}')],
+}
+
+def _registry(tool_ms: float, writes: List[str]) -> ToolRegistry:
+    lock = threading.Lock()
+
+    def make(name: str):
+        def f(args: _Args) -> dict:
+            time.sleep(tool_ms / 1000.0)
+            if name == "add_item_by_sku":
+                with lock:
+                    writes.append(args.sku)
+            return {"tool": name, "sku": args.sku}
+        return f
+    reg = ToolRegistry()
+    for name, ro, res in (("get_cart_state", True, "cart"), ("get_address", True, "address"),
+                          ("add_item_by_sku", False, "cart"), ("search_catalog", True, None)):
+        reg.register(ToolSpec(name=name, description=name, args_schema=_Args, func=make(name), read_only=ro, resource=res))
+    return reg
+
+async def _sequential(reg: ToolRegistry, calls: List[Call]) -> List[str]:
+    return [await asyncio.to_thread(reg.execute_json, n, a) for n, a in calls]
+
+async def _batched(reg: ToolRegistry, calls: List[Call], pool: ThreadPoolExecutor) -> List[str]:
+    batch = ToolBatch(reg, pool)
+    return list(await asyncio.gather(*[batch.submit(n, a) for n, a in calls]))
+
+async def main_async(args) -> None:
+    pool = ThreadPoolExecutor(args.parallel, thread_name_prefix="tool")
+    print(f"{'cenário':20} {'seq p50 ms':>11} {'batch p50 ms':>13} {'ganho':>7}")
+    for name, calls in SCENARIOS.items():
+        seq: List[float] = []
+        bat: List[float] = []
+        for _ in range(args.rounds):
+            writes_a: List[str] = []
+            reg = _registry(args.tool_ms, writes_a)
+            t0 = time.perf_counter()
+            expected = await _sequential(reg, calls)
+            seq.append((time.perf_counter() - t0) * 1000)
+            writes_b: List[str] = []
+            reg = _registry(args.tool_ms, writes_b)
+            t0 = time.perf_counter()
+            got = await _batched(reg, calls, pool)
+            bat.append((time.perf_counter() - t0) * 1000)
+            assert got == expected, (name, got, expected)
+            assert writes_a == writes_b, (name, writes_a, writes_b)
+        a, b = statistics.median(seq), statistics.median(bat)
+        print(f"{name:20} {a:11.1f} {b:13.1f} {a / b:6.1f}x")
+    print("serializadas por conflito:", metrics.snapshot("tool.")["counters"].get("tool.serialized", 0))
+    pool.shutdown()
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--tool-ms", type=float, default=15)
+    ap.add_argument("--rounds", type=int, default=50)
+    ap.add_argument("--parallel", type=int, default=4, help="HB_TOOL_MAX_PARALLEL")
+    asyncio.run(main_async(ap.parse_args()))
+
+if __name__ == "__main__":
+    main()
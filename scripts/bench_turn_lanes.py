@@ -0,0 +1,97 @@
+
+"""Benchmark do ``TurnLanes`` (``tasks/turn_lanes.py``) contra turnos direto na thread da requisição (modo inline).
+
+Carga: ``--conversations`` conversas, cada uma recebendo rajadas de ``--burst`` mensagens quase simultâneas
+(cliente que manda "oi" / "quero um x-bacon" / "sem cebola" em sequência), cada mensagem = uma requisição do
+webhook numa thread. O turno é sintético: ``--turn-ms`` de "roteador + agente"; conta execuções (= gasto de LLM)
+e sobreposições (dois turnos da mesma conversa ao mesmo tempo = corrida no carrinho).
+Mede também o anel de hash consistente: balanceamento entre nós e fração de conversas que mudam de nó ao
+adicionar um nó.
+    PYTHONPATH=src python scripts/bench_turn_lanes.py --conversations 40 --burst 4 --lanes 8
+"""
+from __future__ import annotations
+import argparse, random, statistics, threading, time
+from collections import Counter
+from typing import Dict, List
+
+from hamburgueria_bot.tasks.turn_lanes import HashRing, TurnLanes
+from hamburgueria_bot.core.metrics import metrics
+
+class _Turns:
+    """Runner sintético: conta turnos e sobreposições por conversa."""
+    def __init__(self, turn_ms: float):
+        self.turn_ms = turn_ms
+        self.runs = 0
+        self.overlaps = 0
+        self._active: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def __call__(self, conversation_id: str, wa_id: str, **_) -> Dict:
+        with self._lock:
+            self.runs += 1
+            self.overlaps += self._active[conversation_id] > 0
+            self._active[conversation_id] += 1
+        time.sleep(self.turn_ms / 1000.0)
+        with self._lock:
+            self._active[conversation_id] -= 1
+        return {"status": "queued"}
+
+def _load(args, call) -> List[float]:
+    rnd = random.Random(3)
+    lat: List[float] = []
+    lock = threading.Lock()
+
+    def request(cid: str, delay: float) -> None:
+        time.sleep(delay)
+        t0 = time.perf_counter()
+        call(cid, cid)
+        with lock:
+            lat.append((time.perf_counter() - t0) * 1000)
+    threads = [threading.Thread(target=request, args=(f"55{c:09d}", rnd.uniform(0, args.spread_ms) / 1000.0))
+               for c in range(args.conversations) for _ in range(args.burst)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sorted(lat)
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--conversations", type=int, default=40)
+    ap.add_argument("--burst", type=int, default=4, help="mensagens por conversa na rajada")
+    ap.add_argument("--spread-ms", type=float, default=300, help="janela em que a rajada chega")
+    ap.add_argument("--turn-ms", type=float, default=200)
+    ap.add_argument("--lanes", type=int, default=8)
+    args = ap.parse_args()
+
+    direct = _Turns(args.turn_ms)
+    t0 = time.perf_counter()
+    lat_direct = _load(args, direct)
+    wall_direct = time.perf_counter() - t0
+
+    laned = _Turns(args.turn_ms)
+    lanes = TurnLanes(args.lanes, runner=laned).start()
+    t0 = time.perf_counter()
+    lat_lanes = _load(args, lanes.run)
+    wall_lanes = time.perf_counter() - t0
+    lanes.stop()
+
+    n = args.conversations * args.burst
+    print(f"requisições: {n} ({args.conversations} conversas × {args.burst}); turno {args.turn_ms:.0f} ms; filas {args.lanes}")
+    print(f"{'modo':8} {'turnos':>7} {'sobreposições':>14} {'req p50 ms':>11} {'req p95 ms':>11} {'total s':>8}")
+    for name, r, lat, wall in (("direto", direct, lat_direct, wall_direct), ("filas", laned, lat_lanes, wall_lanes)):
+        print(f"{name:8} {r.runs:7} {r.overlaps:14} {statistics.median(lat):11.0f} "
+              f"{lat[int(len(lat) * 0.95) - 1]:11.0f} {wall:8.2f}")
+    print(f"merges (turnos economizados): {metrics.counter('turn_lanes.merged'):.0f}")
+
+    keys = [f"55{c:09d}" for c in range(20000)]
+    ring = HashRing(["node-a", "node-b", "node-c"])
+    before = {k: ring.owner(k) for k in keys}
+    share = Counter(before.values())
+    ring.add("node-d")
+    moved = sum(ring.owner(k) != before[k] for k in keys)
+    print(f"anel (3 nós, 64 vnodes): {dict(sorted(share.items()))}; "
+          f"ao adicionar node-d mudam {moved / len(keys):.1%} das conversas (ideal 25%)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+
+"""Verificação: escritores paralelos no snapshot de UMA conversa não perdem atualizações.
+
+Cada thread grava suas próprias chaves (``patch_snapshot``), avança ``last_turn_inbox_id``, cria
+intenções de pagamento (append em ``payments``) e troca o status de uma delas — tudo concorrente.
+Ao fim confere: todas as chaves presentes, ``last_turn_inbox_id`` = maior valor enviado, nenhum
+pagamento faltando e todos os status aplicados. Para comparação roda o padrão antigo (lê o documento
+inteiro, altera em Python e grava de volta), que perde escritas sob concorrência.
+
+Requer Postgres em HB_DATABASE_URL com a migração 0005 (snapshot JSONB):
+    python scripts/check_snapshot_concurrency.py --threads 16 --ops 50
+"""
+from __future__ import annotations
+import argparse, sys, threading, uuid
+from kink import di
+from hamburgueria_bot.core.di import bootstrap_di
+from hamburgueria_bot.repo import repo
+from hamburgueria_bot.repo.models import ConversationState
+
+def _legacy_patch(cid: str, key: str, value) -> None:
+    """Read-modify-write do documento inteiro (comportamento anterior dos helpers)."""
+    Session = di["session_factory"]
+    with Session() as s, s.begin():
+        st = s.get(ConversationState, cid)
+        if not st:
+            st = ConversationState(conversation_id=cid, memory_summary=None, snapshot={})
+            s.add(st)
+        snap = dict(st.snapshot or {})
+        snap[key] = value
+        st.snapshot = snap
+
+def _parallel(n: int, fn) -> None:
+    errors: list[BaseException] = []
+    def run(i: int) -> None:
+        try:
+            fn(i)
+        except BaseException as e:  # noqa: BLE001 — reporta no fim
+            errors.append(e)
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+
+def check_atomic(args) -> bool:
+    cid = f"snapcheck-{uuid.uuid4().hex[:8]}"
+    repo.patch_snapshot(cid, {"seed": True})
+    created: dict[int, list[str]] = {}
+
+    def writer(t: int) -> None:
+        ids = []
+        for i in range(args.ops):
+            repo.patch_snapshot(cid, {f"w{t}_{i}": i})
+            repo.set_last_turn_inbox_id(cid, t * args.ops + i)
+            if i % 5 == 0:
+                ids.append(repo.create_payment_intent(cid, 1000 + i)["id"])
+        for pid in ids:
+            repo.update_payment_status(cid, pid, "approved")
+        created[t] = ids
+
+    _parallel(args.threads, writer)
+    snap = repo.load_context(cid)["snapshot"]
+    missing = [f"w{t}_{i}" for t in range(args.threads) for i in range(args.ops) if f"w{t}_{i}" not in snap]
+    expected_max = args.threads * args.ops - 1
+    pids = {p["id"]: p["status"] for p in snap.get("payments", [])}
+    want = [pid for ids in created.values() for pid in ids]
+    lost_payments = [pid for pid in want if pid not in pids]
+    wrong_status = [pid for pid in want if pid in pids and pids[pid] != "approved"]
+    ok = not missing and snap.get("last_turn_inbox_id") == expected_max and not lost_payments and not wrong_status
+    print(f"atômico   chaves perdidas={len(missing)} last_turn_inbox_id={snap.get('last_turn_inbox_id')}"
+          f" (esperado {expected_max}) pagamentos perdidos={len(lost_payments)}/{len(want)}"
+          f" status errados={len(wrong_status)} → {'OK' if ok else 'FALHOU'}")
+    return ok
+
+def check_legacy(args) -> None:
+    cid = f"snapcheck-legacy-{uuid.uuid4().hex[:8]}"
+    _legacy_patch(cid, "seed", True)
+    _parallel(args.threads, lambda t: [_legacy_patch(cid, f"w{t}_{i}", i) for i in range(args.ops)])
+    snap = repo.load_context(cid)["snapshot"]
+    lost = sum(1 for t in range(args.threads) for i in range(args.ops) if f"w{t}_{i}" not in snap)
+    print(f"legado    chaves perdidas={lost}/{args.threads * args.ops} (read-modify-write, referência)")
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, default=16)
+    ap.add_argument("--ops", type=int, default=50)
+    args = ap.parse_args()
+    bootstrap_di()
+    check_legacy(args)
+    sys.exit(0 if check_atomic(args) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+
+"""Tokens do prompt do roteador por turno: catálogo inteiro (antes) vs. seleção por relevância (depois).
+
+Fonte das conversas gravadas:
+- padrão: eventos ``coalesce_done``/``router_choice`` em ``conversation_events`` (HB_DATABASE_URL);
+- ``--jsonl arquivo``: linhas ``{"text": "...", "cart": ["BX2"], "skus": ["BX3"]}`` (``cart`` e ``skus``
+  opcionais; ``skus`` = itens que o cliente de fato pediu, para medir se a seleção os incluiu).
+
+Catálogo: ``--catalog`` (padrão ``HB_CATALOG_PATH``) mais ``--synthetic-items`` itens sintéticos para simular
+o cardápio completo (combos, adicionais). Tokens estimados (~4 caracteres/token).
+
+    PYTHONPATH=src python scripts/report_catalog_prompt.py --jsonl conversas.jsonl --synthetic-items 800
+"""
+from __future__ import annotations
+import argparse, json, os, statistics, sys, time
+from typing import Any, Dict, List
+
+sys.path.insert(0, os.path.dirname(__file__))
+from bench_catalog_search import synthetic_catalog  # noqa: E402
+from hamburgueria_bot.core.catalog import Catalog, estimate_tokens, load_catalog  # noqa: E402
+from hamburgueria_bot.core.catalog_prompt import select_for_prompt  # noqa: E402
+from hamburgueria_bot.core.prompting import PromptBuilder  # noqa: E402
+from hamburgueria_bot.adk.agents.saudacao import AgenteSaudacao  # noqa: E402
+from hamburgueria_bot.adk.agents.cardapio import AgenteCardapio  # noqa: E402
+from hamburgueria_bot.adk.agents.carrinho import AgenteCarrinho  # noqa: E402
+from hamburgueria_bot.adk.agents.endereco import AgenteEndereco  # noqa: E402
+from hamburgueria_bot.adk.agents.pagamento import AgentePagamento  # noqa: E402
+
+AGENTES = [{"nome": a.nome, "objetivo": a.objetivo,
+            "tools": [{"name": t["function"]["name"], "description": t["function"]["description"]} for t in a.list_tools()]}
+           for a in (AgenteSaudacao, AgenteCardapio, AgenteCarrinho, AgenteEndereco, AgentePagamento)]
+
+def _catalog(path: str | None, synthetic: int, max_items: int) -> Catalog:
+    if path:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    else:
+        data = load_catalog()
+    if synthetic:
+        data.setdefault("categories", []).extend(synthetic_catalog(synthetic)["categories"])
+    return Catalog(data, prompt_max_items=max_items)
+
+def _examples(jsonl: str | None) -> List[Dict[str, Any]]:
+    if jsonl:
+        with open(jsonl, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    from hamburgueria_bot.core.di import bootstrap_di
+    from hamburgueria_bot.adk.prerouter import load_router_examples
+    bootstrap_di()
+    return load_router_examples()
+
+def _pct(xs: List[float], q: float) -> float:
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(len(xs) * q))]
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jsonl")
+    ap.add_argument("--catalog")
+    ap.add_argument("--synthetic-items", type=int, default=0)
+    ap.add_argument("--max-items", type=int, default=120, help="HB_CATALOG_PROMPT_MAX_ITEMS")
+    ap.add_argument("--budget", type=int, default=1200, help="HB_CATALOG_PROMPT_BUDGET_TOKENS")
+    args = ap.parse_args()
+
+    cat = _catalog(args.catalog, args.synthetic_items, args.max_items)
+    examples = [e for e in _examples(args.jsonl) if e.get("text")]
+    if not examples:
+        raise SystemExit("sem exemplos")
+    b = PromptBuilder()
+    conversa = {"ultimas": []}
+    before: List[int] = []
+    after: List[int] = []
+    sel_us: List[float] = []
+    listed: List[int] = []
+    wanted = covered = 0
+    for e in examples:
+        ctx = {"memory_summary": "", "snapshot": {}}
+        before.append(estimate_tokens(b.router_system(contexto=ctx | {"catalog_text": cat.prompt_text},
+                                                      agentes=AGENTES, conversa=conversa)))
+        t0 = time.perf_counter()
+        sel = select_for_prompt(cat, e["text"], e.get("cart", []), args.budget)
+        sel_us.append((time.perf_counter() - t0) * 1e6)
+        after.append(estimate_tokens(b.router_system(
+            contexto=ctx | {"catalog_text": sel.summary, "catalog_relevant": sel.relevant}, agentes=AGENTES,
+            conversa=conversa)))
+        listed.append(sel.items)
+        shown = sel.summary + "\n" + sel.relevant
+        for sku in e.get("skus", []):
+            wanted += 1
+            covered += f"{sku} •" in shown
+
+    print(f"catálogo: {len(cat)} itens (versão {cat.version}), texto inteiro ~{estimate_tokens(cat.prompt_text)} tokens, "
+          f"orçamento {args.budget}; turnos: {len(examples)}")
+    for name, xs in (("antes", before), ("depois", after)):
+        print(f"{name:7} tokens/turno (roteador): média {statistics.mean(xs):7.0f}  p50 {_pct(xs, .5):6}  p95 {_pct(xs, .95):6}")
+    print(f"redução média {1 - statistics.mean(after) / statistics.mean(before):.1%}; "
+          f"itens listados/turno {statistics.mean(listed):.1f}; seleção p50 {_pct(sel_us, .5):.0f} µs p99 {_pct(sel_us, .99):.0f} µs")
+    if wanted:
+        print(f"itens pedidos presentes no prompt: {covered}/{wanted} ({covered / wanted:.1%})")
+
+if __name__ == "__main__":
+    main()
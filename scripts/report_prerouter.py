@@ -0,0 +1,81 @@
+
+"""Relatório do pré-roteador: cobertura (hit rate), acurácia vs. escolha do LLM e latência.
+
+Fonte dos exemplos:
+- padrão: eventos ``router_choice``/``coalesce_done`` em ``conversation_events`` (HB_DATABASE_URL);
+- ``--jsonl arquivo``: linhas ``{"text": "...", "agent": "cardapio", "latency_ms": 850}``.
+
+Divide 80/20 (determinístico por hash do texto), treina o modelo hasheado no treino e avalia no teste:
+regras sozinhas vs. regras + modelo. ``--save caminho`` grava o modelo treinado com todos os exemplos
+(use em HB_PREROUTER_MODEL_PATH).
+
+    PYTHONPATH=src python scripts/report_prerouter.py --jsonl eventos.jsonl --threshold 0.85
+"""
+from __future__ import annotations
+import argparse, json, statistics, time, zlib
+from kink import di
+from hamburgueria_bot.core.catalog import Catalog
+from hamburgueria_bot.adk.prerouter import HashedNgramModel, PreRouter, load_router_examples
+
+def _evaluate(pr: PreRouter, test: list[dict], use_model: bool) -> dict:
+    hits = correct = 0
+    lat_us: list[float] = []
+    for ex in test:
+        t0 = time.perf_counter()
+        out = pr.classify(ex["text"], use_model=use_model)
+        lat_us.append((time.perf_counter() - t0) * 1e6)
+        if out is not None:
+            hits += 1
+            correct += out.agente == ex["agent"]
+    lat_us.sort()
+    return {
+        "hit_rate": round(hits / max(len(test), 1), 3),
+        "accuracy_on_hits": round(correct / hits, 3) if hits else None,
+        "p50_us": round(statistics.median(lat_us), 1) if lat_us else None,
+        "p99_us": round(lat_us[int(len(lat_us) * 0.99) - 1], 1) if lat_us else None,
+    }
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jsonl")
+    ap.add_argument("--threshold", type=float, default=0.85)
+    ap.add_argument("--llm-ms", type=float, help="latência do roteador LLM (padrão: mediana dos eventos)")
+    ap.add_argument("--save")
+    args = ap.parse_args()
+
+    if args.jsonl:
+        with open(args.jsonl, encoding="utf-8") as f:
+            examples = [json.loads(line) for line in f if line.strip()]
+        di[Catalog] = Catalog.load()
+    else:
+        from hamburgueria_bot.core.di import bootstrap_di
+        bootstrap_di()
+        examples = load_router_examples()
+    examples = [e for e in examples if e.get("text") and e.get("agent")]
+    if not examples:
+        raise SystemExit("sem exemplos")
+
+    train = [e for e in examples if zlib.crc32(e["text"].encode()) % 5]
+    test = [e for e in examples if not zlib.crc32(e["text"].encode()) % 5] or examples
+    model = HashedNgramModel().fit([(e["text"], e["agent"]) for e in train])
+    pr = PreRouter(threshold=args.threshold, model=model)
+
+    llm_lat = [e["latency_ms"] for e in examples if e.get("latency_ms")]
+    llm_ms = args.llm_ms or (statistics.median(llm_lat) if llm_lat else None)
+
+    print(f"exemplos: {len(examples)} (treino {len(train)}, teste {len(test)}), threshold={args.threshold}")
+    for name, use_model in (("regras", False), ("regras+modelo", True)):
+        r = _evaluate(pr, test, use_model)
+        line = (f"{name:14} hit_rate={r['hit_rate']:.1%} acurácia={r['accuracy_on_hits']} "
+                f"latência p50={r['p50_us']}µs p99={r['p99_us']}µs")
+        if llm_ms:
+            saved = r["hit_rate"] * llm_ms
+            line += f" | roteador LLM ~{llm_ms:.0f} ms → economia média {saved:.0f} ms/turno"
+        print(line)
+
+    if args.save:
+        HashedNgramModel().fit([(e["text"], e["agent"]) for e in examples]).save(args.save)
+        print(f"modelo salvo em {args.save}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+
+"""Cache de prefixo por layout de prompt: hit ratio e tokens de entrada por turno (gateway stub).
+
+Para cada layout (``classic`` e ``cache``) simula turnos de várias conversas (roteador + agente) com
+contexto/últimas mensagens variando, chamando o ``LLMClient`` real contra ``stub_gateway`` — que emula o
+cache automático de prefixo (blocos de 128 tokens a partir de 1024) e devolve ``cached_tokens``.
+
+    PYTHONPATH=src python scripts/report_prompt_cache.py --turns 200 --synthetic-items 150
+"""
+from __future__ import annotations
+import argparse, os, sys
+from pydantic import BaseModel
+
+sys.path.insert(0, os.path.dirname(__file__))
+import stub_gateway  # noqa: E402
+
+for k, v in {"HB_DATABASE_URL": "postgresql+psycopg://x@localhost/x", "HB_WHATSAPP_TOKEN": "x",
+             "HB_WHATSAPP_PHONE_NUMBER_ID": "x", "HB_APP_SECRET": "x", "HB_VERIFY_TOKEN": "x"}.items():
+    os.environ.setdefault(k, v)
+
+from hamburgueria_bot.core.settings import Settings  # noqa: E402
+from hamburgueria_bot.core.llm_client import LLMClient, track_usage  # noqa: E402
+from hamburgueria_bot.core.prompting import PromptBuilder  # noqa: E402
+from hamburgueria_bot.core.catalog import load_catalog, flatten_for_prompt  # noqa: E402
+
+class Out(BaseModel):
+    agente_escolhido: str
+    motivo: str
+
+AGENTES = [{"nome": n, "objetivo": f"objetivo do agente {n}", "tools": [{"name": f"{n}_tool", "description": "..."}]}
+           for n in ("saudacao", "cardapio", "carrinho", "endereco", "pagamento")]
+
+def _catalog_text(items: int, synthetic: int) -> str:
+    """Catálogo real (se houver) + ``synthetic`` itens sintéticos — prompts < 1024 tokens nunca entram no cache."""
+    try:
+        text = flatten_for_prompt(load_catalog(), max_items=items)
+    except FileNotFoundError:
+        text = ""
+    extra = "\n".join(f"- SYN{i}: Lanche sintético {i} com queijo e molho da casa — R$ {10 + i % 30}.90"
+                      for i in range(synthetic))
+    return "\n".join(t for t in (text, extra) if t)
+
+def _run(layout: str, cli: LLMClient, turns: int, catalog_text: str) -> dict:
+    stub_gateway._seen_prefixes.clear()
+    b = PromptBuilder(layout=layout)
+    tot = {"prompt": 0, "cached": 0}
+    for i in range(turns):
+        ctx = {"memory_summary": f"conversa {i % 17}", "snapshot": {"cart": [{"sku": "BX2", "qty": i % 4}], "turn": i},
+               "catalog_text": catalog_text}
+        conversa = {"ultimas": [f"mensagem {i}", f"mensagem {i - 1}"]}
+        with track_usage() as u:
+            cli.complete_json(b.router_system(contexto=ctx, agentes=AGENTES, conversa=conversa), f"msg {i}", Out)
+            cli.complete_json(b.agent_system(nome="cardapio", objetivo="apresentar o cardápio",
+                                             ferramentas=[{"name": "listar", "description": "lista itens"}],
+                                             contexto=ctx, exemplos=[{"user": "oi", "resposta": "olá"}]), f"msg {i}", Out)
+        tot["prompt"] += u.prompt
+        tot["cached"] += u.cached
+    return {"layout": layout, "input_tokens_per_turn": round(tot["prompt"] / turns, 1),
+            "cached_per_turn": round(tot["cached"] / turns, 1),
+            "hit_ratio": round(tot["cached"] / tot["prompt"], 3) if tot["prompt"] else 0.0}
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--turns", type=int, default=200)
+    ap.add_argument("--catalog-items", type=int, default=120)
+    ap.add_argument("--synthetic-items", type=int, default=0, help="itens extras para simular um cardápio maior")
+    args = ap.parse_args()
+    srv = stub_gateway.start_stub(0, {})
+    os.environ["HB_LITELLM_BASE_URL"] = f"http://127.0.0.1:{srv.server_address[1]}"
+    cli = LLMClient(Settings(litellm_hedge_enabled=False))
+    catalog_text = _catalog_text(args.catalog_items, args.synthetic_items)
+    try:
+        for layout in ("classic", "cache"):
+            r = _run(layout, cli, args.turns, catalog_text)
+            print(f"{r['layout']:8} tokens de entrada/turno={r['input_tokens_per_turn']:8.1f} "
+                  f"em cache/turno={r['cached_per_turn']:8.1f} hit ratio={r['hit_ratio']:.1%}")
+    finally:
+        cli.close()
+        srv.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+
+"""Avaliação offline do cache semântico (``core/semantic_cache.py``): hit rate, falsos hits e latência economizada.
+
+Entrada: JSONL gravado (``{"text": ..., "intent": ...}`` por linha, em ordem de chegada; ``intent`` é o rótulo da
+resposta certa, p.ex. ``preco:BX3``) ou, sem ``--jsonl``, um conjunto sintético do catálogo: perguntas de
+disponibilidade, preço e ingredientes por item em variações de escrita ("tem duplo bacon?", "vcs tem bacon
+duplo", "qto ta o bacon duplo") e pedidos ("quero um duplo bacon"), que nunca devem ir ao cache.
+Replay: cada mensagem consulta o cache; erro = "chamada ao LLM" e a resposta (o rótulo) é gravada. Hit com
+rótulo diferente é falso hit. Para cada limiar de ``--thresholds``:
+- hit rate (hits / consultas) e cobertura (hits verdadeiros / consultas cujo rótulo já tinha sido visto);
+- falsos hits (/ hits);
+- latência economizada: hits verdadeiros × ``--llm-ms`` menos o custo das consultas (p50/p99 em µs).
+``--no-guard`` desliga a assinatura (item + números) para medir o quanto ela evita de falsos hits.
+    PYTHONPATH=src python scripts/report_semantic_cache.py --thresholds 0.7,0.8,0.9
+"""
+from __future__ import annotations
+import argparse, json, os, random, statistics, time
+from typing import List, Tuple
+
+for k, v in {"HB_DATABASE_URL": "postgresql+psycopg://x@localhost/x", "HB_WHATSAPP_TOKEN": "x",
+             "HB_WHATSAPP_PHONE_NUMBER_ID": "x", "HB_APP_SECRET": "x", "HB_VERIFY_TOKEN": "x",
+             "HB_LITELLM_BASE_URL": "http://127.0.0.1:1"}.items():
+    os.environ.setdefault(k, v)
+
+from kink import di  # noqa: E402
+from hamburgueria_bot.core.settings import Settings  # noqa: E402
+from hamburgueria_bot.core.catalog import Catalog, load_catalog  # noqa: E402
+from hamburgueria_bot.core.text import fold  # noqa: E402
+from hamburgueria_bot.core.semantic_cache import SemanticCache, cacheable  # noqa: E402
+
+TEMPLATES = {
+    "disponivel": ["tem {x}?", "vcs tem {x}", "vocês vendem {x}?", "ainda tem {x} hoje?", "teria {x}?", "rola {x}?"],
+    "preco": ["quanto custa o {x}?", "qual o preço do {x}", "qto ta o {x}", "valor do {x}?", "quanto sai o {x}",
+              "qual o valor do {x}?"],
+    "ingredientes": ["o que vem no {x}?", "quais os ingredientes do {x}", "o {x} vem com o que?",
+                     "ingredientes do {x}", "como é o {x}?"],
+    "pedido": ["quero um {x}", "adiciona 2 {x}", "manda um {x} pra mim", "coloca {x} no pedido"],
+}
+
+Record = Tuple[str, str]
+
+def _variants(name: str) -> List[str]:
+    words = name.split()
+    out = [name, fold(name), " ".join(reversed(words))]
+    if len(words) > 1:
+        out.append(max(words, key=len))
+    return list(dict.fromkeys(out))
+
+def synthetic(repeat: int, seed: int = 11) -> List[Record]:
+    items = [i for c in load_catalog()["categories"] for i in c["items"]]
+    base = [(t.format(x=v), f"{intent}:{it['sku']}") for it in items for v in _variants(it["name"])
+            for intent, ts in TEMPLATES.items() for t in ts]
+    recs = base * repeat
+    random.Random(seed).shuffle(recs)
+    return recs
+
+def load_jsonl(path: str) -> List[Record]:
+    with open(path, encoding="utf-8") as f:
+        return [(r["text"], r["intent"]) for r in map(json.loads, filter(str.strip, f))]
+
+def replay(records: List[Record], threshold: float, guard: bool, settings: Settings) -> dict:
+    cache = SemanticCache(threshold=threshold, settings=settings)
+    if not guard:
+        cache._prepare = lambda texto, f=cache._prepare: (f(texto)[0], 0)  # type: ignore[method-assign]
+    seen: set[str] = set()
+    hits = false = eligible = skipped = 0
+    lookup_us: List[float] = []
+    for text, label in records:
+        if not cacheable(text):
+            skipped += 1
+            continue
+        eligible += label in seen
+        t0 = time.perf_counter()
+        value, _ = cache.lookup("agent.cardapio", "eval", text)
+        lookup_us.append((time.perf_counter() - t0) * 1e6)
+        if value is None:
+            cache.put("agent.cardapio", "eval", text, {"content": label})
+            seen.add(label)
+            continue
+        hits += 1
+        false += value["content"] != label
+    lookup_us.sort()
+    return {"lookups": len(lookup_us), "hits": hits, "false": false, "eligible": eligible, "skipped": skipped,
+            "p50_us": statistics.median(lookup_us), "p99_us": lookup_us[int(len(lookup_us) * 0.99) - 1]}
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--jsonl", help="mensagens gravadas: {\"text\", \"intent\"} por linha")
+    ap.add_argument("--repeat", type=int, default=1, help="cópias de cada mensagem sintética (1 = só paráfrases)")
+    ap.add_argument("--thresholds", default="0.6,0.7,0.75,0.8,0.85,0.9")
+    ap.add_argument("--llm-ms", type=float, default=900, help="latência média de um turno do agente no LLM")
+    ap.add_argument("--no-guard", action="store_true", help="sem assinatura (item + números)")
+    args = ap.parse_args()
+
+    settings = Settings()
+    di[Settings] = settings
+    di[Catalog] = Catalog(load_catalog())
+    records = load_jsonl(args.jsonl) if args.jsonl else synthetic(args.repeat)
+    print(f"mensagens: {len(records)} ({'gravadas' if args.jsonl else 'sintéticas'}); "
+          f"rótulos: {len({r[1] for r in records})}; assinatura: {'não' if args.no_guard else 'sim'}")
+    print(f"{'limiar':>6} {'hit rate':>9} {'cobertura':>10} {'falsos':>8} {'economia s':>11} {'lookup p50 µs':>14} {'p99 µs':>8}")
+    for th in (float(t) for t in args.thresholds.split(",")):
+        r = replay(records, th, not args.no_guard, settings)
+        saved = ((r["hits"] - r["false"]) * args.llm_ms - r["lookups"] * r["p50_us"] / 1000) / 1000
+        print(f"{th:6.2f} {r['hits'] / r['lookups']:9.1%} {(r['hits'] - r['false']) / max(1, r['eligible']):10.1%} "
+              f"{r['false'] / max(1, r['hits']):8.1%} {saved:11.1f} {r['p50_us']:14.0f} {r['p99_us']:8.0f}")
+    print(f"fora do cache (pedidos): {r['skipped']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+
+"""Gateway LiteLLM de mentira (``POST /chat/completions``) para testes locais e benchmarks.
+
+- Latência configurável por modelo: ``--latency gpt-a=200:800@0.1`` → 200 ms, mas 800 ms em 10% das
+  chamadas (cauda), útil para exercitar hedging.
+- Resposta: JSON do roteador quando ``response_format`` é pedido; senão ``{"texto": "..."}``.
+- Inclui ``usage`` no formato OpenAI, emulando o cache de prefixo automático (blocos de 128 "tokens"
+  a partir de 1024, ~4 chars/token): ``prompt_tokens_details.cached_tokens`` conta o maior prefixo já visto.
+- ``"stream": true``: mesma resposta em SSE (``text/event-stream``). Primeiro chunk após a latência do modelo,
+  depois um chunk a cada ``--token-ms``; sem streaming, a resposta sai de uma vez após o mesmo tempo total de
+  geração (``--token-ms`` 0, o padrão, mantém o comportamento antigo).
+- ``--tool-first``: com ``tools`` e sem resultado de tool na conversa, responde chamando a 1ª tool (args ``{}``);
+  ``--long-reply``: ``{"texto": ...}`` longo, com vários parágrafos (para a entrega antecipada do streaming).
+
+Uso standalone:
+    python scripts/stub_gateway.py --port 4000 --latency gpt-4o-mini=150:1500@0.05 --token-ms 15
+Ou embutido (``start_stub(port, latencies, token_ms, ...)`` retorna o servidor rodando numa thread).
+"""
+from __future__ import annotations
+import argparse, json, random, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, Tuple
+
+Latency = Tuple[float, float, float]  # (base_ms, tail_ms, tail_prob)
+
+CACHE_MIN_CHARS, CACHE_BLOCK_CHARS = 1024 * 4, 128 * 4
+_seen_prefixes: set[int] = set()
+_seen_lock = threading.Lock()
+
+LONG_TEXTO = (
+    "Claro! Nosso X-Burger leva pão brioche, blend de 160 g, queijo prato e molho da casa. "
+    "O X-Bacon acrescenta bacon crocante e cebola caramelizada, e sai por R$ 32,90. "
+    "Se preferir algo mais leve, o smash simples custa R$ 24,90.\n\n"
+    "Para acompanhar, temos batata frita pequena, média e grande, além de onion rings. "
+    "As bebidas incluem refrigerante lata, suco natural e água. "
+    "Quer que eu adicione algum desses itens ao seu carrinho?"
+)
+
+def _cached_chars(prompt: str) -> int:
+    """Maior prefixo (em blocos) já visto em requisições anteriores; registra os prefixos deste prompt."""
+    cached, hit = 0, True
+    with _seen_lock:
+        for cut in range(CACHE_MIN_CHARS, len(prompt) + 1, CACHE_BLOCK_CHARS):
+            h = hash(prompt[:cut])
+            hit = hit and h in _seen_prefixes
+            if hit:
+                cached = cut
+            _seen_prefixes.add(h)
+    return cached
+
+def parse_latency(spec: str) -> Tuple[str, Latency]:
+    """``modelo=base[:cauda@prob]`` → (modelo, (base, cauda, prob))."""
+    model, _, rest = spec.partition("=")
+    base, _, tail = rest.partition(":")
+    tail_ms, _, prob = tail.partition("@")
+    return model, (float(base), float(tail_ms or base), float(prob or 0))
+
+def _wants_tool(body: dict, tool_first: bool) -> bool:
+    return tool_first and bool(body.get("tools")) and not any(m.get("role") == "tool" for m in body.get("messages", []))
+
+def _content(body: dict, long_reply: bool) -> str:
+    if body.get("response_format"):
+        return json.dumps({"agente_escolhido": "saudacao", "motivo": "stub", "acoes_imediatas": [], "handoff": False})
+    return json.dumps({"texto": LONG_TEXTO if long_reply else "Olá! Resposta do gateway de teste."}, ensure_ascii=False)
+
+def _reply(body: dict, tool_first: bool = False, long_reply: bool = False) -> dict:
+    if _wants_tool(body, tool_first):
+        content = "{}"
+        message = {"role": "assistant", "content": None, "tool_calls": [
+            {"id": "call_0", "type": "function", "function": {"name": body["tools"][0]["function"]["name"], "arguments": content}}]}
+        finish = "tool_calls"
+    else:
+        content = _content(body, long_reply)
+        message, finish = {"role": "assistant", "content": content}, "stop"
+    return {
+        "id": f"stub-{time.time_ns()}",
+        "object": "chat.completion",
+        "model": body.get("model"),
+        "choices": [{"index": 0, "finish_reason": finish, "message": message}],
+        "usage": _usage(body, content),
+    }
+
+def _usage(body: dict, content: str) -> dict:
+    prompt = "".join(str(m.get("content") or "") for m in body.get("messages", []))
+    return {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+            "prompt_tokens_details": {"cached_tokens": _cached_chars(prompt) // 4},
+            "total_tokens": (len(prompt) + len(content)) // 4}
+
+def _pieces(s: str, size: int) -> Iterator[str]:
+    for i in range(0, len(s), size):
+        yield s[i:i + size]
+
+def _stream_chunks(body: dict, tool_first: bool = False, long_reply: bool = False,
+                   usage: bool = True) -> Iterator[Dict[str, Any]]:
+    """Chunks ``chat.completion.chunk`` da resposta em streaming (ver docstring do módulo)."""
+    base = {"id": f"stub-{time.time_ns()}", "object": "chat.completion.chunk", "model": body.get("model")}
+    if _wants_tool(body, tool_first):
+        name = body["tools"][0]["function"]["name"]
+        args = "{}"
+        yield base | {"choices": [{"index": 0, "delta": {"role": "assistant", "tool_calls": [
+            {"index": 0, "id": "call_0", "type": "function", "function": {"name": name, "arguments": ""}}]}}]}
+        for piece in _pieces(args, 1):
+            yield base | {"choices": [{"index": 0, "delta": {"tool_calls": [
+                {"index": 0, "function": {"arguments": piece}}]}}]}
+        # o "modelo" segue gerando um pouco depois da chamada (tempo que a tool já aproveita)
+        for _ in range(5):
+            yield base | {"choices": [{"index": 0, "delta": {}}]}
+        content, finish = args, "tool_calls"
+    else:
+        content = _content(body, long_reply)
+        for piece in _pieces(content, 6):
+            yield base | {"choices": [{"index": 0, "delta": {"content": piece}}]}
+        finish = "stop"
+    yield base | {"choices": [{"index": 0, "delta": {}, "finish_reason": finish}]}
+    if usage:
+        yield base | {"choices": [], "usage": _usage(body, content)}
+
+def make_handler(latencies: Dict[str, Latency], token_ms: float = 0.0, tool_first: bool = False,
+                 long_reply: bool = False):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def do_POST(self) -> None:
+            n = int(self.headers.get("content-length") or 0)
+            body = json.loads(self.rfile.read(n) or b"{}")
+            base, tail, prob = latencies.get(body.get("model"), (50.0, 50.0, 0.0))
+            time.sleep((tail if random.random() < prob else base) / 1000.0)
+            if body.get("stream"):
+                self._stream(body)
+                return
+            if token_ms:
+                time.sleep(token_ms * sum(1 for _ in _stream_chunks(body, tool_first, long_reply, usage=False)) / 1000.0)
+            data = json.dumps(_reply(body, tool_first, long_reply)).encode()
+            try:
+                self.send_response(200)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # cliente cancelou (ex.: perdedor de um hedge)
+
+        def _stream(self, body: dict) -> None:
+            self.close_connection = True  # sem content-length: o fim do corpo é o fechamento da conexão
+            try:
+                self.send_response(200)
+                self.send_header("content-type", "text/event-stream")
+                self.send_header("connection", "close")
+                self.end_headers()
+                for i, chunk in enumerate(_stream_chunks(body, tool_first, long_reply)):
+                    if i:
+                        time.sleep(token_ms / 1000.0)
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+    return Handler
+
+def start_stub(port: int = 0, latencies: Dict[str, Latency] | None = None, token_ms: float = 0.0,
+               tool_first: bool = False, long_reply: bool = False) -> ThreadingHTTPServer:
+    """Sobe o stub numa thread daemon; ``server.server_address[1]`` tem a porta efetiva."""
+    srv = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latencies or {}, token_ms, tool_first, long_reply))
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, name="stub-gateway", daemon=True).start()
+    return srv
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=4000)
+    ap.add_argument("--latency", action="append", default=[], help="modelo=base[:cauda@prob] (ms)")
+    ap.add_argument("--token-ms", type=float, default=0.0, help="intervalo entre chunks (ms) = tempo de geração")
+    ap.add_argument("--tool-first", action="store_true")
+    ap.add_argument("--long-reply", action="store_true")
+    args = ap.parse_args()
+    srv = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(
+        dict(parse_latency(s) for s in args.latency), args.token_ms, args.tool_first, args.long_reply))
+    print(f"stub gateway em http://127.0.0.1:{args.port}")
+    srv.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+
+"""Graph API (WhatsApp Cloud) de mentira: ``POST /<phone_id>/messages`` para testes locais e benchmarks.
+
+- Latência fixa configurável (``--latency-ms``) e taxa de erro opcional (``--error-rate``, responde 429
+  com o erro 130429 da Meta).
+- Use com ``HB_WHATSAPP_GRAPH_BASE_URL=http://127.0.0.1:<porta>``.
+
+    python scripts/stub_graph.py --port 4100 --latency-ms 80
+Ou embutido: ``start_stub_graph(port, latency_ms)`` (``server.sent`` guarda os corpos recebidos).
+"""
+from __future__ import annotations
+import argparse, json, random, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def make_handler(latency_ms: float, error_rate: float, sent: list):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+
+        def log_message(self, *args) -> None:
+            pass
+
+        def do_POST(self) -> None:
+            n = int(self.headers.get("content-length") or 0)
+            body = json.loads(self.rfile.read(n) or b"{}")
+            time.sleep(latency_ms / 1000.0)
+            if random.random() < error_rate:
+                status, out = 429, {"error": {"code": 130429, "message": "Rate limit hit"}}
+            else:
+                sent.append(body)
+                status, out = 200, {"messaging_product": "whatsapp", "messages": [{"id": f"wamid.stub{time.time_ns()}"}]}
+            data = json.dumps(out).encode()
+            try:
+                self.send_response(status)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+    return Handler
+
+def start_stub_graph(port: int = 0, latency_ms: float = 50.0, error_rate: float = 0.0) -> ThreadingHTTPServer:
+    """Sobe o stub numa thread daemon; ``server.server_address[1]`` tem a porta efetiva."""
+    sent: list = []
+    srv = ThreadingHTTPServer(("127.0.0.1", port), make_handler(latency_ms, error_rate, sent))
+    srv.daemon_threads = True
+    srv.sent = sent  # type: ignore[attr-defined]
+    threading.Thread(target=srv.serve_forever, name="stub-graph", daemon=True).start()
+    return srv
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=4100)
+    ap.add_argument("--latency-ms", type=float, default=50.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    args = ap.parse_args()
+    srv = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.latency_ms, args.error_rate, []))
+    print(f"stub graph em http://127.0.0.1:{args.port}")
+    srv.serve_forever()
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,8 @@
 
 """Classe base para agentes."""
 from abc import ABC, abstractmethod
+import asyncio
+from typing import Callable
 
 class BaseAgente(ABC):
     """Interface comum de agentes."""
@@ -8,6 +10,13 @@ class BaseAgente(ABC):
     prompt_sistema: str
 
     @abstractmethod
-    def processar(self, mensagem: str, contexto: dict) -> dict:
-        """Processa a mensagem e retorna dict serializável com RespostaFinalDTO."""
+    def processar(self, mensagem: str, contexto: dict, on_partial: Callable[[str], None] | None = None) -> dict:
+        """Processa a mensagem e retorna dict serializável com RespostaFinalDTO.
+
+        ``on_partial`` (opcional) recebe um trecho já entregável da resposta antes do fim da geração; o dict
+        retornado traz então só o restante (``texto`` pode vir vazio)."""
         raise NotImplementedError
+
+    async def aprocessar(self, mensagem: str, contexto: dict, on_partial: Callable[[str], None] | None = None) -> dict:
+        """Versão asyncio (app ASGI); por padrão roda ``processar`` numa thread."""
+        return await asyncio.to_thread(self.processar, mensagem, contexto, on_partial)
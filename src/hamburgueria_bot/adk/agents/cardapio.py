@@ -2,12 +2,15 @@
 """Agente de cardápio (LLM-first): catálogo vem no prompt; tools apenas executam.
 - add_item_by_sku (opcional): usa catálogo carregado (se houver) para validar e adicionar.
 - add_custom_item: adiciona item customizado com nome/preço informados pelo LLM/cliente.
+- search_catalog: texto livre → SKUs ranqueados (índice local do catálogo, sem LLM).
 """
 from pydantic import BaseModel, Field, PositiveInt, conint
 from .llm_agent import AgenteLLM
 from ..runtime.toolkit import ToolSpec
 from ...domain.services import cart_service
 from kink import di
+from ...core.catalog import Catalog
+from ..tools.catalog_tools import SearchCatalogArgs, search_catalog
 
 class AddBySkuArgs(BaseModel):
     conversation_id: str
@@ -21,20 +24,16 @@ class AddCustomArgs(BaseModel):
     qty: PositiveInt = 1
 
 def tool_add_by_sku(args: AddBySkuArgs):
-    catalog = di.get("catalog", {})
-    items = [it for c in catalog.get("categories",[]) for it in c.get("items",[])]
-    item = next((i for i in items if i.get("sku","").upper()==args.sku.upper()), None)
+    item = di[Catalog].get(args.sku)
     if not item:
         return {"ok": False, "reason": "SKU não encontrado no catálogo"}
-    cart_service.add_item(args.conversation_id, item["sku"], item["name"], item["price_cents"], args.qty)
-    return {"ok": True, "added":{"sku": item["sku"], "name": item["name"], "qty": args.qty, "unit_price_cents": item["price_cents"]},
-            "subtotal_cents": cart_service.calc_subtotal_cents(args.conversation_id)}
+    state = cart_service.add_item(args.conversation_id, item["sku"], item["name"], item["price_cents"], args.qty)
+    return state.model_dump() | {"ok": True}
 
 def tool_add_custom(args: AddCustomArgs):
     """Permite itens fora do catálogo (LLM-first de verdade)."""
-    cart_service.add_item(args.conversation_id, f"CUSTOM-{abs(hash(args.name))%9999}", args.name, args.price_cents, args.qty)
-    return {"ok": True, "added":{"name": args.name, "qty": args.qty, "unit_price_cents": args.price_cents},
-            "subtotal_cents": cart_service.calc_subtotal_cents(args.conversation_id)}
+    state = cart_service.add_item(args.conversation_id, f"CUSTOM-{abs(hash(args.name))%9999}", args.name, args.price_cents, args.qty)
+    return state.model_dump() | {"ok": True}
 
 AgenteCardapio = AgenteLLM(
     nome="cardapio",
@@ -43,7 +42,10 @@ AgenteCardapio = AgenteLLM(
         {"user":"quero 2 BX2","plano":"validar SKU e adicionar","resposta":"confirmação + subtotal"},
         {"user":"quero burger só com um pão","plano":"item customizado","resposta":"perguntas mínimas e adiciona custom com preço informado"},
     ],
-    tool_policy=("Prefira validar SKU; se for pedido fora do catálogo, use add_custom_item com preço informado."),
+    tool_policy=("Prefira validar SKU; se o cliente descrever o item por nome (\"x bacon\", \"refri lata\"), use search_catalog "
+                 "para achar o SKU antes de add_item_by_sku; se for pedido fora do catálogo, use add_custom_item com preço informado."),
+    semantic_cache=True,
 )
-AgenteCardapio.register_tool(ToolSpec(name="add_item_by_sku", description="Adiciona item por SKU do catálogo", args_schema=AddBySkuArgs, func=tool_add_by_sku))
-AgenteCardapio.register_tool(ToolSpec(name="add_custom_item", description="Adiciona item customizado com nome/preço", args_schema=AddCustomArgs, func=tool_add_custom))
+AgenteCardapio.register_tool(ToolSpec(name="add_item_by_sku", description="Adiciona item por SKU do catálogo", args_schema=AddBySkuArgs, func=tool_add_by_sku, resource="cart"))
+AgenteCardapio.register_tool(ToolSpec(name="add_custom_item", description="Adiciona item customizado com nome/preço", args_schema=AddCustomArgs, func=tool_add_custom, resource="cart"))
+AgenteCardapio.register_tool(ToolSpec(name="search_catalog", description="Busca itens do catálogo por texto livre (sem acento, tolera erro de digitação)", args_schema=SearchCatalogArgs, func=search_catalog, read_only=True))
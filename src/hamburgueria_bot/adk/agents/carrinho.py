@@ -7,6 +7,8 @@ from .llm_agent import AgenteLLM
 from ..runtime.toolkit import ToolSpec
 from ...domain.services import cart_service, menu_service
 from kink import di
+from ...core.catalog import Catalog
+from ..tools.catalog_tools import SearchCatalogArgs, search_catalog
 
 class GetStateArgs(BaseModel):
     conversation_id: str
@@ -28,26 +30,21 @@ class RemArgs(BaseModel):
     qty: PositiveInt = 1
 
 def tool_get_state(args: GetStateArgs):
-    items = cart_service.get_items(args.conversation_id)
-    subtotal = cart_service.calc_subtotal_cents(args.conversation_id)
-    return {"items": items, "subtotal_cents": subtotal}
+    return cart_service.get_state(args.conversation_id).model_dump()
 
 def tool_add_by_sku(args: AddBySkuArgs):
-    catalog = di.get("catalog", {})
-    items = [it for c in catalog.get("categories",[]) for it in c.get("items",[])]
-    item = next((i for i in items if i.get("sku","").upper()==args.sku.upper()), None)
+    item = di[Catalog].get(args.sku)
     if not item:
         return {"ok": False, "reason": "SKU não encontrado no catálogo"}
-    cart_service.add_item(args.conversation_id, item["sku"], item["name"], item["price_cents"], args.qty)
-    return tool_get_state(GetStateArgs(conversation_id=args.conversation_id)) | {"ok": True}
+    state = cart_service.add_item(args.conversation_id, item["sku"], item["name"], item["price_cents"], args.qty)
+    return state.model_dump() | {"ok": True}
 
 def tool_add_custom(args: AddCustomArgs):
-    cart_service.add_item(args.conversation_id, f"CUSTOM-{abs(hash(args.name))%9999}", args.name, args.price_cents, args.qty)
-    return tool_get_state(GetStateArgs(conversation_id=args.conversation_id)) | {"ok": True}
+    state = cart_service.add_item(args.conversation_id, f"CUSTOM-{abs(hash(args.name))%9999}", args.name, args.price_cents, args.qty)
+    return state.model_dump() | {"ok": True}
 
 def tool_rem(args: RemArgs):
-    cart_service.remove_item(args.conversation_id, args.sku, args.qty)
-    return tool_get_state(GetStateArgs(conversation_id=args.conversation_id)) | {"ok": True}
+    return cart_service.remove_item(args.conversation_id, args.sku, args.qty).model_dump() | {"ok": True}
 
 AgenteCarrinho = AgenteLLM(
     nome="carrinho",
@@ -56,9 +53,11 @@ AgenteCarrinho = AgenteLLM(
         {"user":"mostra meu carrinho","plano":"get_state","resposta":"listar itens e subtotal"},
         {"user":"adiciona 1 burger com pão único por 20 reais","plano":"add_custom_item","resposta":"confirmar e mostrar subtotal"},
     ],
-    tool_policy=("Use add_custom_item para itens fora do catálogo. Valide SKU quando fornecido."),
+    tool_policy=("Use add_custom_item para itens fora do catálogo. Valide SKU quando fornecido; sem SKU, use search_catalog "
+                 "com o texto do cliente e adicione o primeiro resultado se não houver ambiguidade."),
 )
-AgenteCarrinho.register_tool(ToolSpec(name="get_cart_state", description="Estado atual do carrinho", args_schema=GetStateArgs, func=tool_get_state))
-AgenteCarrinho.register_tool(ToolSpec(name="add_item_by_sku", description="Adiciona item por SKU", args_schema=AddBySkuArgs, func=tool_add_by_sku))
-AgenteCarrinho.register_tool(ToolSpec(name="add_custom_item", description="Adiciona item customizado com nome/preço", args_schema=AddCustomArgs, func=tool_add_custom))
-AgenteCarrinho.register_tool(ToolSpec(name="remove_from_cart", description="Remove/decrementa item", args_schema=RemArgs, func=tool_rem))
+AgenteCarrinho.register_tool(ToolSpec(name="get_cart_state", description="Estado atual do carrinho", args_schema=GetStateArgs, func=tool_get_state, read_only=True, resource="cart"))
+AgenteCarrinho.register_tool(ToolSpec(name="add_item_by_sku", description="Adiciona item por SKU", args_schema=AddBySkuArgs, func=tool_add_by_sku, resource="cart"))
+AgenteCarrinho.register_tool(ToolSpec(name="add_custom_item", description="Adiciona item customizado com nome/preço", args_schema=AddCustomArgs, func=tool_add_custom, resource="cart"))
+AgenteCarrinho.register_tool(ToolSpec(name="remove_from_cart", description="Remove/decrementa item", args_schema=RemArgs, func=tool_rem, resource="cart"))
+AgenteCarrinho.register_tool(ToolSpec(name="search_catalog", description="Busca itens do catálogo por texto livre (sem acento, tolera erro de digitação)", args_schema=SearchCatalogArgs, func=search_catalog, read_only=True))
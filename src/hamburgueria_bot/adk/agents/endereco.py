@@ -60,11 +60,14 @@ AgenteEndereco.register_tool(ToolSpec(
     name="upsert_address",
     description="Normaliza e salva o endereço informado",
     args_schema=UpsertArgs,
-    func=tool_upsert_address
+    func=tool_upsert_address,
+    resource="address",
 ))
 AgenteEndereco.register_tool(ToolSpec(
     name="get_address",
     description="Retorna o endereço salvo para esta conversa",
     args_schema=GetArgs,
-    func=tool_get_address
+    func=tool_get_address,
+    read_only=True,
+    resource="address",
 ))
@@ -1,27 +1,56 @@
 
 """Agente genérico orientado a prompt (PT-BR) com examples e política de tools."""
 from __future__ import annotations
+from concurrent.futures import Future, ThreadPoolExecutor
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Callable, Optional, List, Dict, Any, NamedTuple, Tuple
 from ...ports.interfaces import MensagemSaidaDTO
 from ...core.llm_client import LLMClient
-from ..runtime.toolkit import ToolRegistry, ToolSpec
+from ..runtime.toolkit import ToolRegistry, ToolSpec, track_tool_calls
 from ...core.prompting import PromptBuilder
+from ...core.settings import Settings
+from ...core.llm_stream import EarlyFlush
+from ...core.llm_cache import ResponseCache
+from ...core.semantic_cache import SemanticCache, cacheable
+from ...core.logging import get_logger
 from kink import di
-import json
+import asyncio, json
+
+log = get_logger()
+
+# Gravação do trecho antecipado fora do event loop do LLM (``on_text`` não pode bloquear).
+_PARTIALS = ThreadPoolExecutor(max_workers=4, thread_name_prefix="partial")
 
 class RespostaFinal(BaseModel):
     texto: str
 
+class _Plano(NamedTuple):
+    """Prompts e caches de uma chamada ao LLM do agente (``AgenteLLM._plan``)."""
+    system: str
+    user: str
+    kind: str
+    key: str
+    cache: ResponseCache | None
+    semantic: SemanticCache | None
+
 class AgenteLLM:
-    def __init__(self, nome: str, objetivo: str, exemplos: Optional[List[Dict[str, Any]]] = None, tool_policy: str | None = None):
+    def __init__(self, nome: str, objetivo: str, exemplos: Optional[List[Dict[str, Any]]] = None, tool_policy: str | None = None,
+                 semantic_cache: bool = False):
         self.nome = nome
         self.objetivo = objetivo
         self.exemplos = exemplos or []
         self.tool_policy = tool_policy
+        self.semantic_cache = semantic_cache  # respostas vêm do catálogo, não do contexto: paráfrases podem reaproveitar
         self.tools = ToolRegistry()
-        self.llm = di[LLMClient]
-        self.builder: PromptBuilder = di[PromptBuilder]
+
+    # Resolvidos no uso: agentes são instanciados no import, antes do bootstrap_di().
+    @property
+    def llm(self) -> LLMClient:
+        return di[LLMClient]
+
+    @property
+    def builder(self) -> PromptBuilder:
+        return di[PromptBuilder]
 
     def register_tool(self, spec: ToolSpec) -> None:
         self.tools.register(spec)
@@ -29,7 +58,46 @@ class AgenteLLM:
     def list_tools(self) -> list[dict]:
         return self.tools.openai_tools()
 
-    def processar(self, mensagem: str, contexto: dict) -> dict:
+    def processar(self, mensagem: str, contexto: dict, on_partial: Callable[[str], None] | None = None) -> dict:
+        """Responde via LLM + tools. Com ``HB_LITELLM_STREAM``, usa SSE; com ``HB_STREAM_EARLY_FLUSH`` e
+        ``on_partial``, o 1º trecho completo de respostas longas sai por ``on_partial`` durante a geração e a
+        resposta retornada traz só o restante. Com ``HB_LLM_CACHE_ENABLED``, respostas de turnos sem tools são
+        reaproveitadas para o mesmo contexto e mensagem (``core/llm_cache.py``); com ``HB_SEMANTIC_CACHE_ENABLED``
+        e ``semantic_cache=True``, também para paráfrases de consultas read-only (``core/semantic_cache.py``)."""
+        plan = self._plan(mensagem, contexto)
+        if isinstance(plan, dict):
+            return plan
+        with track_tool_calls() as called:
+            msg, flush = self._completar(plan.system, plan.user, on_partial)
+        return self._concluir(plan, msg, flush, called, mensagem, contexto)
+
+    async def aprocessar(self, mensagem: str, contexto: dict, on_partial: Callable[[str], None] | None = None) -> dict:
+        """``processar`` para código asyncio (``api/asgi.py``): espera o LLM sem prender a thread; as tools
+        seguem no pool do ``ToolBatch``."""
+        plan = self._plan(mensagem, contexto)
+        if isinstance(plan, dict):
+            return plan
+        with track_tool_calls() as called:
+            msg, flush = await self._acompletar(plan.system, plan.user, on_partial)
+        return self._concluir(plan, msg, flush, called, mensagem, contexto)
+
+    def _plan(self, mensagem: str, contexto: dict) -> dict | _Plano:
+        """Resposta vinda de cache (dict pronto) ou o que a chamada ao LLM precisa."""
+        cache = di[ResponseCache] if ResponseCache in di else None
+        kind = f"agent.{self.nome}"
+        key = ""
+        if cache is not None:
+            key = cache.key(kind, self.builder.version, {"agente": [self.objetivo, self.exemplos, self.tool_policy,
+                                                                    [t["function"]["name"] for t in self.list_tools()]],
+                                                         "contexto": contexto}, mensagem)
+            hit = cache.get(kind, key)
+            if hit is not None:
+                return self._resposta(hit["content"], contexto)
+        semantic = di[SemanticCache] if self.semantic_cache and SemanticCache in di and cacheable(mensagem or "") else None
+        if semantic is not None:
+            hit = semantic.get(kind, self.builder.version, mensagem)
+            if hit is not None:
+                return self._resposta(hit["content"], contexto)
         system = self.builder.agent_system(
             nome=self.nome,
             objetivo=self.objetivo,
@@ -42,8 +110,63 @@ class AgenteLLM:
             "Mensagem do cliente:\n" + (mensagem or "") +
             "\n\nInstruções: responda de forma natural em PT-BR. Se precisar, chame ferramentas."
         )
-        msg = self.llm.complete_with_tools_loop(system=system, user=user, tools_registry=self.tools, max_steps=4)
+        return _Plano(system, user, kind, key, cache, semantic)
+
+    def _concluir(self, plan: _Plano, msg: Dict[str, Any], flush: EarlyFlush | None, called: List[str],
+                  mensagem: str, contexto: dict) -> dict:
         content = msg.get("content", "") or ""
+        if plan.cache is not None and not called and content:
+            plan.cache.put(plan.kind, plan.key, {"content": content})
+        if plan.semantic is not None and content and all(self.tools.is_read_only(n) for n in called):
+            plan.semantic.put(plan.kind, self.builder.version, mensagem, {"content": content})
+        return self._resposta(content, contexto, flush)
+
+    def _completar(self, system: str, user: str,
+                   on_partial: Callable[[str], None] | None) -> Tuple[Dict[str, Any], EarlyFlush | None]:
+        """Loop de tools no modo configurado; devolve a mensagem final e o ``EarlyFlush`` usado (se houve)."""
+        settings: Settings | None = di[Settings] if Settings in di else None
+        if settings is None or not settings.litellm_stream:
+            return self.llm.complete_with_tools_loop(system=system, user=user, tools_registry=self.tools, max_steps=4), None
+        flush, pending = self._flush(settings, on_partial)
+        msg = self.llm.stream_with_tools_loop(system=system, user=user, tools_registry=self.tools, max_steps=4,
+                                              on_text=flush.feed if flush else None)
+        for f in pending:  # trecho antecipado gravado antes da resposta final (ordem do outbox)
+            try:
+                f.result()
+            except Exception as e:
+                log.info("partial_delivery_error", agent=self.nome, error=str(e))
+                flush.sent = 0  # type: ignore[union-attr]  # nada saiu: a resposta final vai inteira
+        return msg, flush
+
+    @staticmethod
+    def _flush(settings: Settings, on_partial: Callable[[str], None] | None) -> Tuple[EarlyFlush | None, List[Future]]:
+        """``EarlyFlush`` que grava o trecho antecipado fora do event loop do LLM (futures em ``pending``)."""
+        pending: List[Future] = []
+        if on_partial is None or not settings.stream_early_flush:
+            return None, pending
+        return EarlyFlush(lambda t: pending.append(_PARTIALS.submit(on_partial, t)), settings.stream_flush_min_chars), pending
+
+    async def _acompletar(self, system: str, user: str,
+                          on_partial: Callable[[str], None] | None) -> Tuple[Dict[str, Any], EarlyFlush | None]:
+        """``_completar`` sobre as versões assíncronas do ``LLMClient``."""
+        settings: Settings | None = di[Settings] if Settings in di else None
+        if settings is None or not settings.litellm_stream:
+            return await self.llm.acomplete_with_tools_loop(system=system, user=user, tools_registry=self.tools,
+                                                            max_steps=4), None
+        flush, pending = self._flush(settings, on_partial)
+        msg = await self.llm.astream_with_tools_loop(system=system, user=user, tools_registry=self.tools, max_steps=4,
+                                                     on_text=flush.feed if flush else None)
+        for f in pending:
+            try:
+                await asyncio.wrap_future(f)
+            except Exception as e:
+                log.info("partial_delivery_error", agent=self.nome, error=str(e))
+                flush.sent = 0  # type: ignore[union-attr]
+        return msg, flush
+
+    @staticmethod
+    def _resposta(content: str, contexto: dict, flush: EarlyFlush | None = None) -> dict:
+        """``{"texto": ...}`` (ou texto puro) → ``MensagemSaidaDTO``; sem o trecho já entregue por ``flush``."""
         texto = None
         try:
             data = json.loads(content)
@@ -53,5 +176,7 @@ class AgenteLLM:
             pass
         if texto is None:
             texto = str(content)[:4000]
+        if flush is not None:
+            texto = flush.remainder(texto)
         wa_id = contexto.get("wa_id")
         return MensagemSaidaDTO(wa_id=wa_id, texto=texto).model_dump()
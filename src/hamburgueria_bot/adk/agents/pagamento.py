@@ -24,9 +24,7 @@ class GetCartArgs(BaseModel):
     conversation_id: str
 
 def tool_get_cart_state(args: GetCartArgs):
-    items = cart_service.get_items(args.conversation_id)
-    subtotal = cart_service.calc_subtotal_cents(args.conversation_id)
-    return {"items": items, "subtotal_cents": subtotal}
+    return cart_service.get_state(args.conversation_id).model_dump()
 
 def tool_create_pix(args: CreatePixArgs):
     intent = repo.create_payment_intent(args.conversation_id, args.amount_cents)
@@ -55,6 +53,6 @@ AgentePagamento = AgenteLLM(
     ),
 )
 
-AgentePagamento.register_tool(ToolSpec(name="get_cart_state", description="Obtém subtotal do carrinho", args_schema=GetCartArgs, func=tool_get_cart_state))
-AgentePagamento.register_tool(ToolSpec(name="create_pix_charge", description="Cria cobrança PIX (mock)", args_schema=CreatePixArgs, func=tool_create_pix))
-AgentePagamento.register_tool(ToolSpec(name="check_pix_status", description="Consulta status da cobrança PIX", args_schema=CheckPixArgs, func=tool_check_pix))
+AgentePagamento.register_tool(ToolSpec(name="get_cart_state", description="Obtém subtotal do carrinho", args_schema=GetCartArgs, func=tool_get_cart_state, read_only=True, resource="cart"))
+AgentePagamento.register_tool(ToolSpec(name="create_pix_charge", description="Cria cobrança PIX (mock)", args_schema=CreatePixArgs, func=tool_create_pix, resource="payments"))
+AgentePagamento.register_tool(ToolSpec(name="check_pix_status", description="Consulta status da cobrança PIX", args_schema=CheckPixArgs, func=tool_check_pix, read_only=True, resource="payments"))
@@ -1,11 +1,23 @@
 
-"""Orquestrador LLM puro (PT-BR) com PromptBuilder, visão de ferramentas por agente e últimas mensagens."""
+"""Orquestrador LLM (PT-BR) com PromptBuilder, visão de ferramentas por agente e últimas mensagens.
+
+Antes do LLM, o pré-roteador determinístico (``adk/prerouter.py``) resolve mensagens óbvias.
+O catálogo entra por relevância e dentro do orçamento ``HB_CATALOG_PROMPT_BUDGET_TOKENS`` (``core/catalog_prompt.py``).
+Com ``HB_LLM_CACHE_ENABLED``, decisões do roteador LLM vêm do cache de respostas (``core/llm_cache.py``) quando
+prompt, contexto e mensagem (normalizada) se repetem.
+"""
 from pydantic import BaseModel, Field
 from kink import di
 import json
 from ..core.llm_client import LLMClient
 from ..core.prompting import PromptBuilder
 from ..core.context import last_messages
+from ..core.catalog import Catalog
+from ..core.catalog_prompt import DEFAULT_BUDGET_TOKENS, select_for_prompt
+from ..core.settings import Settings
+from ..core.metrics import metrics
+from ..core.llm_cache import ResponseCache
+from .prerouter import PreRouter
 
 class RouterOutput(BaseModel):
     agente_escolhido: str = Field(pattern=r"^(saudacao|cardapio|carrinho|endereco|pagamento)$")
@@ -18,7 +30,41 @@ class Orchestrator:
         self.llm = llm or di[LLMClient]
         self.builder: PromptBuilder = di[PromptBuilder]
 
-    def route(self, contexto: dict, mensagem: str) -> RouterOutput:
+    def route(self, contexto: dict, mensagem: str, conversa: dict | None = None, cart_skus: list[str] | None = None) -> RouterOutput:
+        """Escolhe o agente. ``conversa`` (últimas mensagens) e ``cart_skus`` vêm do ``TurnContext``; sem
+        ``conversa``, lê do banco."""
+        plan = self._plan(contexto, mensagem, conversa, cart_skus)
+        if isinstance(plan, RouterOutput):
+            return plan
+        system, user, key = plan
+        try:
+            return self._store(key, self.llm.complete_json(system, user, RouterOutput))
+        except Exception:
+            # Se não vier JSON: tenta interpretar texto puro como nome do agente
+            txt = self.llm.complete_with_tools_loop(system=system, user=user, tools_registry=None, max_steps=0)  # type: ignore
+            return self._from_text(txt)
+
+    async def aroute(self, contexto: dict, mensagem: str, conversa: dict | None = None,
+                     cart_skus: list[str] | None = None) -> RouterOutput:
+        """``route`` para código asyncio (``api/asgi.py``): a chamada ao LLM não prende a thread."""
+        plan = self._plan(contexto, mensagem, conversa, cart_skus)
+        if isinstance(plan, RouterOutput):
+            return plan
+        system, user, key = plan
+        try:
+            return self._store(key, await self.llm.acomplete_json(system, user, RouterOutput))
+        except Exception:
+            txt = await self.llm.acomplete_with_tools_loop(system=system, user=user, tools_registry=None, max_steps=0)
+            return self._from_text(txt)
+
+    def _plan(self, contexto: dict, mensagem: str, conversa: dict | None,
+              cart_skus: list[str] | None) -> RouterOutput | tuple[str, str, str]:
+        """Decisão sem LLM (pré-roteador ou cache) ou ``(system, user, chave do cache)`` para a chamada."""
+        pre = di[PreRouter].classify(mensagem) if PreRouter in di else None
+        if pre is not None:
+            metrics.incr("router.prerouter_hit")
+            return RouterOutput(agente_escolhido=pre.agente, motivo=f"prerouter:{pre.fonte} ({pre.confianca})")
+        metrics.incr("router.llm")
         agents = di["agents"]
         # Monta inventário de agentes com lista de tools
         agentes = []
@@ -32,20 +78,44 @@ class Orchestrator:
                 "objetivo": getattr(agente, "objetivo", ""),
                 "tools": [{"name": t.get("function",{}).get("name",""), "description": t.get("function",{}).get("description","" )} for t in tools],
             })
-        conversa = last_messages(contexto.get("wa_id",""), limit=5)
-        catalog_text = di.get("catalog_text", "")
-            system = self.builder.router_system(contexto=contexto | {"catalog_text": catalog_text}, agentes=agentes, conversa=conversa)
+        if conversa is None:
+            conversa = last_messages(contexto.get("wa_id",""), limit=5)
+        catalogo = self._catalog(mensagem, cart_skus or [])
+        system = self.builder.router_system(contexto=contexto | catalogo, agentes=agentes, conversa=conversa)
         user = f"Mensagem atual do cliente: {mensagem}\nRetorne preferencialmente JSON no schema acordado."
-        try:
-            out = self.llm.complete_json(system, user, RouterOutput)
-            return out
-        except Exception:
-            # Se não vier JSON: tenta interpretar texto puro como nome do agente
-            txt = self.llm.complete_with_tools_loop(system=system, user=user, tools_registry=None, max_steps=0)  # type: ignore
-            content = txt.get("content", "saudacao").strip().lower()
-            name = "saudacao"
-            for cand in ["saudacao","cardapio","carrinho","endereco","pagamento"]:
-                if cand in content:
-                    name = cand
-                    break
-            return RouterOutput(agente_escolhido=name, motivo="fallback-text", acoes_imediatas=[], handoff=False)
+        cache = di[ResponseCache] if ResponseCache in di else None
+        key = ""
+        if cache is not None:
+            key = cache.key("router", self.builder.version,
+                            {"agentes": agentes, "contexto": contexto | catalogo, "conversa": conversa}, mensagem)
+            hit = cache.get("router", key)
+            if hit is not None:
+                return RouterOutput.model_validate(hit)
+        return system, user, key
+
+    @staticmethod
+    def _store(key: str, out: RouterOutput) -> RouterOutput:
+        if ResponseCache in di:
+            di[ResponseCache].put("router", key, out.model_dump())
+        return out
+
+    @staticmethod
+    def _from_text(txt: dict) -> RouterOutput:
+        content = txt.get("content", "saudacao").strip().lower()
+        name = "saudacao"
+        for cand in ["saudacao","cardapio","carrinho","endereco","pagamento"]:
+            if cand in content:
+                name = cand
+                break
+        return RouterOutput(agente_escolhido=name, motivo="fallback-text", acoes_imediatas=[], handoff=False)
+
+    @staticmethod
+    def _catalog(mensagem: str, cart_skus: list[str]) -> dict:
+        """``catalog_text`` (inteiro ou resumo por categoria) + ``catalog_relevant`` (itens do turno)."""
+        if Catalog not in di:
+            return {"catalog_text": ""}
+        budget = di[Settings].catalog_prompt_budget_tokens if Settings in di else DEFAULT_BUDGET_TOKENS
+        sel = select_for_prompt(di[Catalog], mensagem, cart_skus, budget)
+        metrics.observe("router.catalog_tokens", sel.tokens)
+        metrics.incr("router.catalog_full" if sel.full else "router.catalog_selected")
+        return {"catalog_text": sel.summary, "catalog_relevant": sel.relevant}
@@ -0,0 +1,262 @@
+
+"""Pipeline de um turno de conversa: handoff → coalescência → roteador → agente → outbox.
+
+Compartilhado pelo webhook (modo inline), pelo `/simulate`, pelo pool de workers de turno e pelo app ASGI
+(``arun_turn``). Retorna um dict com o desfecho para que cada chamador monte a sua resposta.
+"""
+from __future__ import annotations
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, List, Tuple
+import asyncio, time
+from kink import di
+from ..repo.turn_context import TurnContext
+from ..core.coalesce import coalesce_batch
+from ..core.coalesce_events import ensure_inbox_listener
+from ..core.db import count_queries
+from ..core.llm_client import TokenUsage, track_usage
+from ..core.metrics import metrics
+from ..core.settings import Settings
+from ..core.supersede import TurnSuperseded, TurnToken, observe_turn_tokens, record_superseded, supersedable
+from ..ports.interfaces import MensagemSaidaDTO, TurnSignals
+from ..repo import repo
+from .orchestrator import Orchestrator
+from .runtime.toolkit import track_tool_calls
+
+def _observe_usage(usage: TokenUsage) -> None:
+    """Tokens de entrada por turno (total e servidos do cache de prefixo do provedor)."""
+    if usage.calls:
+        metrics.observe("llm.turn.prompt_tokens", usage.prompt)
+        metrics.observe("llm.turn.cached_tokens", usage.cached)
+
+def run_turn(conversation_id: str, wa_id: str, *, simulate: bool = False, provider_message_id: str | None = None,
+             consumed_inbox_id: int | None = None) -> Dict[str, Any]:
+    """Executa um turno completo para a conversa.
+
+    Estado via ``TurnContext``: uma leitura no início e as escritas (snapshot, eventos, outbox) numa transação no
+    fim (``turn.db_queries``); contexto com orçamento de tokens (``turn.ctx_tokens``) e resumo pedido em segundo
+    plano acima de ``HB_CTX_SUMMARY_THRESHOLD``. Com streaming + ``HB_STREAM_EARLY_FLUSH`` o 1º trecho vai ao
+    outbox durante a geração (``turn.first_delivery_ms``). Com ``HB_TURN_SUPERSEDE`` inbox nova aborta
+    roteador/agente (evento ``turn_superseded``; tools de escrita já executadas ficam em
+    ``acoes_turno_superado``); no pool o turno recomeça (até ``HB_TURN_SUPERSEDE_MAX_RESTARTS``), no inline
+    termina como ``superseded``.
+
+    :param conversation_id: id da conversa (wa_id no MVP).
+    :param wa_id: destinatário da resposta.
+    :param simulate: se True, não enfileira no outbox e marca os eventos com ``simulate``.
+    :param provider_message_id: id da mensagem que disparou o turno (auditoria), se conhecido.
+    :param consumed_inbox_id: inbox id que o chamador considera consumida mesmo sem pacote (pool de workers).
+    :return: dict com ``status`` (queued|preview|gated|empty|handoff|superseded), ``pacote``, ``agent`` e ``response``.
+    """
+    settings: Settings = di[Settings]
+    if settings.turn_supersede:
+        ensure_inbox_listener()  # inbox gravada por outros processos (webhook em outra instância)
+    restarts = settings.turn_supersede_max_restarts if settings.turn_supersede and consumed_inbox_id is not None else 0
+    for attempt in range(restarts + 1):
+        # último recomeço vai até o fim (mensagens chegando sem parar não podem adiar a resposta para sempre)
+        res = _run_turn_once(conversation_id, wa_id, simulate=simulate, provider_message_id=provider_message_id,
+                             consumed_inbox_id=consumed_inbox_id,
+                             supersede=settings.turn_supersede and (attempt < restarts or consumed_inbox_id is None))
+        if res["status"] != "superseded" or attempt == restarts:
+            return res
+        metrics.incr("turn.restarts")
+    return res
+
+def _run_turn_once(conversation_id: str, wa_id: str, *, simulate: bool, provider_message_id: str | None,
+                   consumed_inbox_id: int | None, supersede: bool) -> Dict[str, Any]:
+    settings: Settings = di[Settings]
+    t0 = time.perf_counter()
+    delivery: Dict[str, float] = {}  # "first": perf_counter da 1ª mensagem gravada no outbox
+    with count_queries() as qc:
+        tc = _load(conversation_id, settings)
+        try:
+            return _run(tc, wa_id, simulate=simulate, provider_message_id=provider_message_id,
+                        consumed_inbox_id=consumed_inbox_id, delivery=delivery, supersede=supersede)
+        finally:
+            _after_turn(tc, settings, qc.n, t0, delivery)
+
+async def arun_turn(conversation_id: str, wa_id: str, *, simulate: bool = False,
+                    provider_message_id: str | None = None) -> Dict[str, Any]:
+    """``run_turn`` para o app ASGI (``api/asgi.py``): roteador e agente via ``aroute``/``aprocessar`` no event loop;
+    leitura do ``TurnContext``, coalescência e flush (um round trip cada) em ``asyncio.to_thread``.
+
+    Sem ``consumed_inbox_id`` (só webhook inline e ``/simulate``): turno superado termina como ``superseded``.
+    """
+    settings: Settings = di[Settings]
+    if settings.turn_supersede:
+        ensure_inbox_listener()
+    t0 = time.perf_counter()
+    delivery: Dict[str, float] = {}
+    with count_queries() as qc:  # to_thread copia o contexto: statements das threads contam aqui
+        tc = await asyncio.to_thread(_load, conversation_id, settings)
+        try:
+            return await _arun(tc, wa_id, simulate=simulate, provider_message_id=provider_message_id,
+                               delivery=delivery, supersede=settings.turn_supersede)
+        finally:
+            await asyncio.to_thread(_after_turn, tc, settings, qc.n, t0, delivery)
+
+def _load(conversation_id: str, settings: Settings) -> TurnContext:
+    return TurnContext.load(conversation_id, recent_limit=settings.ctx_recent_messages,
+                            budget_tokens=settings.ctx_budget_tokens, unsummarized_cap=settings.ctx_summary_threshold)
+
+def _after_turn(tc: TurnContext, settings: Settings, reads: int, t0: float, delivery: Dict[str, float]) -> None:
+    """Fim do turno: grava o buffer do ``TurnContext`` e dispara dispatcher/resumo."""
+    with count_queries() as qc:
+        tc.flush()
+    metrics.observe("turn.db_queries", reads + qc.n)
+    if tc.enqueued:
+        delivery.setdefault("first", time.perf_counter())
+    if "first" in delivery:
+        metrics.observe("turn.first_delivery_ms", (delivery["first"] - t0) * 1000)
+    signals = _signals()
+    if tc.enqueued and signals is not None:
+        signals.outbox_enqueued(tc.conversation_id)
+    if tc.unsummarized >= settings.ctx_summary_threshold and signals is not None:
+        signals.summary_due(tc.conversation_id)
+
+def _signals() -> TurnSignals | None:
+    """Serviços de segundo plano do processo (registrados no bootstrap; ausentes em scripts/benchmarks)."""
+    return di[TurnSignals] if TurnSignals in di else None
+
+def _run(tc: TurnContext, wa_id: str, *, simulate: bool, provider_message_id: str | None,
+         consumed_inbox_id: int | None, delivery: Dict[str, float], supersede: bool = False) -> Dict[str, Any]:
+    begun = _begin(tc, wa_id, simulate=simulate, provider_message_id=provider_message_id,
+                   consumed_inbox_id=consumed_inbox_id)
+    if "status" in begun:
+        return begun
+    pacote, extra = begun["pacote"], begun["extra"]
+    guard = supersedable(tc.conversation_id, pacote["max_inbox_id"]) if supersede else nullcontext()
+    try:
+        with guard as token, track_tool_calls() as called, track_usage() as usage:
+            rot, response_dict = _route_and_answer(tc, wa_id, pacote, begun["contexto"], begun["conversa"],
+                                                   simulate=simulate, extra=extra, delivery=delivery, token=token)
+    except TurnSuperseded as e:
+        return _superseded(tc, e, pacote, called, usage, extra)
+    return _finish(tc, rot, response_dict, pacote, usage, extra, simulate=simulate)
+
+async def _arun(tc: TurnContext, wa_id: str, *, simulate: bool, provider_message_id: str | None,
+                delivery: Dict[str, float], supersede: bool) -> Dict[str, Any]:
+    begun = await asyncio.to_thread(_begin, tc, wa_id, simulate=simulate, provider_message_id=provider_message_id,
+                                    consumed_inbox_id=None)
+    if "status" in begun:
+        return begun
+    pacote, extra = begun["pacote"], begun["extra"]
+    guard = supersedable(tc.conversation_id, pacote["max_inbox_id"]) if supersede else nullcontext()
+    try:
+        with guard as token, track_tool_calls() as called, track_usage() as usage:
+            rot, response_dict = await _aroute_and_answer(tc, wa_id, pacote, begun["contexto"], begun["conversa"],
+                                                          simulate=simulate, extra=extra, delivery=delivery,
+                                                          token=token)
+    except TurnSuperseded as e:
+        return _superseded(tc, e, pacote, called, usage, extra)
+    return _finish(tc, rot, response_dict, pacote, usage, extra, simulate=simulate)
+
+def _begin(tc: TurnContext, wa_id: str, *, simulate: bool, provider_message_id: str | None,
+           consumed_inbox_id: int | None) -> Dict[str, Any]:
+    """Handoff e coalescência: desfecho final (com ``status``) ou ``pacote``/``contexto``/``conversa`` do turno."""
+    conversation_id = tc.conversation_id
+    extra = {"simulate": True} if simulate else {}
+    if consumed_inbox_id:
+        # Marca consumo mesmo quando o turno não enfileira (handoff, vazio), evitando repoll.
+        tc.advance("last_turn_inbox_id", consumed_inbox_id)
+
+    # Handoff gating
+    if tc.handoff_paused:
+        tc.log_event("handoff_gated", {"provider_message_id": provider_message_id} | extra)
+        return {"status": "gated", "reason": "handoff-paused"}
+
+    # Coalescência real
+    pacote = coalesce_batch(conversation_id, tc.last_processed_inbox_id)
+    tc.absorb_batch(pacote)
+    tc.log_event("coalesce_done", {k: v for k, v in pacote.items() if k != "textos"} | extra)
+    if not pacote["message_ids"]:
+        return {"status": "empty", "reason": "no-new-messages", "pacote": pacote}
+    tc.advance("last_turn_inbox_id", pacote["max_inbox_id"])
+
+    # Contexto
+    contexto = tc.context()
+    contexto.update({"wa_id": wa_id})
+    metrics.observe("turn.ctx_tokens", tc.context_tokens())
+    return {"pacote": pacote, "contexto": contexto, "conversa": tc.last_messages(), "extra": extra}
+
+def _finish(tc: TurnContext, rot: Any, response_dict: Dict[str, Any] | None, pacote: Dict[str, Any],
+            usage: TokenUsage, extra: Dict[str, Any], *, simulate: bool) -> Dict[str, Any]:
+    """Registra a saída do agente e monta o desfecho (handoff, preview ou resposta no outbox)."""
+    _observe_usage(usage)
+    if response_dict is None:
+        tc.set_handoff(True, "router_handoff")
+        return {"status": "handoff", "reason": "handoff-requested", "pacote": pacote}
+    observe_turn_tokens(usage.prompt + usage.completion)
+    if tc.snapshot.get("acoes_turno_superado"):
+        tc.set_snapshot(acoes_turno_superado=[])  # já estavam no contexto deste turno
+    tc.log_event("agent_output", {"agent": rot.agente_escolhido, "body": response_dict, "usage": usage.as_dict()} | extra)
+
+    if simulate:
+        return {"status": "preview", "pacote": pacote, "agent": rot.agente_escolhido, "response": response_dict}
+
+    # Outbox (vazio quando o trecho antecipado já levou a resposta inteira)
+    if response_dict.get("texto"):
+        tc.enqueue_outbox(response_dict, source_max_inbox_id=pacote["max_inbox_id"])
+    return {"status": "queued", "pacote": pacote, "agent": rot.agente_escolhido, "response": response_dict}
+
+def _route_and_answer(tc: TurnContext, wa_id: str, pacote: Dict[str, Any], contexto: Dict[str, Any],
+                      conversa: Dict[str, Any], *, simulate: bool, extra: Dict[str, Any], delivery: Dict[str, float],
+                      token: TurnToken | None) -> Tuple[Any, Dict[str, Any] | None]:
+    """Roteador + agente: ``(rot, resposta)``; resposta ``None`` quando o roteador pede handoff."""
+    t0 = time.perf_counter()
+    rot = Orchestrator().route(contexto=contexto, mensagem=pacote["texto_unificado"], conversa=conversa,
+                               cart_skus=tc.cart_skus)
+    if _log_route(tc, rot, t0, extra):
+        return rot, None
+    return rot, di["agents"][rot.agente_escolhido].processar(
+        pacote["texto_unificado"], contexto,
+        on_partial=None if simulate else _partial_sink(tc, wa_id, rot, pacote, delivery, token))
+
+async def _aroute_and_answer(tc: TurnContext, wa_id: str, pacote: Dict[str, Any], contexto: Dict[str, Any],
+                             conversa: Dict[str, Any], *, simulate: bool, extra: Dict[str, Any],
+                             delivery: Dict[str, float], token: TurnToken | None) -> Tuple[Any, Dict[str, Any] | None]:
+    t0 = time.perf_counter()
+    rot = await Orchestrator().aroute(contexto=contexto, mensagem=pacote["texto_unificado"], conversa=conversa,
+                                      cart_skus=tc.cart_skus)
+    if _log_route(tc, rot, t0, extra):
+        return rot, None
+    return rot, await di["agents"][rot.agente_escolhido].aprocessar(
+        pacote["texto_unificado"], contexto,
+        on_partial=None if simulate else _partial_sink(tc, wa_id, rot, pacote, delivery, token))
+
+def _log_route(tc: TurnContext, rot: Any, t0: float, extra: Dict[str, Any]) -> bool:
+    """Registra a escolha do roteador; True quando ele pede handoff."""
+    latency_ms = round((time.perf_counter() - t0) * 1000, 2)
+    tc.log_event("router_choice", rot.model_dump() | {"latency_ms": latency_ms} | extra)
+    return bool(rot.handoff)
+
+def _partial_sink(tc: TurnContext, wa_id: str, rot: Any, pacote: Dict[str, Any], delivery: Dict[str, float],
+                  token: TurnToken | None) -> Callable[[str], None]:
+    """Entrega do trecho antecipado direto para o outbox (roda na thread do loop do LLM)."""
+    conversation_id = tc.conversation_id
+
+    def deliver_partial(texto: str) -> None:
+        if token is not None and not token.freeze():
+            return  # superado antes de sair algo: o turno seguinte responde ao texto unido
+        # daqui em diante algo sai para o cliente: o turno não pode mais ser superado
+        repo.enqueue_outbox(conversation_id, MensagemSaidaDTO(wa_id=wa_id, texto=texto).model_dump(),
+                            source_max_inbox_id=pacote["max_inbox_id"])
+        delivery.setdefault("first", time.perf_counter())
+        metrics.incr("turn.partial_sent")
+        tc.log_event("partial_enqueued", {"agent": rot.agente_escolhido, "chars": len(texto)})
+        signals = _signals()
+        if signals is not None:
+            signals.outbox_enqueued(conversation_id)
+    return deliver_partial
+
+def _superseded(tc: TurnContext, e: TurnSuperseded, pacote: Dict[str, Any], called: List[str], usage: TokenUsage,
+                extra: Dict[str, Any]) -> Dict[str, Any]:
+    """Turno abortado: contabiliza tokens e registra as tools de escrita que já tinham sido executadas."""
+    agents = di["agents"].values()
+    writes = [n for n in called if not any(a.tools.is_read_only(n) for a in agents)]
+    _observe_usage(usage)
+    saved = record_superseded(usage.prompt + usage.completion)
+    if writes:
+        tc.set_snapshot(acoes_turno_superado=list(tc.snapshot.get("acoes_turno_superado") or []) + writes)
+    tc.log_event("turn_superseded", {"max_inbox_id": pacote["max_inbox_id"], "newer_inbox_id": e.newer_inbox_id,
+                                     "tools_committed": writes, "usage": usage.as_dict(), "tokens_saved_est": saved} | extra)
+    return {"status": "superseded", "reason": "newer-inbox", "pacote": pacote, "tools_committed": writes}
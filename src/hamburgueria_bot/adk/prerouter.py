@@ -0,0 +1,162 @@
+
+"""Pré-roteador determinístico: decide o agente sem LLM quando a mensagem é óbvia.
+
+Estágios (texto normalizado por ``core.text.fold``):
+1) Regras/palavras-chave + SKUs do catálogo (ex.: "oi", "quero 2 BX2", "mostra meu carrinho", "quero pagar").
+   Se mais de um agente casa, é ambíguo → LLM.
+2) Opcional: classificador linear local sobre n-gramas hasheados (palavras 1–2, caracteres 3),
+   treinado com eventos ``router_choice`` gravados em ``conversation_events``.
+
+Só responde acima de ``prerouter_threshold``; pedidos de humano/guardrails sempre vão ao LLM (handoff).
+Relatório de cobertura/acurácia/latência: ``scripts/report_prerouter.py``.
+"""
+from __future__ import annotations
+import json, math, random, re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+from kink import di
+from sqlalchemy import select
+from ..core.text import fold, hashed_features as _features
+from ..core.catalog import Catalog
+from ..core.guardrails import should_force_reviewer
+from ..repo.models import ConversationEvent
+
+AGENTES = ("saudacao", "cardapio", "carrinho", "endereco", "pagamento")
+
+# (agente, nome da regra, padrão sobre texto normalizado, confiança)
+RULES: List[Tuple[str, str, re.Pattern, float]] = [
+    ("saudacao", "greeting", re.compile(
+        r"^(oi+|ola+|opa|eai|e ai|hey|salve|bom dia|boa tarde|boa noite)"
+        r"( (tudo bem|td bem|tudo bom|tudo certo|pessoal|gente))?$"), 0.97),
+    ("saudacao", "opening_hours", re.compile(r"\b(ta|esta|estao|tao) abert[oa]s?\b|\bhorario\b"), 0.9),
+    ("cardapio", "menu", re.compile(r"\b(cardapio|menu|opcoes)\b"), 0.9),
+    ("carrinho", "cart", re.compile(r"\b(carrinho|meu pedido|o que (eu )?pedi|tira|tirar|remove|remover)\b"), 0.9),
+    ("endereco", "address", re.compile(r"\b(endereco|cep|bairro|rua|avenida)\b"), 0.9),
+    ("pagamento", "payment", re.compile(
+        r"\b(pagar|pagamento|pix|paguei|comprovante|finalizar|fechar (o )?pedido)\b"), 0.92),
+]
+SKU_CONFIDENCE = 0.95
+HANDOFF = re.compile(r"\b(atendente|humano|pessoa|gerente|reclamacao|falar com)\b")
+
+@dataclass
+class PreRoute:
+    agente: str
+    confianca: float
+    fonte: str  # "rule:<nome>" | "sku" | "model"
+
+# ---------------- Classificador local ----------------
+class HashedNgramModel:
+    """Regressão logística multinomial esparsa sobre n-gramas hasheados (crc32, estável entre execuções)."""
+    def __init__(self, labels: Iterable[str] = AGENTES, dim: int = 1 << 18):
+        self.labels = list(labels)
+        self.dim = dim
+        self.w: Dict[str, Dict[int, float]] = {lb: {} for lb in self.labels}
+        self.b: Dict[str, float] = {lb: 0.0 for lb in self.labels}
+
+    def _scores(self, feats: Dict[int, float]) -> Dict[str, float]:
+        return {lb: self.b[lb] + sum(self.w[lb].get(i, 0.0) * v for i, v in feats.items()) for lb in self.labels}
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        scores = self._scores(_features(text, self.dim))
+        m = max(scores.values())
+        exp = {lb: math.exp(s - m) for lb, s in scores.items()}
+        z = sum(exp.values())
+        return {lb: e / z for lb, e in exp.items()}
+
+    def fit(self, examples: List[Tuple[str, str]], epochs: int = 12, lr: float = 0.5, seed: int = 7) -> "HashedNgramModel":
+        """SGD simples (sem dependências). ``examples``: pares (texto, agente)."""
+        data = [(_features(t, self.dim), y) for t, y in examples if y in self.w]
+        rnd = random.Random(seed)
+        for _ in range(epochs):
+            rnd.shuffle(data)
+            for feats, y in data:
+                scores = self._scores(feats)
+                m = max(scores.values())
+                exp = {lb: math.exp(s - m) for lb, s in scores.items()}
+                z = sum(exp.values())
+                for lb in self.labels:
+                    g = exp[lb] / z - (1.0 if lb == y else 0.0)
+                    if abs(g) < 1e-6:
+                        continue
+                    wl = self.w[lb]
+                    for i, v in feats.items():
+                        wl[i] = wl.get(i, 0.0) - lr * g * v
+                    self.b[lb] -= lr * g
+        return self
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"labels": self.labels, "dim": self.dim, "b": self.b,
+                       "w": {lb: {str(i): round(v, 6) for i, v in ws.items()} for lb, ws in self.w.items()}}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "HashedNgramModel":
+        with open(path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+        m = cls(raw["labels"], raw["dim"])
+        m.b = raw["b"]
+        m.w = {lb: {int(i): v for i, v in ws.items()} for lb, ws in raw["w"].items()}
+        return m
+
+# ---------------- Pré-roteador ----------------
+class PreRouter:
+    """Regras + SKUs + (opcional) modelo local. ``classify`` retorna None quando deve ir ao LLM."""
+    def __init__(self, threshold: float = 0.85, model: HashedNgramModel | None = None, max_tokens: int = 12):
+        self.threshold = threshold
+        self.model = model
+        self.max_tokens = max_tokens
+
+    @staticmethod
+    def _catalog_skus() -> frozenset[str]:
+        return di[Catalog].skus_folded if Catalog in di else frozenset()
+
+    def classify(self, mensagem: str, *, use_model: bool = True) -> PreRoute | None:
+        text = fold(mensagem)
+        toks = text.split()
+        if not toks or HANDOFF.search(text) or should_force_reviewer(mensagem):
+            return None
+        hits: Dict[str, PreRoute] = {}
+        if len(toks) <= self.max_tokens:
+            for agente, nome, pat, conf in RULES:
+                if pat.search(text) and conf > getattr(hits.get(agente), "confianca", 0):
+                    hits[agente] = PreRoute(agente, conf, f"rule:{nome}")
+            skus = self._catalog_skus()
+            if any(t in skus for t in toks) and "cardapio" not in hits:
+                hits["cardapio"] = PreRoute("cardapio", SKU_CONFIDENCE, "sku")
+        if len(hits) > 1:
+            return None  # ambíguo: deixa o LLM decidir
+        if hits:
+            hit = next(iter(hits.values()))
+            return hit if hit.confianca >= self.threshold else None
+        if use_model and self.model is not None:
+            proba = self.model.predict_proba(mensagem)
+            agente, p = max(proba.items(), key=lambda kv: kv[1])
+            if p >= self.threshold:
+                return PreRoute(agente, round(p, 4), "model")
+        return None
+
+def load_router_examples(limit: int = 50_000) -> List[Dict]:
+    """Pares (texto coalescido → agente escolhido pelo LLM) a partir de ``conversation_events``.
+
+    Cada ``router_choice`` é associado ao ``coalesce_done`` anterior da mesma conversa; escolhas do
+    próprio pré-roteador são ignoradas para não realimentar o modelo.
+    """
+    Session = di["session_factory"]
+    with Session() as s:
+        rows = s.execute(
+            select(ConversationEvent.conversation_id, ConversationEvent.kind, ConversationEvent.data)
+            .where(ConversationEvent.kind.in_(["coalesce_done", "router_choice"]))
+            .order_by(ConversationEvent.id.desc())
+            .limit(limit * 2)
+        ).all()
+    last_text: Dict[str, str] = {}
+    out: List[Dict] = []
+    for cid, kind, data in reversed(rows):
+        data = data or {}
+        if kind == "coalesce_done":
+            last_text[cid] = data.get("texto_unificado", "")
+            continue
+        texto = last_text.pop(cid, "")
+        if texto and not str(data.get("motivo", "")).startswith("prerouter"):
+            out.append({"text": texto, "agent": data.get("agente_escolhido"), "latency_ms": data.get("latency_ms")})
+    return out[-limit:]
@@ -1,15 +1,44 @@
 
-"""Toolkit: registro de tools tipadas (Pydantic) e execução de chamadas."""
+"""Toolkit: registro de tools tipadas (Pydantic) e execução de chamadas.
+
+Concorrência: cada ``ToolSpec`` declara o que toca — ``read_only`` (não escreve) e ``resource`` (estado por
+conversa, ex.: ``"cart"``; a chave é ``resource:conversation_id`` dos argumentos). ``ToolBatch`` roda as
+chamadas de um mesmo passo do LLM em paralelo, exceto as que conflitam (mesma chave com ao menos uma escrita,
+ou escrita sem ``resource`` declarado, que conflita com tudo): essas esperam as anteriores, na ordem em que o
+modelo pediu. Os resultados voltam na ordem das chamadas. Latência por tool em ``tool.latency_ms.<nome>``.
+``track_tool_calls()`` registra as tools executadas no contexto (inclusive nas threads do ``ToolBatch``).
+"""
 from __future__ import annotations
-from typing import Callable, Dict, Any, Type
+from concurrent.futures import Executor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Any, Iterator, List, NamedTuple, Type
 from pydantic import BaseModel
-import json
+import asyncio, contextvars, functools, json, time
+from ...core.metrics import metrics
+
+_tool_scope: ContextVar[List[str] | None] = ContextVar("tool_calls_scope", default=None)
+
+@contextmanager
+def track_tool_calls() -> Iterator[List[str]]:
+    """Nomes das tools executadas no contexto atual enquanto o bloco roda (também repassados ao escopo externo)."""
+    called: List[str] = []
+    parent = _tool_scope.get()
+    token = _tool_scope.set(called)
+    try:
+        yield called
+    finally:
+        _tool_scope.reset(token)
+        if parent is not None:
+            parent.extend(called)
 
 class ToolSpec(BaseModel):
     name: str
     description: str
     args_schema: Type[BaseModel]
     func: Callable[[BaseModel], Any]
+    read_only: bool = False  # não escreve estado: roda junto com outras leituras do mesmo recurso
+    resource: str | None = None  # estado por conversa que lê/escreve; escrita sem recurso conflita com tudo
 
     def to_openai_function(self) -> dict:
         """Converte para schema de tool (OpenAI/LiteLLM style)."""
@@ -27,17 +56,21 @@ class ToolRegistry:
     """Registro de tools disponíveis para um agente."""
     def __init__(self):
         self._tools: Dict[str, ToolSpec] = {}
+        self._openai_cache: list[dict] | None = None  # schemas Pydantic → JSON custam; refeito só no register
 
     def register(self, spec: ToolSpec) -> None:
         if spec.name in self._tools:
             raise ValueError(f"tool duplicada: {spec.name}")
         self._tools[spec.name] = spec
+        self._openai_cache = None
 
     def list_specs(self) -> list[ToolSpec]:
         return list(self._tools.values())
 
     def openai_tools(self) -> list[dict]:
-        return [t.to_openai_function() for t in self._tools.values()]
+        if self._openai_cache is None:
+            self._openai_cache = [t.to_openai_function() for t in self._tools.values()]
+        return self._openai_cache
 
     def execute(self, name: str, arguments: dict) -> Any:
         if name not in self._tools:
@@ -47,12 +80,80 @@ class ToolRegistry:
 
     def execute_json(self, name: str, arguments_json: str) -> str:
         """Executa tool recebendo `arguments` como JSON string e retorna JSON string do resultado."""
+        args = _parse_args(arguments_json)
+        scope = _tool_scope.get()
+        if scope is not None:
+            scope.append(name)
+        t0 = time.perf_counter()
         try:
-            args = json.loads(arguments_json or "{}")
+            result = self.execute(name, args)
         except Exception:
-            args = {}
-        result = self.execute(name, args)
+            metrics.incr(f"tool.errors.{name}")
+            raise
+        finally:
+            metrics.observe(f"tool.latency_ms.{name}", (time.perf_counter() - t0) * 1000)
         try:
             return json.dumps(result, ensure_ascii=False)
         except Exception:
             return json.dumps({"result": str(result)}, ensure_ascii=False)
+
+    def is_read_only(self, name: str) -> bool:
+        spec = self._tools.get(name)
+        return spec is not None and spec.read_only
+
+    def access(self, name: str, arguments_json: str) -> "ToolAccess":
+        """O que a chamada toca, para o agendamento do ``ToolBatch`` (tool desconhecida: escrita global)."""
+        spec = self._tools.get(name)
+        if spec is None:
+            return ToolAccess(None, False)
+        if spec.resource is None:
+            return ToolAccess(None, spec.read_only)
+        return ToolAccess(f"{spec.resource}:{_parse_args(arguments_json).get('conversation_id', '')}", spec.read_only)
+
+def _parse_args(arguments_json: str) -> dict:
+    try:
+        args = json.loads(arguments_json or "{}")
+    except Exception:
+        return {}
+    return args if isinstance(args, dict) else {}
+
+class ToolAccess(NamedTuple):
+    key: str | None  # "resource:conversation_id"; None = sem recurso declarado
+    read_only: bool
+
+    def conflicts(self, other: "ToolAccess") -> bool:
+        if self.read_only and other.read_only:
+            return False
+        if (self.key is None and not self.read_only) or (other.key is None and not other.read_only):
+            return True
+        return self.key is not None and self.key == other.key
+
+class ToolBatch:
+    """Tool calls de um passo do LLM, em paralelo quando não conflitam (ver docstring do módulo).
+
+    ``submit`` deve ser chamado dentro do event loop, na ordem das chamadas do modelo; cada chamada roda em
+    ``executor`` (padrão: o do loop) com os contextvars de quem submeteu."""
+    def __init__(self, registry: ToolRegistry, executor: Executor | None = None):
+        self.registry = registry
+        self.executor = executor
+        self._submitted: List[tuple[ToolAccess, asyncio.Future]] = []
+
+    def submit(self, name: str, arguments_json: str) -> asyncio.Future:
+        """Agenda a chamada; o future resolve com o JSON do resultado."""
+        access = self.registry.access(name, arguments_json)
+        deps = [f for a, f in self._submitted if a.conflicts(access)]
+        fut = asyncio.ensure_future(self._run(deps, name, arguments_json))
+        self._submitted.append((access, fut))
+        return fut
+
+    async def _run(self, deps: List[asyncio.Future], name: str, arguments_json: str) -> str:
+        if deps:
+            metrics.incr("tool.serialized")
+            await asyncio.gather(*deps)  # falha de uma anterior conflitante interrompe esta, como no sequencial
+        call = functools.partial(contextvars.copy_context().run, self.registry.execute_json, name, arguments_json)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+
+    def cancel(self) -> None:
+        """Cancela o que ainda não começou (as que já rodam numa thread terminam)."""
+        for _, fut in self._submitted:
+            fut.cancel()
@@ -1,7 +1,10 @@
 
 """Tools tipadas (Pydantic) para carrinho (puras, I/O via serviços)."""
 from pydantic import BaseModel, Field, PositiveInt
-from ...domain.services import cart_service, menu_service
+from kink import di
+from ...core.catalog import Catalog
+from ...domain.services import cart_service
+from ...domain.services.cart_service import CartState  # reexportado (contrato das tools)
 
 class AddItemArgs(BaseModel):
     conversation_id: str
@@ -13,25 +16,14 @@ class RemoveItemArgs(BaseModel):
     sku: str
     qty: PositiveInt = 1
 
-class CartState(BaseModel):
-    items: list[dict]
-    subtotal_cents: int
-
 def add_item(args: AddItemArgs) -> CartState:
     """Adiciona item idempotente ao carrinho e retorna estado."""
-    sku = args.sku
-    menu = {m["sku"]: m for m in menu_service.get_menu()}
-    if sku not in menu:
+    item = di[Catalog].get(args.sku)
+    if item is None:
         # SKU inválido: retorna estado atual sem alterações
-        items = cart_service.get_items(args.conversation_id)
-        return CartState(items=items, subtotal_cents=cart_service.calc_subtotal_cents(args.conversation_id))
-    item = menu[sku]
-    cart_service.add_item(args.conversation_id, sku=sku, name=item["name"], unit_price_cents=item["price_cents"], qty=args.qty)
-    items = cart_service.get_items(args.conversation_id)
-    return CartState(items=items, subtotal_cents=cart_service.calc_subtotal_cents(args.conversation_id))
+        return cart_service.get_state(args.conversation_id)
+    return cart_service.add_item(args.conversation_id, sku=item["sku"], name=item["name"], unit_price_cents=item["price_cents"], qty=args.qty)
 
 def remove_item(args: RemoveItemArgs) -> CartState:
     """Remove/Decrementa item do carrinho e retorna estado."""
-    cart_service.remove_item(args.conversation_id, sku=args.sku, qty=args.qty)
-    items = cart_service.get_items(args.conversation_id)
-    return CartState(items=items, subtotal_cents=cart_service.calc_subtotal_cents(args.conversation_id))
+    return cart_service.remove_item(args.conversation_id, sku=args.sku, qty=args.qty)
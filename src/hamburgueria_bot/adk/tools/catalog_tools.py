@@ -0,0 +1,13 @@
+"""Tools tipadas (Pydantic) de catálogo (puras, leitura do ``di[Catalog]`` vigente)."""
+from pydantic import BaseModel, Field
+from kink import di
+from ...core.catalog import Catalog
+
+class SearchCatalogArgs(BaseModel):
+    query: str = Field(min_length=1, max_length=120)
+    limit: int = Field(default=5, ge=1, le=10)
+
+def search_catalog(args: SearchCatalogArgs) -> dict:
+    """Texto livre do cliente → itens do catálogo ranqueados (SKU, nome, preço, categoria, score)."""
+    cat = di[Catalog]
+    return {"results": cat.search(args.query, args.limit), "catalog_version": cat.version}
@@ -6,24 +6,63 @@ from kink import di
 from ..core.di import bootstrap_di
 from ..core.logging import set_trace_id, get_logger
 from ..core.guardrails import sanitize_text
-    from ..core.catalog import load_catalog, flatten_for_prompt
+from ..core.catalog import reload_catalog
 from ..core.settings import Settings
+from ..core.metrics import metrics
 from ..repo import repo
-from ..core.coalesce import coalesce_window
-from ..adk.orchestrator import Orchestrator
+from ..adk.pipeline import run_turn
 from ..connectors.whatsapp.cloud_api_adapter import WhatsAppCloudAdapter
+from ..tasks.turn_worker import TurnWorkerPool
+from ..tasks.turn_lanes import TurnLanes
+from ..tasks.outbox_dispatcher import OutboxDispatcher
+from ..tasks.memory_summarizer import MemorySummarizer
 
 app = Flask(__name__)
 bootstrap_di()
 log = get_logger()
 
-@app.post("/admin/reload-config")
-    def reload_config():
-        di["catalog"] = load_catalog()
-        di["catalog_text"] = flatten_for_prompt(di["catalog"], max_items=200)
-        return {"ok": True, "items_count": sum(len(c.get('items',[])) for c in di['catalog'].get('categories',[]))}
+if di[Settings].ingest_mode == "async" and di[Settings].turn_workers_embedded:
+    di[TurnWorkerPool] = TurnWorkerPool().start()
+if di[Settings].ingest_mode == "inline" and di[Settings].turn_lanes > 0:
+    di[TurnLanes] = TurnLanes(di[Settings].turn_lanes).start()
+if di[Settings].dispatch_embedded:
+    di[OutboxDispatcher] = OutboxDispatcher().start()
+if di[Settings].ctx_summarizer_embedded:
+    di[MemorySummarizer] = MemorySummarizer().start()
 
-    @app.get("/healthz")
+@app.post("/admin/reload-config")
+def reload_config():
+    """Recarrega o catálogo e troca o snapshot vigente de uma vez (agentes e prompts passam a ver a nova versão)."""
+    cat = reload_catalog()
+    return {"ok": True, "items_count": len(cat), "version": cat.version}
+
+@app.get("/admin/metrics")
+def admin_metrics():
+    """Métricas em memória do processo (contadores, gauges, histogramas)."""
+    return metrics.snapshot(request.args.get("prefix", ""))
+
+@app.get("/admin/turn-workers")
+def admin_turn_workers():
+    """Contadores por worker do pool de turnos (somente no modo async embutido)."""
+    if TurnWorkerPool not in di:
+        return {"enabled": False}
+    return {"enabled": True} | di[TurnWorkerPool].stats()
+
+@app.get("/admin/turn-lanes")
+def admin_turn_lanes():
+    """Profundidade das filas por conversa e turnos economizados por merge (somente no modo inline com filas)."""
+    if TurnLanes not in di:
+        return {"enabled": False}
+    return {"enabled": True} | di[TurnLanes].stats()
+
+@app.get("/admin/dispatcher")
+def admin_dispatcher():
+    """Throughput e desfechos do dispatcher do outbox (somente se embutido)."""
+    if OutboxDispatcher not in di:
+        return {"enabled": False}
+    return {"enabled": True} | di[OutboxDispatcher].stats()
+
+@app.get("/healthz")
 def healthz():
     """Health check básico."""
     return {"ok": True}
@@ -49,6 +88,13 @@ def handoff_resume():
     repo.set_handoff(wa_id, False, "resume")
     return {"ok": True, "wa_id": wa_id, "paused": False}
 
+@app.get("/admin/handoff/paused")
+def admin_handoff_paused():
+    """Conversas pausadas para atendimento humano (``?limit=&after=`` para paginar)."""
+    limit = min(request.args.get("limit", 100, type=int), 1000)
+    items = repo.list_paused(limit=limit, after=request.args.get("after"))
+    return {"items": items, "next": items[-1]["conversation_id"] if len(items) == limit else None}
+
 @app.get("/webhook/meta")
 def verify():
     """Verificação do webhook: retorna hub.challenge ao validar VERIFY_TOKEN."""
@@ -59,7 +105,11 @@ def verify():
 
 @app.post("/webhook/meta")
 def webhook():
-    """Recebe mensagens, aplica coalescência e orquestra — respeita handoff pausado."""
+    """Recebe mensagens, aplica coalescência e orquestra — respeita handoff pausado.
+
+    No modo ``async`` (HB_INGEST_MODE) apenas grava na inbox e responde 200; o turno roda no
+    pool de workers (`tasks/turn_worker.py`).
+    """
     set_trace_id(request.headers.get("X-Trace-Id"))
     adapter = WhatsAppCloudAdapter()
     if not adapter.verify_signature(request.data, request.headers.get("X-Hub-Signature-256")):
@@ -73,37 +123,16 @@ def webhook():
     # Idempotência (Inbox)
     repo.save_inbox(entrada)
 
-    # Handoff gating
-    if repo.get_handoff(entrada.conversation_id):
-        repo.log_event(entrada.conversation_id, "handoff_gated", {"provider_message_id": entrada.provider_message_id})
-        return jsonify({"queued": False, "reason": "handoff-paused"})
-
-    # Coalescência real
-    last_proc = repo.get_last_processed_inbox_id(entrada.conversation_id)
-    pacote = coalesce_window(entrada.conversation_id, last_proc)
-    repo.log_event(entrada.conversation_id, "coalesce_done", pacote)
-
-    if not pacote["message_ids"]:
-        return jsonify({"queued": False, "reason": "no-new-messages"})
+    if di[Settings].ingest_mode == "async":
+        if TurnWorkerPool in di:
+            di[TurnWorkerPool].notify()
+        return jsonify({"accepted": True})
 
-    # Contexto
-    contexto = repo.load_context(entrada.conversation_id)
-    contexto.update({"wa_id": entrada.wa_id})
-
-    # Orquestrar
-    rot = Orchestrator().route(contexto=contexto, mensagem=pacote["texto_unificado"])
-    repo.log_event(entrada.conversation_id, "router_choice", rot.model_dump())
-    if rot.handoff:
-        repo.set_handoff(entrada.conversation_id, True, "router_handoff")
-        return jsonify({"queued": False, "reason": "handoff-requested"})
-
-    # Executar agente
-    response_dict = di["agents"][rot.agente_escolhido].processar(pacote["texto_unificado"], contexto)
-    repo.log_event(entrada.conversation_id, "agent_output", {"agent": rot.agente_escolhido, "body": response_dict})
-
-    # Outbox
-    repo.enqueue_outbox(entrada.conversation_id, response_dict, source_max_inbox_id=pacote["max_inbox_id"])
-    return jsonify({"queued": True, "messages_in_window": len(pacote["message_ids"])})
+    turn = di[TurnLanes].run if TurnLanes in di else run_turn
+    res = turn(entrada.conversation_id, entrada.wa_id, provider_message_id=entrada.provider_message_id)
+    if res["status"] != "queued":
+        return jsonify({"queued": False, "reason": res["reason"]})
+    return jsonify({"queued": True, "messages_in_window": len(res["pacote"]["message_ids"])})
 
 @app.post("/simulate")
 def simulate():
@@ -123,28 +152,10 @@ def simulate():
     repo.save_inbox(entrada)
     log.info("simulate_in", wa_id=wa_id, provider_id=provider_mid, texto=texto)
 
-    # Se estiver pausado, só registra e retorna
-    if repo.get_handoff(wa_id):
-        repo.log_event(wa_id, "handoff_gated", {"provider_message_id": provider_mid, "simulate": True})
-        return jsonify({"preview": None, "reason": "handoff-paused"})
-
-    last_proc = repo.get_last_processed_inbox_id(wa_id)
-    pacote = coalesce_window(wa_id, last_proc)
-    repo.log_event(wa_id, "coalesce_done", pacote | {"simulate": True})
-    if not pacote["message_ids"]:
-        return jsonify({"preview": None, "reason": "no-new-messages"})
-
-    contexto = repo.load_context(wa_id)
-    contexto.update({"wa_id": wa_id})
-
-    rot = Orchestrator().route(contexto=contexto, mensagem=pacote["texto_unificado"])
-    repo.log_event(wa_id, "router_choice", rot.model_dump() | {"simulate": True})
-    if rot.handoff:
-        repo.set_handoff(wa_id, True, "router_handoff")
-        return jsonify({"preview": None, "reason": "handoff-requested"})
-
-    response_dict = di["agents"][rot.agente_escolhido].processar(pacote["texto_unificado"], contexto)
-    repo.log_event(wa_id, "agent_output", {"agent": rot.agente_escolhido, "body": response_dict, "simulate": True})
+    turn = di[TurnLanes].run if TurnLanes in di else run_turn
+    res = turn(wa_id, wa_id, simulate=True, provider_message_id=provider_mid)
+    if res["status"] != "preview":
+        return jsonify({"preview": None, "reason": res["reason"]})
 
     # Em simulate NÃO enfileiramos; apenas devolvemos a resposta prevista
-    return jsonify({"preview": response_dict, "agent": rot.agente_escolhido, "window_msgs": len(pacote["message_ids"]) })
+    return jsonify({"preview": res["response"], "agent": res["agent"], "window_msgs": len(res["pacote"]["message_ids"]) })
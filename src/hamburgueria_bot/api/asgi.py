@@ -0,0 +1,162 @@
+
+"""API ASGI (Starlette) com os mesmos endpoints do app Flask (``api/app.py``), sobre asyncio.
+
+    uvicorn hamburgueria_bot.api.asgi:app --workers 2
+
+- Ingresso e handoff no SQLAlchemy async (``repo/arepo.py``); o turno inline roda em ``arun_turn``: roteador e
+  agente aguardam o LLM sem prender thread (``Orchestrator.aroute``/``AgenteLLM.aprocessar``). Com
+  ``HB_TURN_LANES`` o turno vai para as filas por conversa (mesma garantia de série do app Flask).
+- Etapas síncronas do turno (``TurnContext``, coalescência, flush) no executor padrão do loop, com
+  ``HB_ASGI_DB_THREADS`` threads.
+- Pool de workers, dispatcher e summarizer embutidos sobem/descem no lifespan, como no app Flask.
+- Requer o extra ``asgi`` (``pip install -e .[asgi]``). Comparação com o Flask: ``scripts/bench_asgi.py``.
+"""
+from __future__ import annotations
+import asyncio, contextlib, time
+from concurrent.futures import ThreadPoolExecutor
+from kink import di
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Route
+from ..core.di import bootstrap_di
+from ..core.db import create_async_session_factory
+from ..core.logging import set_trace_id, get_logger
+from ..core.guardrails import sanitize_text
+from ..core.catalog import reload_catalog
+from ..core.settings import Settings
+from ..core.metrics import metrics
+from ..repo import arepo
+from ..adk.pipeline import arun_turn
+from ..connectors.whatsapp.cloud_api_adapter import WhatsAppCloudAdapter
+from ..ports.interfaces import MensagemEntradaDTO
+from ..tasks.turn_worker import TurnWorkerPool
+from ..tasks.turn_lanes import TurnLanes
+from ..tasks.outbox_dispatcher import OutboxDispatcher
+from ..tasks.memory_summarizer import MemorySummarizer
+
+bootstrap_di()
+di["async_session_factory"] = create_async_session_factory(di[Settings].database_url)
+log = get_logger()
+
+@contextlib.asynccontextmanager
+async def lifespan(_app: Starlette):
+    s = di[Settings]
+    # a coalescência (poll) segura uma thread pela janela: o executor padrão (≤ 32) limitaria os turnos simultâneos
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(s.asgi_db_threads, thread_name_prefix="turn-db"))
+    if s.ingest_mode == "async" and s.turn_workers_embedded:
+        di[TurnWorkerPool] = TurnWorkerPool().start()
+    if s.ingest_mode == "inline" and s.turn_lanes > 0:
+        di[TurnLanes] = TurnLanes(s.turn_lanes).start()
+    if s.dispatch_embedded:
+        di[OutboxDispatcher] = OutboxDispatcher().start()
+    if s.ctx_summarizer_embedded:
+        di[MemorySummarizer] = MemorySummarizer().start()
+    yield
+    for task in (TurnWorkerPool, TurnLanes, OutboxDispatcher, MemorySummarizer):
+        if task in di:
+            di[task].stop()
+
+async def _turn(conversation_id: str, wa_id: str, **kwargs) -> dict:
+    if TurnLanes in di:
+        return await asyncio.wrap_future(di[TurnLanes].submit(conversation_id, wa_id, **kwargs))
+    return await arun_turn(conversation_id, wa_id, **kwargs)
+
+async def reload_config(request: Request) -> JSONResponse:
+    """Recarrega o catálogo e troca o snapshot vigente de uma vez (agentes e prompts passam a ver a nova versão)."""
+    cat = await asyncio.to_thread(reload_catalog)
+    return JSONResponse({"ok": True, "items_count": len(cat), "version": cat.version})
+
+async def admin_metrics(request: Request) -> JSONResponse:
+    """Métricas em memória do processo (contadores, gauges, histogramas)."""
+    return JSONResponse(metrics.snapshot(request.query_params.get("prefix", "")))
+
+async def healthz(request: Request) -> JSONResponse:
+    """Health check básico."""
+    return JSONResponse({"ok": True})
+
+async def handoff_pause(request: Request) -> JSONResponse:
+    """Pausa a LLM para um contato (transbordo humano)."""
+    body = await request.json() or {}
+    wa_id = body.get("wa_id")
+    if not wa_id:
+        return JSONResponse({"error": "missing wa_id"}, 400)
+    await arepo.set_handoff(wa_id, True, body.get("reason", "manual"))
+    return JSONResponse({"ok": True, "wa_id": wa_id, "paused": True})
+
+async def handoff_resume(request: Request) -> JSONResponse:
+    """Retoma a LLM para um contato pausado."""
+    body = await request.json() or {}
+    wa_id = body.get("wa_id")
+    if not wa_id:
+        return JSONResponse({"error": "missing wa_id"}, 400)
+    await arepo.set_handoff(wa_id, False, "resume")
+    return JSONResponse({"ok": True, "wa_id": wa_id, "paused": False})
+
+async def admin_handoff_paused(request: Request) -> JSONResponse:
+    """Conversas pausadas para atendimento humano (``?limit=&after=`` para paginar)."""
+    limit = min(int(request.query_params.get("limit", 100)), 1000)
+    items = await arepo.list_paused(limit=limit, after=request.query_params.get("after"))
+    return JSONResponse({"items": items, "next": items[-1]["conversation_id"] if len(items) == limit else None})
+
+async def verify(request: Request) -> PlainTextResponse:
+    """Verificação do webhook: retorna hub.challenge ao validar VERIFY_TOKEN."""
+    q = request.query_params
+    if q.get("hub.mode") == "subscribe" and q.get("hub.verify_token") == di[Settings].verify_token:
+        return PlainTextResponse(q.get("hub.challenge") or "")
+    return PlainTextResponse("forbidden", 403)
+
+async def webhook(request: Request) -> JSONResponse | PlainTextResponse:
+    """Recebe mensagens, grava na inbox e roda o turno (inline) ou acorda o pool (``HB_INGEST_MODE=async``)."""
+    set_trace_id(request.headers.get("X-Trace-Id"))
+    adapter = WhatsAppCloudAdapter()
+    body = await request.body()
+    if not adapter.verify_signature(body, request.headers.get("X-Hub-Signature-256")):
+        return PlainTextResponse("bad signature", 403)
+
+    entrada = adapter.normalize_incoming(await request.json())
+    entrada.texto = sanitize_text(entrada.texto)
+    log.info("webhook_in", wa_id=entrada.wa_id, provider_id=entrada.provider_message_id)
+
+    # Idempotência (Inbox)
+    await arepo.save_inbox(entrada)
+
+    if di[Settings].ingest_mode == "async":
+        if TurnWorkerPool in di:
+            di[TurnWorkerPool].notify()
+        return JSONResponse({"accepted": True})
+
+    res = await _turn(entrada.conversation_id, entrada.wa_id, provider_message_id=entrada.provider_message_id)
+    if res["status"] != "queued":
+        return JSONResponse({"queued": False, "reason": res["reason"]})
+    return JSONResponse({"queued": True, "messages_in_window": len(res["pacote"]["message_ids"])})
+
+async def simulate(request: Request) -> JSONResponse:
+    """Simula uma mensagem sem Meta/assinatura (mesmo corpo do ``/simulate`` do app Flask)."""
+    set_trace_id(request.headers.get("X-Trace-Id"))
+    body = await request.json() or {}
+    wa_id = body.get("wa_id") or "debug-wa"
+    texto = sanitize_text(body.get("text", ""))
+    provider_mid = body.get("provider_message_id") or f"debug-{int(time.time())}"
+
+    entrada = MensagemEntradaDTO(wa_id=wa_id, provider_message_id=provider_mid, texto=texto, timestamp=int(time.time()),
+                                 conversation_id=wa_id)
+    await arepo.save_inbox(entrada)
+    log.info("simulate_in", wa_id=wa_id, provider_id=provider_mid, texto=texto)
+
+    res = await _turn(wa_id, wa_id, simulate=True, provider_message_id=provider_mid)
+    if res["status"] != "preview":
+        return JSONResponse({"preview": None, "reason": res["reason"]})
+    return JSONResponse({"preview": res["response"], "agent": res["agent"], "window_msgs": len(res["pacote"]["message_ids"])})
+
+app = Starlette(lifespan=lifespan, routes=[
+    Route("/admin/reload-config", reload_config, methods=["POST"]),
+    Route("/admin/metrics", admin_metrics),
+    Route("/admin/handoff/paused", admin_handoff_paused),
+    Route("/healthz", healthz),
+    Route("/handoff/pause", handoff_pause, methods=["POST"]),
+    Route("/handoff/resume", handoff_resume, methods=["POST"]),
+    Route("/webhook/meta", verify, methods=["GET"]),
+    Route("/webhook/meta", webhook, methods=["POST"]),
+    Route("/simulate", simulate, methods=["POST"]),
+])
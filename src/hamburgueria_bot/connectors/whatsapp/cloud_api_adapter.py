@@ -1,16 +1,37 @@
 
 """Adapter oficial do WhatsApp Cloud API para envio/recebimento."""
 from __future__ import annotations
-import hmac, hashlib
+import hmac, hashlib, time
+from email.utils import parsedate_to_datetime
 import httpx
 from kink import di
 from ...core.settings import Settings
 from ...ports.interfaces import MensagemEntradaDTO, MensagemSaidaDTO, EntregaDTO
 
+# Códigos de rate limit da Graph API → espera padrão (s) quando não vem Retry-After.
+# 4/80007/130429 limitam a conta/app inteira; 131048 (spam) e 131056 (par remetente-destinatário) só o contato.
+RATE_LIMIT_CODES = {4: 60.0, 80007: 60.0, 130429: 30.0, 131048: 300.0, 131056: 6.0}
+ACCOUNT_RATE_LIMIT_CODES = frozenset({4, 80007, 130429})
+
+def _retry_after(r: httpx.Response, code: int | None) -> float | None:
+    """``Retry-After`` (segundos ou data HTTP) ou espera padrão do código de rate limit."""
+    raw = r.headers.get("retry-after")
+    if raw:
+        try:
+            return max(float(raw), 0.0)
+        except ValueError:
+            try:
+                return max(parsedate_to_datetime(raw).timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+    return RATE_LIMIT_CODES.get(code) if code is not None else None
+
 class WhatsAppCloudAdapter:
     """Adapter para WhatsApp Cloud API."""
     def __init__(self, settings: Settings | None = None):
         self.s = settings or di[Settings]
+        self._http: httpx.Client | None = None
+        self._ahttp: httpx.AsyncClient | None = None
 
     # --- Ingress helpers ---
     def verify_signature(self, body_bytes: bytes, header_signature: str | None) -> bool:
@@ -39,9 +60,10 @@ class WhatsAppCloudAdapter:
         )
 
     # --- Egress ---
-    def send(self, msg: MensagemSaidaDTO) -> EntregaDTO:
-        """Envia mensagem de texto simples via Graph API."""
-        url = f"https://graph.facebook.com/v20.0/{self.s.whatsapp_phone_number_id}/messages"
+    def _url(self) -> str:
+        return f"{self.s.whatsapp_graph_base_url.rstrip('/')}/{self.s.whatsapp_phone_number_id}/messages"
+
+    def _request(self, msg: MensagemSaidaDTO) -> tuple[dict, dict]:
         payload = {
             "messaging_product": "whatsapp",
             "to": msg.wa_id,
@@ -49,16 +71,47 @@ class WhatsAppCloudAdapter:
             "text": {"body": msg.texto},
         }
         headers = {"Authorization": f"Bearer {self.s.whatsapp_token}"}
-        with httpx.Client(timeout=10) as cli:
-            r = cli.post(url, json=payload, headers=headers)
-            if r.status_code // 100 == 2:
-                j = r.json()
-                provider_id = j.get("messages", [{}])[0].get("id")
-                return EntregaDTO(ok=True, provider_message_id=provider_id)
-            else:
-                j = {}
-                ctype = r.headers.get("content-type", "")
-                if "application/json" in ctype:
-                    j = r.json()
-                err = j.get("error", {})
-                return EntregaDTO(ok=False, error_code=str(err.get("code")), error_detail=err.get("message"))
+        return payload, headers
+
+    @staticmethod
+    def _result(r: httpx.Response) -> EntregaDTO:
+        if r.status_code // 100 == 2:
+            j = r.json()
+            provider_id = j.get("messages", [{}])[0].get("id")
+            return EntregaDTO(ok=True, provider_message_id=provider_id)
+        j = {}
+        ctype = r.headers.get("content-type", "")
+        if "application/json" in ctype:
+            j = r.json()
+        err = j.get("error", {})
+        code = err.get("code")
+        return EntregaDTO(ok=False, error_code=str(code), error_detail=err.get("message"),
+                          retry_after_s=_retry_after(r, code if isinstance(code, int) else None))
+
+    def _sync_client(self) -> httpx.Client:
+        if self._http is None:
+            self._http = httpx.Client(timeout=10)
+        return self._http
+
+    def _async_client(self) -> httpx.AsyncClient:
+        """Pool assíncrono (criado no primeiro uso, dentro do event loop que o usa)."""
+        if self._ahttp is None:
+            self._ahttp = httpx.AsyncClient(
+                timeout=10, limits=httpx.Limits(max_connections=self.s.dispatch_concurrency,
+                                                max_keepalive_connections=self.s.dispatch_concurrency))
+        return self._ahttp
+
+    def send(self, msg: MensagemSaidaDTO) -> EntregaDTO:
+        """Envia mensagem de texto simples via Graph API (cliente HTTP reutilizado entre envios)."""
+        payload, headers = self._request(msg)
+        return self._result(self._sync_client().post(self._url(), json=payload, headers=headers))
+
+    async def asend(self, msg: MensagemSaidaDTO) -> EntregaDTO:
+        """Versão assíncrona de ``send`` sobre o pool ``httpx.AsyncClient`` (usada pelo dispatcher)."""
+        payload, headers = self._request(msg)
+        return self._result(await self._async_client().post(self._url(), json=payload, headers=headers))
+
+    async def aclose(self) -> None:
+        if self._ahttp is not None:
+            await self._ahttp.aclose()
+            self._ahttp = None
@@ -1,15 +1,30 @@
 
-"""Carregador de catálogo (JSON) para injetar no prompt (LLM-first).
+"""Catálogo (JSON) indexado em memória + texto para injetar no prompt (LLM-first).
 
-- Fonte: config/catalog.json
-- Fornece: load_catalog(), flatten_for_prompt()
+- Fonte: config/catalog.json (``HB_CATALOG_PATH``)
+- ``Catalog``: snapshot imutável com índices pré-calculados — SKU (sem diferenciar maiúsculas), categoria,
+  tag e nome normalizado (``core.text.fold``) para busca aproximada, índice de busca por texto livre
+  (``core/catalog_search.py``) — e ``version`` (hash do conteúdo).
+- O catálogo vigente fica em ``di[Catalog]``; ``reload_catalog`` monta um novo e troca a referência de uma
+  vez. Quem precisa de várias leituras consistentes pega ``cat = di[Catalog]`` uma vez e usa só ``cat``.
+- Texto para o prompt: ``prompt_text`` (até ``prompt_max_items`` itens, ``HB_CATALOG_PROMPT_MAX_ITEMS``) e
+  ``category_summary`` (uma linha por categoria); a seleção por relevância fica em ``core/catalog_prompt.py``.
+- Fornece também: load_catalog(), flatten_for_prompt(), estimate_tokens()
 """
 from __future__ import annotations
-from typing import Any, Dict, List
-import json, os
+from difflib import get_close_matches
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Tuple
+import hashlib, json, os
 from kink import di
+from .text import fold
+from .catalog_search import SearchIndex
+from .logging import get_logger
+
+log = get_logger()
 
 CATALOG_PATH = os.environ.get("HB_CATALOG_PATH", "config/catalog.json")
+PROMPT_MAX_ITEMS = 120
 
 def load_catalog() -> Dict[str, Any]:
     """Carrega o catálogo do disco. Em caso de erro, retorna estrutura padrão vazia."""
@@ -19,22 +34,129 @@ def load_catalog() -> Dict[str, Any]:
     except Exception:
         return {"currency":"BRL","categories":[], "rules":{}}
 
+def estimate_tokens(text: str) -> int:
+    """Estimativa barata de tokens (~4 caracteres/token, mesma conta do ``scripts/stub_gateway.py``)."""
+    return (len(text) + 3) // 4
+
+def prompt_line(it: Mapping[str, Any], category_name: str) -> str:
+    """Linha do item no prompt (SKU; Nome; Preço em R$; tags; categoria)."""
+    price = it.get("price_cents",0)/100
+    tags = ",".join(it.get("tags",[])[:4])
+    return f"{it.get('sku','')} • {it.get('name','')} • R$ {price:.2f} • tags: {tags} • cat: {category_name}"
+
 def flatten_for_prompt(cat: Dict[str, Any], max_items: int = 60) -> str:
     """Retorna string compacta do catálogo para prompt (SKU; Nome; Preço em R$; tags)."""
     lines: List[str] = []
-    cur = cat.get("currency","BRL")
     count = 0
     for c in cat.get("categories", []):
         cname = c.get("name") or c.get("id","")
         for it in c.get("items", []):
             if count >= max_items:
                 break
-            sku = it.get("sku","")
-            name = it.get("name","")
-            price = it.get("price_cents",0)/100
-            tags = ",".join(it.get("tags",[])[:4])
-            lines.append(f"{sku} • {name} • R$ {price:.2f} • tags: {tags} • cat: {cname}")
+            lines.append(prompt_line(it, cname))
             count += 1
     if count >= max_items:
         lines.append("… (catálogo truncado no prompt)")
     return "\n".join(lines)
+
+def _freeze(groups: Dict[str, List[Mapping[str, Any]]]) -> Mapping[str, Tuple[Mapping[str, Any], ...]]:
+    return MappingProxyType({k: tuple(v) for k, v in groups.items()})
+
+class Catalog:
+    """Snapshot imutável do catálogo com índices (ver docstring do módulo). Itens são mappings somente leitura."""
+    def __init__(self, data: Dict[str, Any], prompt_max_items: int = PROMPT_MAX_ITEMS):
+        data = json.loads(json.dumps(data))  # cópia profunda: o snapshot não muda se o dict de origem mudar
+        self.version = hashlib.sha256(json.dumps(data, sort_keys=True, ensure_ascii=False).encode()).hexdigest()[:12]
+        self.currency: str = data.get("currency", "BRL")
+        self.rules: Mapping[str, Any] = MappingProxyType(data.get("rules", {}))
+        items: List[Mapping[str, Any]] = []
+        by_sku: Dict[str, Mapping[str, Any]] = {}
+        by_category: Dict[str, List[Mapping[str, Any]]] = {}
+        by_tag: Dict[str, List[Mapping[str, Any]]] = {}
+        by_name: Dict[str, List[Mapping[str, Any]]] = {}
+        categories: List[Mapping[str, Any]] = []
+        for c in data.get("categories", []):
+            cid = c.get("id") or fold(c.get("name", ""))
+            categories.append(MappingProxyType({"id": cid, "name": c.get("name") or cid}))
+            for raw in c.get("items", []):
+                it = MappingProxyType(raw | {"category": cid})
+                items.append(it)
+                if it.get("sku"):
+                    by_sku.setdefault(it["sku"].upper(), it)
+                by_category.setdefault(cid, []).append(it)
+                for tag in it.get("tags", []):
+                    by_tag.setdefault(fold(tag), []).append(it)
+                by_name.setdefault(fold(it.get("name", "")), []).append(it)
+        self.items: Tuple[Mapping[str, Any], ...] = tuple(items)
+        self.categories: Tuple[Mapping[str, Any], ...] = tuple(categories)
+        self.by_sku: Mapping[str, Mapping[str, Any]] = MappingProxyType(by_sku)
+        self.by_category = _freeze(by_category)
+        self.by_tag = _freeze(by_tag)
+        self.by_name = _freeze(by_name)
+        self.skus_folded: frozenset[str] = frozenset(fold(s) for s in by_sku)
+        self.prompt_max_items = prompt_max_items
+        self.prompt_text: str = flatten_for_prompt(data, max_items=prompt_max_items)
+        self.prompt_complete = len(items) <= prompt_max_items  # prompt_text traz o catálogo inteiro
+        self.category_summary: str = "\n".join(
+            _category_line(c, self.by_category.get(c["id"], ()), self.currency) for c in categories)
+        self.category_names: Mapping[str, str] = MappingProxyType({c["id"]: c["name"] for c in categories})
+        self.search_index = SearchIndex(self.items, self.category_names)
+        self._data = data
+
+    @classmethod
+    def load(cls, path: str | None = None, **kw: Any) -> "Catalog":
+        if path is None:
+            return cls(load_catalog(), **kw)
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f), **kw)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def get(self, sku: str) -> Mapping[str, Any] | None:
+        """Item pelo SKU (``bx2`` == ``BX2``), O(1)."""
+        return self.by_sku.get((sku or "").strip().upper())
+
+    def in_category(self, category_id: str) -> Tuple[Mapping[str, Any], ...]:
+        return self.by_category.get(category_id, ())
+
+    def with_tag(self, tag: str) -> Tuple[Mapping[str, Any], ...]:
+        return self.by_tag.get(fold(tag), ())
+
+    def find_by_name(self, name: str, limit: int = 3, cutoff: float = 0.6) -> List[Mapping[str, Any]]:
+        """Busca aproximada pelo nome normalizado: exato, depois nomes parecidos (difflib)."""
+        key = fold(name)
+        if key in self.by_name:
+            return list(self.by_name[key][:limit])
+        out: List[Mapping[str, Any]] = []
+        for match in get_close_matches(key, self.by_name.keys(), n=limit, cutoff=cutoff):
+            out.extend(self.by_name[match])
+        return out[:limit]
+
+    def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Texto livre → itens ranqueados (nome/tags/SKU, sem acento, tolerante a erro de digitação)."""
+        return self.search_index.search(query, limit)
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Estrutura JSON original (cópia)."""
+        return json.loads(json.dumps(self._data))
+
+def _category_line(c: Mapping[str, Any], items: Tuple[Mapping[str, Any], ...], currency: str) -> str:
+    """Resumo de uma categoria: nome, quantidade, faixa de preço e alguns exemplos."""
+    prices = [it.get("price_cents", 0) for it in items] or [0]
+    examples = ", ".join(it.get("name", "") for it in items[:3])
+    more = "…" if len(items) > 3 else ""
+    return (f"cat: {c['name']} • {len(items)} itens • {currency} {min(prices)/100:.2f}–{max(prices)/100:.2f}"
+            f" • ex.: {examples}{more}")
+
+def reload_catalog(path: str | None = None) -> Catalog:
+    """Monta um novo ``Catalog`` e troca ``di[Catalog]`` atomicamente (leitores em curso seguem no anterior).
+
+    Mantém as opções do catálogo vigente (``prompt_max_items`` do bootstrap), então reload e boot geram o mesmo prompt.
+    """
+    kw = {"prompt_max_items": di[Catalog].prompt_max_items} if Catalog in di else {}
+    cat = Catalog.load(path, **kw)
+    previous = di[Catalog].version if Catalog in di else None
+    di[Catalog] = cat
+    log.info("catalog_loaded", version=cat.version, previous=previous, items=len(cat))
+    return cat
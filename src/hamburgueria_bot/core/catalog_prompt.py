@@ -0,0 +1,76 @@
+
+"""Catálogo no prompt do roteador por relevância, dentro de um orçamento de tokens.
+
+- Catálogo que cabe inteiro no orçamento (``HB_CATALOG_PROMPT_BUDGET_TOKENS``) vai inteiro
+  (``Catalog.prompt_text``), como antes: cardápios pequenos não mudam.
+- Acima disso: ``summary`` = ``Catalog.category_summary`` (uma linha por categoria, estável por versão do
+  catálogo — segue no segmento estático/cacheável do prompt) + ``relevant`` = itens do turno, em ordem:
+  resultados da busca local (``Catalog.search``) por trecho da mensagem coalescida ("uma coca lata e uma
+  batata" → um trecho por item, resultados intercalados), itens do carrinho e itens das categorias citadas
+  na mensagem, até esgotar o orçamento.
+- Tokens estimados por ``core.catalog.estimate_tokens`` (sem tokenizer do provedor).
+"""
+from __future__ import annotations
+import re
+from dataclasses import dataclass
+from itertools import chain, zip_longest
+from typing import Any, Dict, Iterable, List, Mapping
+from .catalog import Catalog, estimate_tokens, prompt_line
+from .text import fold
+
+DEFAULT_BUDGET_TOKENS = 1200
+SEARCH_LIMIT = 8
+_SEGMENTS = re.compile(r"[,;+\n]|\s(?:e|mais|tamb[eé]m)\s", re.IGNORECASE)
+
+@dataclass(frozen=True)
+class CatalogSelection:
+    summary: str  # estático por versão do catálogo
+    relevant: str = ""  # por turno; vazio quando o catálogo vai inteiro
+    items: int = 0  # itens listados (inteiro ou selecionados)
+    full: bool = True
+
+    @property
+    def tokens(self) -> int:
+        return estimate_tokens(self.summary) + estimate_tokens(self.relevant)
+
+def _mentioned_categories(cat: Catalog, mensagem: str) -> List[str]:
+    """Categorias citadas pelo nome ou id ("bebida" casa com "Bebidas": prefixo de 5 letras)."""
+    words = {w[:5] for w in fold(mensagem).split() if len(w) >= 4}
+    out = []
+    for cid, name in cat.category_names.items():
+        if any(w[:5] in words for w in fold(f"{name} {cid}").split() if len(w) >= 4):
+            out.append(cid)
+    return out
+
+def _search_hits(cat: Catalog, mensagem: str) -> List[Mapping[str, Any] | None]:
+    """Busca por trecho da mensagem, intercalando os rankings (o 1º de cada trecho vem antes dos 2ºs)."""
+    parts = [p for p in _SEGMENTS.split(mensagem) if p.strip()] or [mensagem]
+    rankings = [cat.search(p, SEARCH_LIMIT) for p in parts]
+    return [cat.get(r["sku"]) for r in chain.from_iterable(zip_longest(*rankings)) if r is not None]
+
+def select_for_prompt(cat: Catalog, mensagem: str, cart_skus: Iterable[str] = (),
+                      budget_tokens: int = DEFAULT_BUDGET_TOKENS) -> CatalogSelection:
+    """Escolhe o que do catálogo vai no prompt do roteador (ver docstring do módulo)."""
+    if cat.prompt_complete and estimate_tokens(cat.prompt_text) <= budget_tokens:
+        return CatalogSelection(summary=cat.prompt_text, items=len(cat))
+    picked: Dict[str, Mapping[str, Any]] = {}
+    candidates = _search_hits(cat, mensagem)
+    candidates += [cat.get(sku) for sku in cart_skus]
+    for cid in _mentioned_categories(cat, mensagem):
+        candidates += cat.in_category(cid)
+    remaining = budget_tokens - estimate_tokens(cat.category_summary)
+    lines: List[str] = []
+    for it in candidates:
+        if it is None:
+            continue
+        key = it.get("sku") or it.get("name", "")
+        if key in picked:
+            continue
+        line = prompt_line(it, cat.category_names.get(it["category"], it["category"]))
+        cost = estimate_tokens(line) + 1
+        if cost > remaining:
+            break
+        picked[key] = it
+        lines.append(line)
+        remaining -= cost
+    return CatalogSelection(summary=cat.category_summary, relevant="\n".join(lines), items=len(lines), full=False)
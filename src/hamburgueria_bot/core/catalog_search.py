@@ -0,0 +1,116 @@
+
+"""Índice de busca local do catálogo: texto livre → SKUs ranqueados, sem LLM.
+
+- Normalização por ``core.text.fold`` (sem acentos/pontuação): "Média" == "media".
+- Vocabulário de tokens de nome, tags, categoria e SKU, mais o nome "colado" (``cheeseburger``) para casar
+  grafias compostas ("cheeseburguer", "x-bacon").
+- Cada token da consulta casa com tokens do vocabulário por igualdade ou por similaridade de trigramas
+  (Dice ≥ ``min_similarity``, estilo ``pg_trgm``); pontuação = similaridade × peso do campo × idf,
+  somada por item (melhor casamento por token da consulta). SKU exato tem peso próprio.
+- Tudo pré-calculado na construção; o índice é imutável e vive dentro do ``Catalog`` (mesma versão).
+"""
+from __future__ import annotations
+import heapq, math
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+from .text import fold
+
+FIELD_WEIGHTS = {"sku": 3.0, "name": 2.0, "joined": 2.0, "tag": 1.0, "category": 0.5}
+STOPWORDS = frozenset({"x", "de", "da", "do", "com", "sem", "e", "o", "a", "um", "uma", "quero", "me", "ve", "por", "favor"})
+
+def trigrams(token: str) -> frozenset[str]:
+    """Trigramas com borda (``"  ab "``), como o ``pg_trgm``."""
+    padded = f"  {token} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+class SearchIndex:
+    """Índice invertido token → itens e trigrama → tokens (ver docstring do módulo)."""
+    def __init__(self, items: Sequence[Mapping[str, Any]], categories: Mapping[str, str] | None = None,
+                 min_similarity: float = 0.45, fuzzy_candidates: int = 4):
+        self.items = tuple(items)
+        self.min_similarity = min_similarity
+        self.fuzzy_candidates = fuzzy_candidates
+        categories = categories or {}
+        vocab: Dict[str, int] = {}
+        postings: Dict[int, Dict[int, float]] = defaultdict(dict)
+
+        def add(token: str, doc: int, field: str) -> None:
+            if len(token) < 2 and field != "sku":
+                return
+            tid = vocab.setdefault(token, len(vocab))
+            w = FIELD_WEIGHTS[field]
+            if w > postings[tid].get(doc, 0.0):
+                postings[tid][doc] = w
+
+        for doc, it in enumerate(self.items):
+            name_toks = fold(it.get("name", "")).split()
+            for t in name_toks:
+                add(t, doc, "name")
+            if len(name_toks) > 1:
+                add("".join(name_toks), doc, "joined")
+            for tag in it.get("tags", []):
+                for t in fold(tag).split():
+                    add(t, doc, "tag")
+            for t in fold(categories.get(it.get("category", ""), it.get("category", ""))).split():
+                add(t, doc, "category")
+            if it.get("sku"):
+                add(fold(it["sku"]).replace(" ", ""), doc, "sku")
+
+        n = max(len(self.items), 1)
+        self._vocab = vocab
+        self._tokens: Tuple[str, ...] = tuple(sorted(vocab, key=vocab.__getitem__))
+        self._postings: Tuple[Tuple[Tuple[int, float], ...], ...] = tuple(
+            tuple(postings[tid].items()) for tid in range(len(vocab)))
+        self._idf: Tuple[float, ...] = tuple(math.log(1 + n / len(postings[tid])) for tid in range(len(vocab)))
+        tri: Dict[str, List[int]] = defaultdict(list)
+        counts: List[int] = []
+        for tid, tok in enumerate(self._tokens):
+            grams = trigrams(tok)
+            counts.append(len(grams))
+            for g in grams:
+                tri[g].append(tid)
+        self._trigram_counts: Tuple[int, ...] = tuple(counts)
+        self._trigram_index: Dict[str, Tuple[int, ...]] = {g: tuple(v) for g, v in tri.items()}
+
+    def _matches(self, token: str) -> List[Tuple[int, float]]:
+        """Tokens do vocabulário que casam com ``token``: [(token_id, similaridade)]."""
+        exact = self._vocab.get(token)
+        if exact is not None:
+            return [(exact, 1.0)]  # palavra conhecida: variantes por trigrama só adicionariam ruído
+        grams = trigrams(token)
+        shared: Counter[int] = Counter()
+        for g in grams:
+            shared.update(self._trigram_index.get(g, ()))  # contagem em C (Counter.update)
+        n, sizes, floor = len(grams), self._trigram_counts, self.min_similarity
+        scored = []
+        for tid, k in shared.items():
+            sim = 2 * k / (n + sizes[tid])
+            if sim >= floor:
+                scored.append((tid, sim))
+        scored.sort(key=lambda x: -x[1])
+        return scored[:self.fuzzy_candidates]
+
+    def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Itens ranqueados para ``query``: ``[{"sku", "name", "price_cents", "category", "score"}]``."""
+        toks = [t for t in fold(query).split() if t not in STOPWORDS]
+        if not toks:
+            return []
+        if len(toks) > 1:
+            toks.append("".join(toks))  # "cheese burguer" ~ "cheeseburger"; nome completo desempata
+        scores: Dict[int, float] = defaultdict(float)
+        for t in toks:
+            best: Dict[int, float] = {}
+            for tid, sim in self._matches(t):
+                idf = self._idf[tid]
+                for doc, w in self._postings[tid]:
+                    s = sim * w * idf
+                    if s > best.get(doc, 0.0):
+                        best[doc] = s
+            for doc, s in best.items():
+                scores[doc] += s
+        ranked = heapq.nsmallest(limit, scores.items(), key=lambda kv: (-kv[1], kv[0]))
+        return [_result(self.items[doc], score) for doc, score in ranked]
+
+def _result(it: Mapping[str, Any], score: float) -> Dict[str, Any]:
+    return {"sku": it.get("sku"), "name": it.get("name"), "price_cents": it.get("price_cents"),
+            "category": it.get("category"), "score": round(score, 3)}
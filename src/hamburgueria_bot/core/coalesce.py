@@ -5,7 +5,10 @@
 - Espera uma janela de INATIVIDADE (coalesce_window_ms). Se novas mensagens chegarem,
   reinicia o cronômetro (debounce). Limite de espera máx = 3 * coalesce_window_ms.
 - Retorna pacote lógico com:
-    { "texto_unificado": str, "message_ids": list[int], "max_inbox_id": int }
+    { "texto_unificado": str, "message_ids": list[int], "textos": list[str], "max_inbox_id": int }
+  (``textos`` alinhado a ``message_ids``; usado pelo ``TurnContext`` para as últimas mensagens.)
+- ``coalesce_batch`` escolhe a implementação por HB_COALESCE_MODE: ``poll`` (esta) ou
+  ``events`` (debounce em memória, ver ``core/coalesce_events.py``).
 """
 from __future__ import annotations
 import hashlib, time
@@ -30,6 +33,13 @@ def _pg_try_advisory_lock(conn, key: int) -> bool:
 def _pg_advisory_unlock(conn, key: int) -> None:
     conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": key})
 
+def coalesce_batch(conversation_id: str, last_processed_id: int | None) -> Dict:
+    """Coalescência conforme HB_COALESCE_MODE; mesmo formato de retorno nos dois modos."""
+    if di[Settings].coalesce_mode == "events":
+        from .coalesce_events import get_scheduler
+        return get_scheduler().wait_batch(conversation_id, last_processed_id)
+    return coalesce_window(conversation_id, last_processed_id)
+
 def coalesce_window(conversation_id: str, last_processed_id: int | None) -> Dict:
     """Agrupa mensagens por janela de inatividade.
 
@@ -74,7 +84,7 @@ def coalesce_window(conversation_id: str, last_processed_id: int | None) -> Dict
                     time.sleep(min(0.15, window_ms/1000.0))
 
                 if last_seen_id is None:
-                    return {"texto_unificado": "", "message_ids": [], "max_inbox_id": (last_processed_id or 0)}
+                    return {"texto_unificado": "", "message_ids": [], "textos": [], "max_inbox_id": (last_processed_id or 0)}
 
                 # Coletar mensagens novas (id > last_processed_id) até last_seen_id
                 q3 = select(InboxMessage).where(
@@ -88,13 +98,11 @@ def coalesce_window(conversation_id: str, last_processed_id: int | None) -> Dict
                 ids = []
                 for r in rows:
                     payload = r.payload or {}
-                    txt = payload.get("texto", "")
-                    if txt:
-                        texts.append(txt)
+                    texts.append(payload.get("texto", ""))
                     ids.append(r.id)
 
-                texto_unificado = " ".join(texts).strip()
-                return {"texto_unificado": texto_unificado, "message_ids": ids, "max_inbox_id": last_seen_id}
+                texto_unificado = " ".join(t for t in texts if t).strip()
+                return {"texto_unificado": texto_unificado, "message_ids": ids, "textos": texts, "max_inbox_id": last_seen_id}
             finally:
                 try:
                     _pg_advisory_unlock(conn, key)
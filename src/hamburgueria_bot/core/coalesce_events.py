@@ -0,0 +1,237 @@
+
+"""Coalescência orientada a eventos: sinal de inbox + debounce em memória (heap de timers).
+
+- Inserções na inbox emitem sinal: in-process (``publish_inbox``, chamado por ``repo.save_inbox``)
+  e Postgres ``NOTIFY inbox_new`` (trigger da migração 0002) ouvido por uma thread ``LISTEN`` (multi-processo;
+  sobe com ``HB_COALESCE_NOTIFY=pg`` ou ``HB_TURN_SUPERSEDE``).
+- ``DebounceScheduler`` guarda por conversa o prazo de flush: inatividade de ``coalesce_window_ms``,
+  limitada a 3x a janela desde a primeira mensagem (mesma semântica de ``coalesce_window``).
+- Nenhuma query enquanto espera: no flush, o primeiro waiter faz UMA leitura da inbox e recebe
+  ``{ "texto_unificado", "message_ids", "max_inbox_id" }``; waiters concorrentes da mesma conversa
+  recebem pacote vazio (foram absorvidos pelo turno do primeiro). Flush sem waiter não lê nada.
+"""
+from __future__ import annotations
+import heapq, itertools, threading, time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List
+from kink import di
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from .settings import Settings
+from .metrics import metrics
+from .logging import get_logger
+from .supersede import notify_inbox
+from ..repo.models import InboxMessage
+
+log = get_logger()
+
+NOTIFY_CHANNEL = "inbox_new"
+
+def read_batch(conversation_id: str, last_processed_id: int | None) -> Dict:
+    """Leitura única das mensagens novas (id > last_processed_id) e montagem do pacote lógico."""
+    Session = di["session_factory"]
+    with Session() as s:
+        q = select(InboxMessage.id, InboxMessage.payload).where(InboxMessage.conversation_id == conversation_id)
+        if last_processed_id:
+            q = q.where(InboxMessage.id > last_processed_id)
+        rows = s.execute(q.order_by(InboxMessage.id.asc())).all()
+    if not rows:
+        return _empty(last_processed_id)
+    texts = [(r.payload or {}).get("texto", "") for r in rows]
+    return {
+        "texto_unificado": " ".join(t for t in texts if t).strip(),
+        "message_ids": [r.id for r in rows],
+        "textos": texts,
+        "max_inbox_id": rows[-1].id,
+    }
+
+def _empty(last_processed_id: int | None) -> Dict:
+    return {"texto_unificado": "", "message_ids": [], "textos": [], "max_inbox_id": (last_processed_id or 0)}
+
+@dataclass
+class _Waiter:
+    last_processed_id: int | None
+    event: threading.Event = field(default_factory=threading.Event)
+    leader: bool = False
+
+@dataclass
+class _Pending:
+    first_at: float
+    last_at: float
+    max_id: int = 0
+    waiters: List[_Waiter] = field(default_factory=list)
+
+    def deadline(self, window_s: float) -> float:
+        return min(self.last_at + window_s, self.first_at + 3 * window_s)
+
+class DebounceScheduler:
+    """Timers de debounce por conversa num heap, servidos por uma única thread."""
+    def __init__(self, window_ms: int, reader: Callable[[str, int | None], Dict] = read_batch):
+        self.window_s = window_ms / 1000.0
+        self._reader = reader
+        self._pending: Dict[str, _Pending] = {}
+        self._heap: list[tuple[float, int, str]] = []
+        self._seq = itertools.count()
+        self._cv = threading.Condition()
+        self._stop = False
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "DebounceScheduler":
+        self._thread = threading.Thread(target=self._run, name="coalesce-debounce", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        with self._cv:
+            self._stop = True
+            self._cv.notify_all()
+        if self._thread:
+            self._thread.join(timeout=2)
+
+    def _schedule(self, cid: str, p: _Pending) -> None:
+        heapq.heappush(self._heap, (p.deadline(self.window_s), next(self._seq), cid))
+        self._cv.notify()
+
+    def touch(self, conversation_id: str, inbox_id: int | None = None) -> None:
+        """Sinaliza nova mensagem na inbox: (re)inicia o relógio de inatividade da conversa.
+
+        Notificações repetidas do mesmo id (sinal local + NOTIFY) não estendem a janela.
+        """
+        now = time.monotonic()
+        with self._cv:
+            p = self._pending.get(conversation_id)
+            if p is None:
+                p = self._pending[conversation_id] = _Pending(first_at=now, last_at=now, max_id=inbox_id or 0)
+            elif inbox_id is None or inbox_id > p.max_id:
+                p.last_at = now
+                p.max_id = max(p.max_id, inbox_id or 0)
+            else:
+                return
+            self._schedule(conversation_id, p)
+
+    def wait_batch(self, conversation_id: str, last_processed_id: int | None, timeout: float | None = None) -> Dict:
+        """Bloqueia até a conversa ficar quieta pela janela e retorna o pacote lógico.
+
+        :param conversation_id: id da conversa.
+        :param last_processed_id: última inbox id já respondida (do snapshot).
+        :param timeout: limite de espera (padrão: 3x janela + 5 s); ao estourar, lê direto.
+        """
+        w = _Waiter(last_processed_id)
+        with self._cv:
+            p = self._pending.get(conversation_id)
+            if p is None:
+                now = time.monotonic()
+                p = self._pending[conversation_id] = _Pending(first_at=now, last_at=now)
+                self._schedule(conversation_id, p)
+            p.waiters.append(w)
+        if not w.event.wait(timeout if timeout is not None else self.window_s * 3 + 5):
+            metrics.incr("coalesce.wait_timeouts")
+            return self._reader(conversation_id, last_processed_id)
+        if not w.leader:
+            return _empty(last_processed_id)
+        return self._reader(conversation_id, last_processed_id)
+
+    def _run(self) -> None:
+        while True:
+            with self._cv:
+                while True:
+                    if self._stop:
+                        return
+                    if not self._heap:
+                        self._cv.wait()
+                        continue
+                    deadline, _, cid = self._heap[0]
+                    now = time.monotonic()
+                    if deadline > now:
+                        self._cv.wait(deadline - now)
+                        continue
+                    heapq.heappop(self._heap)
+                    p = self._pending.get(cid)
+                    # Entrada obsoleta: a conversa foi tocada depois e tem prazo novo no heap.
+                    if p is None or p.deadline(self.window_s) > now:
+                        continue
+                    del self._pending[cid]
+                    break
+            self._flush(cid, p)
+
+    def _flush(self, cid: str, p: _Pending) -> None:
+        metrics.incr("coalesce.flushes")
+        if not p.waiters:
+            metrics.incr("coalesce.flushes_unwaited")
+            return
+        metrics.incr("coalesce.merged_waiters", len(p.waiters) - 1)
+        p.waiters[0].leader = True
+        for w in p.waiters:
+            w.event.set()
+        log.info("coalesce_flush", conversation_id=cid, waiters=len(p.waiters), max_id=p.max_id)
+
+class PgInboxListener:
+    """Thread ``LISTEN inbox_new`` (inbox gravada por qualquer processo): reinicia o debounce no modo ``events`` com
+    ``HB_COALESCE_NOTIFY=pg`` e supera o turno em andamento da conversa com ``HB_TURN_SUPERSEDE``."""
+    def __init__(self, database_url: str):
+        self.dsn = make_url(database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "PgInboxListener":
+        self._thread = threading.Thread(target=self._run, name="inbox-listen", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        import psycopg
+        settings: Settings = di[Settings]
+        while not self._stop.is_set():
+            try:
+                with psycopg.connect(self.dsn, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    while not self._stop.is_set():
+                        for n in conn.notifies(timeout=1.0):
+                            cid, _, inbox_id = n.payload.rpartition(":")
+                            iid = int(inbox_id) if inbox_id.isdigit() else None
+                            if settings.coalesce_mode == "events" and settings.coalesce_notify == "pg":
+                                get_scheduler().touch(cid, iid)
+                            if settings.turn_supersede:
+                                notify_inbox(cid, iid)
+            except Exception as e:
+                log.info("inbox_listen_error", error=str(e))
+                self._stop.wait(1.0)
+
+_scheduler: DebounceScheduler | None = None
+_scheduler_lock = threading.Lock()
+_listener: PgInboxListener | None = None
+_listener_lock = threading.Lock()
+
+def get_scheduler() -> DebounceScheduler:
+    """Scheduler do processo (criado e iniciado no primeiro uso, com listener PG se configurado)."""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                settings: Settings = di[Settings]
+                _scheduler = DebounceScheduler(settings.coalesce_window_ms).start()
+                if settings.coalesce_notify == "pg":
+                    ensure_inbox_listener()
+    return _scheduler
+
+def ensure_inbox_listener() -> None:
+    """Sobe (uma vez por processo) o ``PgInboxListener``; chamado pelo scheduler com ``HB_COALESCE_NOTIFY=pg`` e
+    por todo processo que roda turnos com ``HB_TURN_SUPERSEDE`` (o sinal local só vê a inbox do próprio processo)."""
+    global _listener
+    if _listener is None:
+        with _listener_lock:
+            if _listener is None:
+                _listener = PgInboxListener(di[Settings].database_url).start()
+
+def publish_inbox(conversation_id: str, inbox_id: int | None) -> None:
+    """Sinal in-process de inserção na inbox: supera o turno em andamento da conversa (``HB_TURN_SUPERSEDE``)
+    e, no modo ``events``, reinicia o debounce."""
+    settings: Settings = di[Settings]
+    if settings.turn_supersede:
+        notify_inbox(conversation_id, inbox_id)
+    if settings.coalesce_mode != "events":
+        return
+    get_scheduler().touch(conversation_id, inbox_id)
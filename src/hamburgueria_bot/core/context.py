@@ -1,10 +1,25 @@
 
-"""Helpers para montar contexto conversacional (últimas mensagens)."""
+"""Helpers para montar contexto conversacional (últimas mensagens) com orçamento de tokens.
+
+- ``build_context``: contexto do turno limitado a ``HB_CTX_BUDGET_TOKENS`` — projeção compacta do snapshot
+  (``project_snapshot``), ``memory_summary`` (até ``SUMMARY_SHARE`` do orçamento) e as últimas mensagens nos
+  dois sentidos (``cliente:``/``bot:``), das mais novas para as mais antigas, até esgotar o que sobrou.
+- O ``memory_summary`` é mantido fora do caminho da requisição (``tasks/memory_summarizer.py``): o que saiu da
+  janela de mensagens recentes já está no resumo, então o prompt fica limitado por mais longa que seja a conversa.
+- Tokens estimados por ``core.catalog.estimate_tokens``.
+"""
 from __future__ import annotations
-from typing import List, Dict, Any
+import json
+from typing import List, Dict, Any, Sequence, Tuple
 from kink import di
 from sqlalchemy import select
 from ..repo.models import InboxMessage
+from .catalog import estimate_tokens
+
+DEFAULT_BUDGET_TOKENS = 900
+SUMMARY_SHARE = 0.35
+MESSAGE_MAX_CHARS = 400
+SNAPSHOT_INTERNAL = frozenset({"last_turn_inbox_id"})  # marcas d'água do pipeline, sem valor para o LLM
 
 def last_messages(conversation_id: str, limit: int = 5) -> Dict[str, Any]:
     """Retorna últimas N mensagens de entrada em ordem cronológica."""
@@ -20,3 +35,52 @@ def last_messages(conversation_id: str, limit: int = 5) -> Dict[str, Any]:
             if t:
                 texts.append(t)
     return {"ultimas": texts}
+
+def _clip(text: str, max_chars: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= max_chars else text[:max_chars - 1] + "…"
+
+def project_snapshot(snapshot: Dict[str, Any] | None) -> Dict[str, Any]:
+    """Projeção compacta do snapshot para o prompt: sem marcas internas, só o último pagamento (sem o código
+    PIX), strings e listas aparadas."""
+    out: Dict[str, Any] = {}
+    for k, v in (snapshot or {}).items():
+        if k in SNAPSHOT_INTERNAL or v in (None, "", [], {}):
+            continue
+        if k == "payments" and isinstance(v, list):
+            last = v[-1] if isinstance(v[-1], dict) else {}
+            out["pagamento"] = {"status": last.get("status"), "amount_cents": last.get("amount_cents"),
+                                "tentativas": len(v)}
+        elif isinstance(v, str):
+            out[k] = _clip(v, 200)
+        elif isinstance(v, list):
+            out[k] = v[-3:]
+        else:
+            out[k] = v
+    return out
+
+def build_context(memory_summary: str | None, snapshot: Dict[str, Any] | None, turns: Sequence[Tuple[str, str]],
+                  budget_tokens: int = DEFAULT_BUDGET_TOKENS) -> Dict[str, Any]:
+    """Contexto com orçamento (ver docstring do módulo).
+
+    :param turns: ``(papel, texto)`` em ordem cronológica, papel ``cliente`` ou ``bot``.
+    :return: ``{"memory_summary", "snapshot", "ultimas", "tokens"}``.
+    """
+    snap = project_snapshot(snapshot)
+    remaining = budget_tokens - estimate_tokens(json.dumps(snap, ensure_ascii=False))
+    summary = ""
+    if memory_summary:
+        summary = _clip(memory_summary, max(0, int(budget_tokens * SUMMARY_SHARE) * 4))
+        remaining -= estimate_tokens(summary)
+    ultimas: List[str] = []
+    for papel, texto in reversed(turns):
+        if not texto:
+            continue
+        line = f"{papel}: {_clip(texto, MESSAGE_MAX_CHARS)}"
+        cost = estimate_tokens(line) + 1
+        if cost > remaining:
+            break
+        ultimas.append(line)
+        remaining -= cost
+    ultimas.reverse()
+    return {"memory_summary": summary, "snapshot": snap, "ultimas": ultimas, "tokens": budget_tokens - remaining}
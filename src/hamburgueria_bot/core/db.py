@@ -1,13 +1,53 @@
 
-"""Factory de sessão do SQLAlchemy 2."""
-from sqlalchemy import create_engine
+"""Factory de sessão do SQLAlchemy 2 (síncrona e asyncio) + instrumentação de round trips (contagem de statements)."""
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from .metrics import metrics
+
+class QueryCount:
+    """Contador de statements SQL executados dentro de um escopo ``count_queries()``."""
+    def __init__(self):
+        self.n = 0
+
+_query_scope: ContextVar[QueryCount | None] = ContextVar("db_query_scope", default=None)
+
+def _on_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    metrics.incr("db.queries")
+    qc = _query_scope.get()
+    if qc is not None:
+        qc.n += 1
+
+@contextmanager
+def count_queries() -> Iterator[QueryCount]:
+    """Conta os statements executados no contexto atual (thread/task) enquanto o bloco roda."""
+    qc = QueryCount()
+    token = _query_scope.set(qc)
+    try:
+        yield qc
+    finally:
+        _query_scope.reset(token)
 
 def create_session_factory(database_url: str):
     """Cria SessionFactory síncrona para SQLAlchemy 2.
 
     :param database_url: URL completa do banco (psycopg3).
-    :return: sessionmaker configurado.
+    :return: sessionmaker configurado (engine instrumentado para ``count_queries``).
     """
     engine = create_engine(database_url, pool_pre_ping=True, future=True)
+    event.listen(engine, "before_cursor_execute", _on_execute)
     return sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False, future=True)
+
+def create_async_session_factory(database_url: str):
+    """Cria ``async_sessionmaker`` (psycopg3 em modo async) para o app ASGI (``api/asgi.py``).
+
+    Importa ``sqlalchemy.ext.asyncio`` só aqui: depende do extra ``asgi`` (greenlet).
+    :param database_url: mesma URL da factory síncrona.
+    """
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    engine = create_async_engine(database_url, pool_pre_ping=True)
+    event.listen(engine.sync_engine, "before_cursor_execute", _on_execute)
+    return async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
@@ -7,11 +7,17 @@ from .db import create_session_factory
 from ..adk.agents.saudacao import AgenteSaudacao
 from ..adk.agents.cardapio import AgenteCardapio
 from ..adk.agents.carrinho import AgenteCarrinho
-    from ..adk.agents.endereco import AgenteEndereco
-    from ..adk.agents.pagamento import AgentePagamento
+from ..adk.agents.endereco import AgenteEndereco
+from ..adk.agents.pagamento import AgentePagamento
 from .llm_client import LLMClient
 from .prompting import PromptBuilder
-    from .catalog import load_catalog, flatten_for_prompt
+from .catalog import Catalog
+from .llm_cache import ResponseCache
+from . import semantic_cache
+from ..adk.prerouter import PreRouter, HashedNgramModel
+from ..ports.interfaces import TurnSignals
+from ..tasks.turn_signals import BackgroundSignals
+import os
 
 def bootstrap_di() -> None:
     settings = Settings()
@@ -19,14 +25,31 @@ def bootstrap_di() -> None:
     di["logger"] = get_logger()
     di["session_factory"] = create_session_factory(settings.database_url)
     di[LLMClient] = LLMClient(settings)
-    di["catalog"] = load_catalog()
-        di["catalog_text"] = flatten_for_prompt(di["catalog"], max_items=120)
-        di[PromptBuilder] = PromptBuilder(loja_nome="ADK Burger", janela_coalescencia_ms=settings.coalesce_window_ms)
+    di[TurnSignals] = BackgroundSignals()
+    di[Catalog] = Catalog.load(prompt_max_items=settings.catalog_prompt_max_items)
+    di[PromptBuilder] = PromptBuilder(
+        loja_nome="ADK Burger", janela_coalescencia_ms=settings.coalesce_window_ms, layout=settings.prompt_layout,
+    )
+    if settings.llm_cache_enabled:
+        di[ResponseCache] = ResponseCache(settings.llm_cache_max_entries, settings.llm_cache_ttl_s,
+                                          shared=settings.llm_cache_shared, settings=settings)
+    if settings.semantic_cache_enabled:
+        if semantic_cache.available():
+            di[semantic_cache.SemanticCache] = semantic_cache.SemanticCache(
+                settings.semantic_cache_threshold, settings.semantic_cache_max_entries, settings.semantic_cache_ttl_s,
+                settings=settings)
+        else:
+            di["logger"].info("semantic_cache_unavailable", hint="pip install -e .[semantic]")
+    if settings.prerouter_enabled:
+        model = None
+        if settings.prerouter_model_path and os.path.exists(settings.prerouter_model_path):
+            model = HashedNgramModel.load(settings.prerouter_model_path)
+        di[PreRouter] = PreRouter(threshold=settings.prerouter_threshold, model=model)
     # Registro de agentes orientados a prompt
     di["agents"] = {
         "saudacao": AgenteSaudacao,
         "cardapio": AgenteCardapio,
         "carrinho": AgenteCarrinho,
-            "endereco": AgenteEndereco,
-            "pagamento": AgentePagamento,
+        "endereco": AgenteEndereco,
+        "pagamento": AgentePagamento,
     }
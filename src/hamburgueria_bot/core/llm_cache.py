@@ -0,0 +1,175 @@
+
+"""Cache de respostas do LLM para turnos determinísticos (roteador e perguntas frequentes).
+
+- Chave: sha256 de (tipo — ``router`` ou ``agent.<nome>`` —, modelo, temperatura, versão dos prompts
+  (``PromptBuilder.version``), versão do catálogo, projeção do contexto e texto do cliente). A projeção é o que
+  entra no prompt sem os identificadores da conversa (``IDENTITY_KEYS``); textos passam por ``core.text.fold``
+  ("Oi!" e "oi" caem na mesma chave).
+- Camada local: LRU limitado (``HB_LLM_CACHE_MAX_ENTRIES``) com TTL (``HB_LLM_CACHE_TTL_S``).
+- Camada compartilhada opcional (``HB_LLM_CACHE_SHARED``, migração ``0008``): tabela ``llm_response_cache`` com
+  ``expires_at``; consultada quando a local erra. Falha do banco vira miss, nunca erro do turno.
+- Troca do catálogo (``reload_catalog``) invalida: a versão faz parte da chave, a camada local é limpa na
+  primeira consulta após a troca e a compartilhada apaga as linhas de outras versões.
+- Turnos que executaram tools não entram (``AgenteLLM`` grava só quando ``track_tool_calls`` ficou vazio).
+- Métricas: ``llm.cache.hit|miss|put`` (e ``.<tipo>``), ``llm.cache.shared_hit``, ``llm.cache.errors``,
+  gauges ``llm.cache.hit_ratio`` e ``llm.cache.entries``.
+"""
+from __future__ import annotations
+import hashlib, json, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+from kink import di
+from sqlalchemy import bindparam, text
+from sqlalchemy.dialects.postgresql import JSONB
+from .catalog import Catalog
+from .metrics import metrics
+from .settings import Settings
+from .text import fold
+from .logging import get_logger
+
+log = get_logger()
+
+IDENTITY_KEYS = frozenset({"wa_id", "conversation_id"})
+PURGE_EVERY = 500  # gravações na camada compartilhada entre limpezas de expirados
+
+_GET_SQL = text("SELECT value FROM llm_response_cache WHERE key = :key AND expires_at > (now() at time zone 'utc')")
+
+_PUT_SQL = text("""
+    INSERT INTO llm_response_cache (key, kind, catalog_version, value, expires_at)
+    VALUES (:key, :kind, :version, :value, (now() at time zone 'utc') + make_interval(secs => CAST(:ttl AS double precision)))
+    ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, expires_at = EXCLUDED.expires_at
+""").bindparams(bindparam("value", type_=JSONB))
+
+_PURGE_SQL = text("""
+    DELETE FROM llm_response_cache
+    WHERE catalog_version <> :version OR expires_at <= (now() at time zone 'utc')
+""")
+
+def project(value: Any) -> Any:
+    """Projeção normalizada para a chave: sem identificadores da conversa, textos por ``fold``."""
+    if isinstance(value, dict):
+        return {k: project(v) for k, v in value.items() if k not in IDENTITY_KEYS}
+    if isinstance(value, (list, tuple)):
+        return [project(v) for v in value]
+    if isinstance(value, str):
+        return fold(value)
+    return value
+
+class ResponseCache:
+    """LRU com TTL + camada Postgres opcional (ver docstring do módulo)."""
+    def __init__(self, max_entries: int = 2000, ttl_s: float = 600.0, shared: bool = False,
+                 settings: Settings | None = None):
+        self.settings = settings or di[Settings]
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.shared = shared
+        self._lru: OrderedDict[str, Tuple[float, Dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = self._catalog_version()
+        self._puts = 0
+
+    @staticmethod
+    def _catalog_version() -> str:
+        return di[Catalog].version if Catalog in di else ""
+
+    def key(self, kind: str, prompt_version: str, context: Any, texto: str) -> str:
+        s = self.settings
+        raw = json.dumps([kind, s.litellm_model_primary, s.litellm_temperature, prompt_version, self._catalog_version(),
+                          project(context), fold(texto)], ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def get(self, kind: str, key: str) -> Dict[str, Any] | None:
+        self._check_version()
+        now = time.monotonic()
+        with self._lock:
+            hit = self._lru.get(key)
+            if hit is not None and hit[0] <= now:
+                del self._lru[key]
+                hit = None
+            if hit is not None:
+                self._lru.move_to_end(key)
+        value = hit[1] if hit is not None else self._shared_get(key)
+        self._count("hit" if value is not None else "miss", kind)
+        return value
+
+    def put(self, kind: str, key: str, value: Dict[str, Any]) -> None:
+        self._check_version()
+        self._remember(key, value)
+        self._count("put", kind)
+        if self.shared:
+            self._shared_put(kind, key, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+        metrics.gauge("llm.cache.entries", 0)
+
+    def __len__(self) -> int:
+        return len(self._lru)
+
+    # ---------- internos ----------
+    def _remember(self, key: str, value: Dict[str, Any]) -> None:
+        with self._lock:
+            self._lru[key] = (time.monotonic() + self.ttl_s, value)
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+            n = len(self._lru)
+        metrics.gauge("llm.cache.entries", n)
+
+    def _check_version(self) -> None:
+        version = self._catalog_version()
+        if version == self._version:
+            return
+        self._version = version
+        self.clear()
+        log.info("llm_cache_invalidated", catalog_version=version)
+        if self.shared:
+            self._shared_purge()
+
+    @staticmethod
+    def _count(what: str, kind: str) -> None:
+        metrics.incr(f"llm.cache.{what}")
+        metrics.incr(f"llm.cache.{what}.{kind}")
+        if what != "put":
+            hits, total = metrics.counter("llm.cache.hit"), metrics.counter("llm.cache.hit") + metrics.counter("llm.cache.miss")
+            metrics.gauge("llm.cache.hit_ratio", round(hits / total, 4) if total else 0.0)
+
+    def _shared_get(self, key: str) -> Dict[str, Any] | None:
+        if not self.shared:
+            return None
+        try:
+            with di["session_factory"]() as s:
+                value = s.execute(_GET_SQL, {"key": key}).scalar()
+        except Exception as e:
+            metrics.incr("llm.cache.errors")
+            log.info("llm_cache_error", op="get", error=str(e))
+            return None
+        if value is not None:
+            metrics.incr("llm.cache.shared_hit")
+            self._remember(key, value)
+        return value
+
+    def _shared_put(self, kind: str, key: str, value: Dict[str, Any]) -> None:
+        self._puts += 1
+        try:
+            with di["session_factory"]() as s, s.begin():
+                s.execute(_PUT_SQL, {"key": key, "kind": kind, "version": self._version, "value": value,
+                                     "ttl": self.ttl_s})
+        except Exception as e:
+            metrics.incr("llm.cache.errors")
+            log.info("llm_cache_error", op="put", error=str(e))
+            return
+        if self._puts % PURGE_EVERY == 0:
+            self._shared_purge()
+
+    def _shared_purge(self) -> None:
+        try:
+            with di["session_factory"]() as s, s.begin():
+                n = s.execute(_PURGE_SQL, {"version": self._version}).rowcount
+        except Exception as e:
+            metrics.incr("llm.cache.errors")
+            log.info("llm_cache_error", op="purge", error=str(e))
+            return
+        if n:
+            log.info("llm_cache_purged", rows=n, catalog_version=self._version)
@@ -1,50 +1,239 @@
 
-"""Cliente HTTP para LiteLLM, com validação Pydantic e suporte a tool-calling executável."""
-from typing import Any, Type, Dict
-import httpx, json
+"""Cliente do gateway LiteLLM: ``AsyncLLMClient`` (pool HTTP, hedging, streaming, loop de tools) e a fachada
+síncrona ``LLMClient`` sobre um event loop dedicado, com versões ``a*`` para código asyncio."""
+from __future__ import annotations
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Tuple, Type, TypeVar
+import asyncio, threading, time
+import httpx
 from pydantic import BaseModel
 from kink import di
 from .settings import Settings
-from ..adk.runtime.toolkit import ToolRegistry
+from .metrics import metrics
+from .llm_stream import TextoStream, ToolCallAccumulator, iter_sse_data
+from . import supersede
+from .logging import get_logger
+from ..adk.runtime.toolkit import ToolBatch, ToolRegistry
 
-class LLMClient:
-    """Cliente do gateway LiteLLM.
-    Suporta: complete_json() e complete_with_tools_loop().
+log = get_logger()
+
+T = TypeVar("T")
+
+def _h2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+# ---------- uso de tokens ----------
+class TokenUsage:
+    """Tokens consumidos dentro de um escopo ``track_usage()`` (ex.: um turno: roteador + agente)."""
+    def __init__(self):
+        self.calls = 0
+        self.prompt = 0
+        self.cached = 0
+        self.cache_write = 0
+        self.completion = 0
+
+    def add(self, prompt: int, cached: int, cache_write: int, completion: int) -> None:
+        self.calls += 1
+        self.prompt += prompt
+        self.cached += cached
+        self.cache_write += cache_write
+        self.completion += completion
+
+    def as_dict(self) -> Dict[str, int]:
+        return {"calls": self.calls, "prompt": self.prompt, "cached": self.cached,
+                "cache_write": self.cache_write, "completion": self.completion}
+
+_usage_scope: ContextVar[TokenUsage | None] = ContextVar("llm_usage_scope", default=None)
+
+@contextmanager
+def track_usage() -> Iterator[TokenUsage]:
+    """Soma o uso de tokens das chamadas feitas no contexto atual enquanto o bloco roda."""
+    u = TokenUsage()
+    token = _usage_scope.set(u)
+    try:
+        yield u
+    finally:
+        _usage_scope.reset(token)
+
+def _int(v: Any) -> int:
+    try:
+        return int(v or 0)
+    except (TypeError, ValueError):
+        return 0
+
+def parse_usage(data: Dict[str, Any]) -> tuple[int, int, int, int]:
+    """``usage`` da resposta → (prompt, cached, cache_write, completion).
+
+    Campos aceitos (LiteLLM repassa o formato de cada provedor):
+    - OpenAI/Azure/Gemini: ``prompt_tokens_details.cached_tokens``;
+    - Anthropic: ``cache_read_input_tokens`` / ``cache_creation_input_tokens``;
+    - DeepSeek: ``prompt_cache_hit_tokens``.
+    ``prompt`` inclui os tokens vindos do cache (como no formato OpenAI).
+    """
+    usage = data.get("usage") or {}
+    details = usage.get("prompt_tokens_details") or {}
+    cached = max(_int(details.get("cached_tokens")), _int(usage.get("cache_read_input_tokens")),
+                 _int(usage.get("prompt_cache_hit_tokens")))
+    cache_write = _int(usage.get("cache_creation_input_tokens"))
+    prompt = max(_int(usage.get("prompt_tokens")), cached)
+    return prompt, cached, cache_write, _int(usage.get("completion_tokens"))
+
+def _record_usage(model: str, data: Dict[str, Any]) -> None:
+    prompt, cached, cache_write, completion = parse_usage(data)
+    if not (prompt or completion):
+        return
+    metrics.incr("llm.tokens.prompt", prompt)
+    metrics.incr("llm.tokens.cached", cached)
+    metrics.incr("llm.tokens.cache_write", cache_write)
+    metrics.incr("llm.tokens.completion", completion)
+    metrics.incr(f"llm.tokens.prompt.{model}", prompt)
+    metrics.incr(f"llm.tokens.cached.{model}", cached)
+    total = metrics.counter("llm.tokens.prompt")
+    metrics.gauge("llm.prefix_cache_hit_ratio", round(metrics.counter("llm.tokens.cached") / total, 4) if total else 0.0)
+    u = _usage_scope.get()
+    if u is not None:
+        u.add(prompt, cached, cache_write, completion)
+
+class AsyncLLMClient:
+    """Cliente assíncrono do gateway LiteLLM.
+    Suporta: complete_json(), complete_with_tools_loop() e stream_with_tools_loop().
+
+    Um ``httpx.AsyncClient`` de vida longa; com hedging, se o primário passa do percentil de latência observado,
+    ``litellm_model_fallback`` corre em paralelo e quem perder é cancelado (``llm.latency_ms.<modelo>``). Tokens
+    de cada resposta vão para ``llm.tokens.*`` e para o ``track_usage()`` ativo. Tool calls de um passo rodam
+    no ``ToolBatch``; turno superado (``core/supersede.py``) para na fronteira do passo.
     """
     def __init__(self, settings: Settings | None = None):
         self.settings = settings or di[Settings]
+        self._http: httpx.AsyncClient | None = None
+        self._tool_pool: ThreadPoolExecutor | None = None
 
-    def _client(self) -> httpx.Client:
-        return httpx.Client(base_url=self.settings.litellm_base_url, timeout=self.settings.litellm_timeout_s)
+    def _tools(self, registry: ToolRegistry) -> ToolBatch:
+        """Execução das tool calls de um passo no pool de tools (I/O de banco fora do event loop)."""
+        if self._tool_pool is None:
+            self._tool_pool = ThreadPoolExecutor(self.settings.tool_max_parallel, thread_name_prefix="tool")
+        return ToolBatch(registry, self._tool_pool)
 
-    def complete_json(self, system: str, user: str, schema: Type[BaseModel]) -> BaseModel:
-        payload = {
-            "model": self.settings.litellm_model_primary,
+    def _client(self) -> httpx.AsyncClient:
+        """Cliente HTTP compartilhado (criado no primeiro uso, dentro do event loop que o usa)."""
+        if self._http is None:
+            s = self.settings
+            http2 = s.litellm_http2 and _h2_available()
+            if s.litellm_http2 and not http2:
+                log.info("llm_http2_unavailable", hint="pip install 'httpx[http2]'")
+            self._http = httpx.AsyncClient(
+                base_url=s.litellm_base_url,
+                timeout=s.litellm_timeout_s,
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=s.litellm_max_connections,
+                    max_keepalive_connections=s.litellm_max_connections,
+                    keepalive_expiry=s.litellm_keepalive_expiry_s,
+                ),
+            )
+        return self._http
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        if self._tool_pool is not None:
+            self._tool_pool.shutdown(wait=False)
+            self._tool_pool = None
+
+    # ---------- transporte ----------
+    async def _attempt(self, payload: Dict[str, Any], parse: Callable[[Dict[str, Any]], T]) -> T:
+        """Uma chamada a /chat/completions; latência registrada por modelo (canceladas não contam)."""
+        model = payload["model"]
+        t0 = time.perf_counter()
+        try:
+            r = await self._client().post("/chat/completions", json=payload)
+            r.raise_for_status()
+            data = r.json()
+            _record_usage(model, data)
+            out = parse(data)
+        except asyncio.CancelledError:
+            metrics.incr(f"llm.cancelled.{model}")
+            raise
+        except Exception:
+            metrics.incr(f"llm.errors.{model}")
+            metrics.observe(f"llm.latency_ms.{model}", (time.perf_counter() - t0) * 1000)
+            raise
+        metrics.observe(f"llm.latency_ms.{model}", (time.perf_counter() - t0) * 1000)
+        return out
+
+    def _hedge_delay_s(self, model: str) -> float:
+        """Quanto esperar o primário antes de disparar o fallback (percentil observado do modelo)."""
+        s = self.settings
+        h = metrics.histogram(f"llm.latency_ms.{model}")
+        if h.count < s.litellm_hedge_min_samples:
+            return s.litellm_hedge_initial_delay_ms / 1000.0
+        return (h.percentile(s.litellm_hedge_percentile) or s.litellm_hedge_initial_delay_ms) / 1000.0
+
+    async def _complete(self, payload: Dict[str, Any], parse: Callable[[Dict[str, Any]], T]) -> T:
+        """Primário com fallback; com hedging ligado o fallback corre em paralelo após o atraso de hedge."""
+        s = self.settings
+        primary_payload = payload | {"model": s.litellm_model_primary}
+        fallback_payload = payload | {"model": s.litellm_model_fallback}
+        if not s.litellm_hedge_enabled:
+            try:
+                return await self._attempt(primary_payload, parse)
+            except Exception:
+                metrics.incr("llm.fallback_after_error")
+                return await self._attempt(fallback_payload, parse)
+
+        primary = asyncio.ensure_future(self._attempt(primary_payload, parse))
+        pending: set[asyncio.Future] = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=self._hedge_delay_s(s.litellm_model_primary))
+            if primary in done:
+                if primary.exception() is None:
+                    return primary.result()
+                metrics.incr("llm.fallback_after_error")
+                return await self._attempt(fallback_payload, parse)
+
+            metrics.incr("llm.hedge.fired")
+            hedge = asyncio.ensure_future(self._attempt(fallback_payload, parse))
+            pending = {primary, hedge}
+            error: BaseException | None = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is None:
+                        metrics.incr("llm.hedge.won_primary" if t is primary else "llm.hedge.won_fallback")
+                        return t.result()
+                    error = t.exception()
+            raise error  # type: ignore[misc]
+        finally:
+            for t in pending:
+                t.cancel()
+
+    def _base_payload(self) -> Dict[str, Any]:
+        return {
+            "temperature": self.settings.litellm_temperature,
+            "max_tokens": self.settings.litellm_max_tokens,
+        }
+
+    # ---------- API ----------
+    async def complete_json(self, system: str, user: str, schema: Type[BaseModel]) -> BaseModel:
+        payload = self._base_payload() | {
             "messages": [
                 {"role": "system", "content": system},
                 {"role": "user", "content": user},
             ],
             "response_format": {"type": "json_object"},
-            "temperature": self.settings.litellm_temperature,
-            "max_tokens": self.settings.litellm_max_tokens,
         }
-        try:
-            with self._client() as cli:
-                r = cli.post("/chat/completions", json=payload)
-                r.raise_for_status()
-                data = r.json()
-                content = data["choices"][0]["message"]["content"]
-                return schema.model_validate_json(content)
-        except Exception:
-            payload["model"] = self.settings.litellm_model_fallback
-            with self._client() as cli:
-                r = cli.post("/chat/completions", json=payload)
-                r.raise_for_status()
-                data = r.json()
-                content = data["choices"][0]["message"]["content"]
-                return schema.model_validate_json(content)
+        return await self._complete(
+            payload, lambda data: schema.model_validate_json(data["choices"][0]["message"]["content"])
+        )
 
-    def complete_with_tools_loop(self, *, system: str, user: str, tools_registry: ToolRegistry, max_steps: int = 4) -> Dict[str, Any]:
+    async def complete_with_tools_loop(self, *, system: str, user: str, tools_registry: ToolRegistry | None, max_steps: int = 4) -> Dict[str, Any]:
         """Executa um loop de tool-calling real (com execução de funções).
         Espera que o modelo finalize com uma mensagem `assistant` (sem tool_calls) contendo o texto final
         ou JSON com {"texto": "..."}.
@@ -54,35 +243,31 @@ class LLMClient:
             {"role": "system", "content": system},
             {"role": "user", "content": user},
         ]
-        model = self.settings.litellm_model_primary
-        tools = tools_registry.openai_tools()
+        tools = tools_registry.openai_tools() if tools_registry else []
         steps = 0
         while True:
-            payload = {
-                "model": model,
-                "messages": messages,
-                "tools": tools,
-                "tool_choice": "auto",
-                "temperature": self.settings.litellm_temperature,
-                "max_tokens": self.settings.litellm_max_tokens,
-            }
-            with self._client() as cli:
-                r = cli.post("/chat/completions", json=payload)
-                r.raise_for_status()
-                data = r.json()
-            msg = data["choices"][0]["message"]
+            supersede.check()
+            payload = self._base_payload() | {"messages": list(messages)}
+            if tools:
+                payload |= {"tools": tools, "tool_choice": "auto"}
+            msg = await self._complete(payload, lambda data: data["choices"][0]["message"])
             tool_calls = msg.get("tool_calls")
-            if tool_calls:
+            if tool_calls and tools_registry:
                 messages.append(msg)
-                for call in tool_calls:
-                    fname = call["function"]["name"]
-                    fargs = call["function"].get("arguments", "{}")
-                    # Executa tool e registra resposta
-                    tool_result_json = tools_registry.execute_json(fname, fargs)
+                # Tools síncronas (I/O de banco) fora do event loop; sem conflito entre si, em paralelo
+                batch = self._tools(tools_registry)
+                futs = [batch.submit(call["function"]["name"], call["function"].get("arguments") or "{}")
+                        for call in tool_calls]
+                try:
+                    results = await asyncio.gather(*futs)
+                except BaseException:
+                    batch.cancel()
+                    raise
+                for call, tool_result_json in zip(tool_calls, results):
                     messages.append({
                         "role": "tool",
                         "tool_call_id": call["id"],
-                        "name": fname,
+                        "name": call["function"]["name"],
                         "content": tool_result_json,
                     })
                 steps += 1
@@ -91,3 +276,198 @@ class LLMClient:
                     messages.append({"role": "system", "content": "Finalize a resposta ao cliente agora."})
                 continue
             return msg
+
+    # ---------- streaming ----------
+    async def _stream_attempt(self, payload: Dict[str, Any], on_text: Callable[[str], None] | None,
+                              tools_registry: ToolRegistry | None, progress: Dict[str, bool]) -> Dict[str, Any]:
+        """Um passo em streaming: mensagem ``assistant`` montada dos deltas + tools já iniciadas (``_started``).
+        ``progress["emitted"]`` fica True quando algum texto já saiu por ``on_text``; ``progress["tools_started"]``,
+        quando alguma tool já foi submetida (pode ter efeito, ex. item no carrinho)."""
+        model = payload["model"]
+        t0 = time.perf_counter()
+        content: List[str] = []
+        texto = TextoStream()
+        acc = ToolCallAccumulator()
+        started: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        batch = self._tools(tools_registry) if tools_registry is not None else None
+        first = True
+
+        def start(calls: List[Dict[str, Any]]) -> None:
+            for call in calls:
+                if batch is not None:
+                    progress["tools_started"] = True
+                    started.append((call, batch.submit(call["function"]["name"], call["function"]["arguments"] or "{}")))
+
+        try:
+            async with self._client().stream("POST", "/chat/completions", json=payload) as r:
+                r.raise_for_status()
+                async for chunk in iter_sse_data(r.aiter_lines()):
+                    if chunk.get("usage"):
+                        _record_usage(model, chunk)
+                    for choice in chunk.get("choices") or []:
+                        delta = choice.get("delta") or {}
+                        if first and (delta.get("content") or delta.get("tool_calls")):
+                            first = False
+                            ttft = (time.perf_counter() - t0) * 1000
+                            metrics.observe("llm.stream.ttft_ms", ttft)
+                            metrics.observe(f"llm.stream.ttft_ms.{model}", ttft)
+                        if delta.get("tool_calls"):
+                            start(acc.feed(delta["tool_calls"]))
+                        if delta.get("content"):
+                            content.append(delta["content"])
+                            new = texto.feed(delta["content"])
+                            if new and on_text is not None and not acc.calls:
+                                progress["emitted"] = True
+                                on_text(new)
+                start(acc.finish())
+        except BaseException as e:
+            if batch is not None:
+                batch.cancel()
+            if isinstance(e, asyncio.CancelledError):
+                metrics.incr(f"llm.cancelled.{model}")
+            else:
+                metrics.incr(f"llm.errors.{model}")
+            raise
+        metrics.observe(f"llm.latency_ms.{model}", (time.perf_counter() - t0) * 1000)
+        msg: Dict[str, Any] = {"role": "assistant", "content": "".join(content) or None}
+        if acc.calls:
+            msg["tool_calls"] = acc.calls
+        msg["_started"] = started
+        return msg
+
+    async def stream_with_tools_loop(self, *, system: str, user: str, tools_registry: ToolRegistry | None,
+                                     max_steps: int = 4, on_text: Callable[[str], None] | None = None) -> Dict[str, Any]:
+        """Como ``complete_with_tools_loop``, via SSE (``core/llm_stream.py``), sem hedging.
+
+        Cada tool roda assim que os argumentos dela fecham, em paralelo ao resto do stream; o fallback só entra
+        se o primário falhar antes de emitir texto ou iniciar tool. ``on_text`` recebe os pedaços do texto final conforme chegam (depois da 1ª tool call do passo, nada é emitido);
+        roda no event loop do cliente, então deve ser barato e não bloquear.
+        """
+        progress = {"emitted": False, "tools_started": False}
+        s = self.settings
+        messages = [
+            {"role": "system", "content": system},
+            {"role": "user", "content": user},
+        ]
+        tools = tools_registry.openai_tools() if tools_registry else []
+        steps = 0
+        while True:
+            supersede.check()
+            payload = self._base_payload() | {"messages": list(messages), "stream": True,
+                                              "stream_options": {"include_usage": True}}
+            if tools:
+                payload |= {"tools": tools, "tool_choice": "auto"}
+            progress["tools_started"] = False  # tools de passos anteriores já estão em ``messages``
+            try:
+                msg = await self._stream_attempt(payload | {"model": s.litellm_model_primary}, on_text, tools_registry,
+                                                 progress)
+            except Exception:
+                if progress["emitted"] or progress["tools_started"]:
+                    # texto parcial já saiu ou tool já rodou: repetir com outro modelo duplicaria resposta/efeitos
+                    raise
+                metrics.incr("llm.fallback_after_error")
+                msg = await self._stream_attempt(payload | {"model": s.litellm_model_fallback}, on_text, tools_registry,
+                                                 progress)
+            started = msg.pop("_started")
+            if msg.get("tool_calls") and tools_registry:
+                messages.append(msg)
+                for call, fut in started:
+                    messages.append({
+                        "role": "tool",
+                        "tool_call_id": call["id"],
+                        "name": call["function"]["name"],
+                        "content": await fut,
+                    })
+                steps += 1
+                if steps >= max_steps:
+                    messages.append({"role": "system", "content": "Finalize a resposta ao cliente agora."})
+                continue
+            return msg
+
+class LLMClient:
+    """Fachada síncrona do gateway LiteLLM (API original) sobre ``AsyncLLMClient``.
+    Suporta: complete_json(), complete_with_tools_loop() e stream_with_tools_loop(), mais as versões ``a*``.
+
+    As corrotinas rodam num event loop dedicado em thread própria (seguro para vários workers); dentro de um
+    turno ``supersedable`` a chamada em voo é cancelada quando o turno é superado.
+    """
+    def __init__(self, settings: Settings | None = None):
+        self.settings = settings or di[Settings]
+        self.aio = AsyncLLMClient(self.settings)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name="llm-loop", daemon=True).start()
+                    self._loop = loop
+        return self._loop
+
+    def _submit(self, coro: Awaitable[T]) -> Tuple["Future[T]", Callable[[], None]]:
+        """Agenda a corrotina no loop dedicado (contextvars do chamador são propagados). Dentro de um turno
+        ``supersedable``, o cancelamento do turno cancela a corrotina em voo; devolve o future e o desregistro."""
+        token = supersede.current()
+        if token is not None and token.cancelled:
+            coro.close()  # type: ignore[attr-defined]
+            token.check()
+        fut = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        return fut, token.on_cancel(fut.cancel) if token is not None else (lambda: None)
+
+    def _run(self, coro: Awaitable[T]) -> T:
+        fut, undo = self._submit(coro)
+        try:
+            return fut.result()
+        except CancelledError:
+            supersede.check()
+            raise
+        finally:
+            undo()
+
+    async def _arun(self, coro: Awaitable[T]) -> T:
+        """Como ``_run``, aguardando sem bloquear o event loop do chamador (app ASGI)."""
+        fut, undo = self._submit(coro)
+        try:
+            return await asyncio.wrap_future(fut)
+        except asyncio.CancelledError:
+            if fut.cancelled():
+                supersede.check()
+            raise
+        finally:
+            undo()
+
+    def complete_json(self, system: str, user: str, schema: Type[BaseModel]) -> BaseModel:
+        return self._run(self.aio.complete_json(system, user, schema))
+
+    def complete_with_tools_loop(self, *, system: str, user: str, tools_registry: ToolRegistry | None, max_steps: int = 4) -> Dict[str, Any]:
+        return self._run(self.aio.complete_with_tools_loop(
+            system=system, user=user, tools_registry=tools_registry, max_steps=max_steps))
+
+    def stream_with_tools_loop(self, *, system: str, user: str, tools_registry: ToolRegistry | None, max_steps: int = 4,
+                               on_text: Callable[[str], None] | None = None) -> Dict[str, Any]:
+        return self._run(self.aio.stream_with_tools_loop(
+            system=system, user=user, tools_registry=tools_registry, max_steps=max_steps, on_text=on_text))
+
+    # Versões ``a*``: mesmas chamadas para código asyncio (``api/asgi.py``); o HTTP segue no loop dedicado.
+    async def acomplete_json(self, system: str, user: str, schema: Type[BaseModel]) -> BaseModel:
+        return await self._arun(self.aio.complete_json(system, user, schema))
+
+    async def acomplete_with_tools_loop(self, *, system: str, user: str, tools_registry: ToolRegistry | None,
+                                        max_steps: int = 4) -> Dict[str, Any]:
+        return await self._arun(self.aio.complete_with_tools_loop(
+            system=system, user=user, tools_registry=tools_registry, max_steps=max_steps))
+
+    async def astream_with_tools_loop(self, *, system: str, user: str, tools_registry: ToolRegistry | None,
+                                      max_steps: int = 4, on_text: Callable[[str], None] | None = None) -> Dict[str, Any]:
+        return await self._arun(self.aio.stream_with_tools_loop(
+            system=system, user=user, tools_registry=tools_registry, max_steps=max_steps, on_text=on_text))
+
+    def close(self) -> None:
+        """Fecha o pool HTTP e encerra o loop dedicado."""
+        if self._loop is not None:
+            self._run(self.aio.aclose())
+            self._run(self._loop.shutdown_asyncgens())  # geradores SSE ainda não finalizados
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
@@ -0,0 +1,158 @@
+
+"""Peças do modo streaming do LLM (SSE do LiteLLM), sem I/O.
+
+- ``iter_sse_data``: linhas ``data: ...`` de um corpo SSE → payloads JSON (para em ``[DONE]``).
+- ``ToolCallAccumulator``: junta os deltas de ``tool_calls`` por ``index`` e informa quando os argumentos de
+  uma chamada fecham (JSON válido ou início da chamada seguinte) — a tool pode rodar antes do fim do stream.
+- ``TextoStream``: parser incremental do conteúdo ``{"texto": "..."}``: devolve o texto decodificado conforme
+  chega (escapes ``\\n``/``\\uXXXX`` partidos entre chunks aguardam o resto); conteúdo que não começa com
+  ``{`` é texto puro e passa direto.
+- ``EarlyFlush``: com o texto já acima de ``min_chars``, entrega uma vez o trecho até o último parágrafo (ou
+  frase) completo; o restante vai na mensagem final (``remainder``).
+"""
+from __future__ import annotations
+import json, re
+from typing import Any, AsyncIterator, Callable, Dict, List
+
+_TEXTO_KEY = re.compile(r'"texto"\s*:\s*"')
+_SENTENCE_END = re.compile(r"[.!?…](?=\s)")
+
+async def iter_sse_data(lines: AsyncIterator[str]) -> AsyncIterator[Dict[str, Any]]:
+    """Payloads JSON de um stream SSE (``data: {...}``); ignora comentários/keep-alive. Fecha ``lines`` ao sair."""
+    try:
+        async for line in lines:
+            if not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            if data:
+                yield json.loads(data)
+    finally:
+        aclose = getattr(lines, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+class ToolCallAccumulator:
+    """Deltas de ``tool_calls`` → chamadas completas (formato da mensagem ``assistant`` não-streaming)."""
+    def __init__(self):
+        self.calls: List[Dict[str, Any]] = []
+        self._ready: set[int] = set()
+
+    def feed(self, deltas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Aplica os deltas; retorna as chamadas que acabaram de ficar completas."""
+        out = []
+        for d in deltas:
+            i = d.get("index", len(self.calls) - 1 if self.calls else 0)
+            while len(self.calls) <= i:
+                self.calls.append({"id": "", "type": "function", "function": {"name": "", "arguments": ""}})
+                prev = len(self.calls) - 2
+                if prev >= 0 and prev not in self._ready:  # começou a próxima: a anterior fechou
+                    self._ready.add(prev)
+                    out.append(self.calls[prev])
+            call = self.calls[i]
+            call["id"] = d.get("id") or call["id"]
+            fn = d.get("function") or {}
+            call["function"]["name"] += fn.get("name") or ""
+            call["function"]["arguments"] += fn.get("arguments") or ""
+            if i not in self._ready and self._complete(call):
+                self._ready.add(i)
+                out.append(call)
+        return out
+
+    def finish(self) -> List[Dict[str, Any]]:
+        """Fim do stream: as chamadas que ainda não fecharam."""
+        out = [c for i, c in enumerate(self.calls) if i not in self._ready]
+        self._ready.update(range(len(self.calls)))
+        return out
+
+    @staticmethod
+    def _complete(call: Dict[str, Any]) -> bool:
+        args = call["function"]["arguments"].strip()
+        if not (call["function"]["name"] and args.endswith("}")):
+            return False
+        try:
+            json.loads(args)
+            return True
+        except ValueError:
+            return False
+
+class TextoStream:
+    """Parser incremental do valor de ``"texto"`` (ver docstring do módulo)."""
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0
+        self._state = "start"  # start | raw | seek | in | done
+        self.text = ""
+
+    def feed(self, chunk: str) -> str:
+        """Acrescenta ``chunk`` ao conteúdo; retorna o texto novo decodificado."""
+        self._buf += chunk
+        if self._state == "start":
+            head = self._buf.lstrip()
+            if not head:
+                return ""
+            self._state = "seek" if head.startswith("{") else "raw"
+        if self._state == "raw":
+            new, self._pos = self._buf[self._pos:], len(self._buf)
+            self.text += new
+            return new
+        if self._state == "seek":
+            m = _TEXTO_KEY.search(self._buf, self._pos)
+            if not m:
+                return ""
+            self._pos, self._state = m.end(), "in"
+        if self._state != "in":
+            return ""
+        buf, i = self._buf, self._pos
+        while i < len(buf):
+            c = buf[i]
+            if c == '"':
+                self._state = "done"
+                break
+            if c == "\\":
+                if i + 1 >= len(buf):
+                    break
+                if buf[i + 1] != "u":
+                    i += 2
+                    continue
+                if i + 6 > len(buf):
+                    break
+                if 0xD800 <= int(buf[i + 2:i + 6], 16) <= 0xDBFF:  # surrogate alto: precisa do par
+                    if i + 12 > len(buf):
+                        break
+                    i += 12
+                else:
+                    i += 6
+                continue
+            i += 1
+        new = json.loads(f'"{buf[self._pos:i]}"') if i > self._pos else ""
+        self._pos = i
+        self.text += new
+        return new
+
+class EarlyFlush:
+    """Entrega antecipada do primeiro trecho completo de respostas longas (ver docstring do módulo)."""
+    def __init__(self, deliver: Callable[[str], None], min_chars: int = 280):
+        self.deliver = deliver
+        self.min_chars = min_chars
+        self.text = ""
+        self.sent = 0  # caracteres de ``text`` já entregues
+
+    def feed(self, delta: str) -> None:
+        self.text += delta
+        if self.sent or len(self.text) < self.min_chars:
+            return
+        cut = self.text.rfind("\n\n")
+        if cut <= 0:
+            ends = list(_SENTENCE_END.finditer(self.text))
+            cut = ends[-1].end() if ends else 0
+        if cut > 0 and self.text[:cut].strip():
+            self.sent = cut
+            self.deliver(self.text[:cut].strip())
+
+    def remainder(self, final_text: str) -> str:
+        """Texto final sem o trecho já entregue."""
+        if self.sent and final_text.startswith(self.text[:self.sent]):
+            return final_text[self.sent:].strip()
+        return final_text
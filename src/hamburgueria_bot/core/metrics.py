@@ -0,0 +1,112 @@
+
+"""Métricas em memória: contadores, gauges e histogramas de latência (thread-safe).
+
+- Sem dependências externas; agregadas por nome (ex.: "turn_worker.turn-0.latency_ms").
+- Expostas em JSON via ``GET /admin/metrics`` (ver ``api/app.py``).
+- Percentis estimados por interpolação linear dentro de buckets fixos.
+"""
+from __future__ import annotations
+import bisect, threading, time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Tuple
+
+BUCKETS_MS: Tuple[float, ...] = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+class Histogram:
+    """Histograma de latência (ms) com buckets fixos."""
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float) -> None:
+        i = bisect.bisect_left(self.buckets, ms)
+        with self._lock:
+            self._counts[i] += 1
+            self.count += 1
+            self.sum_ms += ms
+            if ms > self.max_ms:
+                self.max_ms = ms
+
+    def percentile(self, q: float) -> float | None:
+        """Estimativa do quantil ``q`` (0..1). Retorna None sem amostras."""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            cum = 0
+            for i, c in enumerate(self._counts):
+                if c and cum + c >= rank:
+                    lo = self.buckets[i - 1] if i > 0 else 0.0
+                    hi = self.buckets[i] if i < len(self.buckets) else self.max_ms
+                    return min(lo + (hi - lo) * ((rank - cum) / c), self.max_ms)
+                cum += c
+            return self.max_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.sum_ms / self.count, 2) if self.count else None,
+            "p50_ms": _round(self.percentile(0.50)),
+            "p95_ms": _round(self.percentile(0.95)),
+            "p99_ms": _round(self.percentile(0.99)),
+            "max_ms": round(self.max_ms, 2),
+        }
+
+def _round(v: float | None) -> float | None:
+    return round(v, 2) if v is not None else None
+
+class Metrics:
+    """Registro de métricas nomeadas do processo."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._hists: Dict[str, Histogram] = {}
+
+    def incr(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def counter(self, name: str) -> float:
+        return self._counters.get(name, 0)
+
+    def gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def histogram(self, name: str) -> Histogram:
+        h = self._hists.get(name)
+        if h is None:
+            with self._lock:
+                h = self._hists.setdefault(name, Histogram())
+        return h
+
+    def observe(self, name: str, ms: float) -> None:
+        self.histogram(name).observe(ms)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """Mede o bloco e registra em ``name`` (ms), mesmo se houver exceção."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - t0) * 1000)
+
+    def snapshot(self, prefix: str = "") -> Dict[str, Any]:
+        """Retorna cópia serializável (opcionalmente filtrada por prefixo)."""
+        with self._lock:
+            counters = {k: v for k, v in self._counters.items() if k.startswith(prefix)}
+            gauges = {k: v for k, v in self._gauges.items() if k.startswith(prefix)}
+            hists = {k: h for k, h in self._hists.items() if k.startswith(prefix)}
+        return {
+            "counters": counters,
+            "gauges": gauges,
+            "histograms": {k: h.snapshot() for k, h in hists.items()},
+        }
+
+metrics = Metrics()
@@ -4,11 +4,21 @@
 - Router conhece agentes, objetivos e ferramentas.
 - Agentes recebem objetivos, contexto, política e EXEMPLOS (few-shot) específicos.
 - Totalmente orientado a prompt, sem respostas hardcoded.
+- Templates fatiados em segmentos estáticos (persona, políticas, inventário de agentes, catálogo,
+  few-shots) e dinâmicos (contexto, últimas mensagens): cada segmento é compilado uma única vez e os
+  estáticos são renderizados uma vez por agente/versão de catálogo (memo). Por turno, só o dinâmico.
+- Catálogo grande: ``contexto["catalog_text"]`` traz só o resumo estável e ``contexto["catalog_relevant"]``
+  os itens do turno (``core/catalog_prompt.py``), renderizados num segmento dinâmico próprio.
+- ``layout="cache"``: todo o conteúdo estático primeiro, em ordem estável byte a byte, e o volátil
+  (contexto/snapshot, últimas mensagens) por último — prefixo comum longo entre turnos, o que permite
+  o cache de prefixo do gateway/provedor. ``layout="classic"`` mantém a ordem original.
+- ``PromptBuilder.version``: hash dos textos fixos e das opções do builder (chave do cache de respostas).
 """
 from __future__ import annotations
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional
-from jinja2 import Environment, BaseLoader, StrictUndefined
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+from jinja2 import Environment, BaseLoader, StrictUndefined, Template
 
 # -------- Personas --------
 PERSONAS = {
@@ -32,31 +42,14 @@ POLITICAS_PADRAO = (
     "- Siga a preferência do cliente em customizações.\n"
 )
 
-@dataclass
-class PromptBuilder:
-    loja_nome: str = "ADK Burger"
-    persona_chave: str = "padrão"
-    estilo_chave: str = "neutro"
-    politicas_extra: str = ""
-    janela_coalescencia_ms: int = 1200
-    env: Environment = field(default_factory=lambda: Environment(
-        loader=BaseLoader(),
-        undefined=StrictUndefined,
-        trim_blocks=True,
-        lstrip_blocks=True,
-    ))
-
-    # ---------- Utils ----------
-    def _persona(self) -> str:
-        return PERSONAS.get(self.persona_chave, PERSONAS["padrão"])
-
-    def _estilo(self) -> str:
-        return ESTILOS.get(self.estilo_chave, ESTILOS["neutro"])
+DEFAULT_TOOL_POLICY = (
+    "Política de ferramentas: Use ferramentas para ler cardápio, consultar/alterar carrinho, "
+    "e validar preços antes de afirmar valores. Faça no máximo 2 chamadas por resposta. "
+    "Se uma tool falhar, explique brevemente e siga com alternativa."
+)
 
-    # ---------- Router System ----------
-    def router_system(self, *, contexto: Dict[str, Any], agentes: List[Dict[str, Any]], conversa: Dict[str, Any] | None = None) -> str:
-        """Prompt do Roteador com agentes + ferramentas e últimas mensagens."""
-        template = self.env.from_string("""
+# -------- Segmentos do prompt do Roteador (na ordem de montagem) --------
+ROUTER_HEAD = """
         Você é o **ROTEADOR RAIZ** de {{ loja_nome }}.
         Persona: {{ persona }}
         Políticas:
@@ -66,27 +59,36 @@ class PromptBuilder:
         {% endif %}
         Janela de coalescência: {{ janela_coalescencia_ms }} ms.
 
-        CONTEXTO (resumo):
+"""
+ROUTER_CONTEXTO = """        CONTEXTO (resumo):
         - memory_summary: {{ contexto.memory_summary | default('') }}
         - snapshot: {{ contexto.snapshot | default({}) }}
 
-        AGENTES DISPONÍVEIS:
+"""
+ROUTER_AGENTES = """        AGENTES DISPONÍVEIS:
         {% for a in agentes %}
         - {{ a.nome }} → {{ a.objetivo }}
           Tools: {% if a.tools %}{% for t in a.tools %}{{ t.name }}{% if not loop.last %}, {% endif %}{% endfor %}{% else %}(sem tools){% endif %}
         {% endfor %}
 
-        CATÁLOGO (resumo):
+"""
+ROUTER_CATALOGO = """        CATÁLOGO (resumo):
             {{ catalog_text | default('') }}
 
-            ÚLTIMAS MENSAGENS (cliente → bot):
+"""
+ROUTER_CATALOGO_RELEVANTE = """        ITENS RELEVANTES PARA ESTA MENSAGEM (demais itens: resumo por categoria acima; tool search_catalog):
+            {{ catalog_relevant }}
+
+"""
+ROUTER_ULTIMAS = """            ÚLTIMAS MENSAGENS (cliente → bot):
         {% if conversa and conversa.ultimas %}
         {% for m in conversa.ultimas %}- {{ m }}
         {% endfor %}
         {% else %}- (não disponível)
         {% endif %}
 
-        TAREFA:
+"""
+ROUTER_TAREFA = """        TAREFA:
         1) Escolha o MELHOR agente para atender a mensagem atual do cliente, considerando o histórico acima.
         2) Quando houver dúvida entre dois agentes, prefira aquele que consegue agir com menos perguntas.
         3) Retorne preferencialmente **JSON** no schema:
@@ -94,32 +96,10 @@ class PromptBuilder:
            Caso não consiga JSON, retorne somente o nome do agente.
 
         Estilo de escrita: {{ estilo }}
-        """)
-        return template.render(
-            loja_nome=self.loja_nome,
-            persona=self._persona(),
-            politicas_global=POLITICAS_PADRAO,
-            politicas_extra=self.politicas_extra,
-            janela_coalescencia_ms=self.janela_coalescencia_ms,
-            contexto=contexto,
-            agentes=agentes,
-            conversa=conversa or {},
-            estilo=self._estilo(),
-        )
+        """
 
-    # ---------- Agent System ----------
-    def agent_system(
-        self,
-        *,
-        nome: str,
-        objetivo: str,
-        ferramentas: List[Dict[str, str]],
-        contexto: Dict[str, Any],
-        exemplos: Optional[List[Dict[str, Any]]] = None,
-        tool_policy: str | None = None,
-    ) -> str:
-        """Prompt de sistema para agentes orientados a objetivo + tools + exemplos."""
-        template = self.env.from_string("""
+# -------- Segmentos do prompt de Agente --------
+AGENT_HEAD = """
         Você é o **Agente {{ nome }}** de {{ loja_nome }}.
         Persona: {{ persona }}
         Objetivo principal: {{ objetivo }}
@@ -135,11 +115,13 @@ class PromptBuilder:
 
         {{ tool_policy or default_tool_policy }}
 
-        CONTEXTO:
+"""
+AGENT_CONTEXTO = """        CONTEXTO:
         - memory_summary: {{ contexto.memory_summary | default('') }}
         - snapshot: {{ contexto.snapshot | default({}) }}
 
-        {% if exemplos %}
+"""
+AGENT_TAIL = """        {% if exemplos %}
         DEMONSTRAÇÕES (few-shot):
         {% for ex in exemplos %}
         - Cliente: {{ ex.user }}
@@ -158,23 +140,139 @@ class PromptBuilder:
         - Se não for possível JSON, retorne apenas o texto final.
 
         Estilo: {{ estilo }}
-        """)
-        default_tool_policy = (
-            "Política de ferramentas: Use ferramentas para ler cardápio, consultar/alterar carrinho, "
-            "e validar preços antes de afirmar valores. Faça no máximo 2 chamadas por resposta. "
-            "Se uma tool falhar, explique brevemente e siga com alternativa."
-        )
-        return template.render(
-            loja_nome=self.loja_nome,
-            persona=self._persona(),
-            politicas_global=POLITICAS_PADRAO,
-            politicas_extra=self.politicas_extra,
-            ferramentas=[{"nome": f["name"], "descricao": f.get("description","") } for f in ferramentas],
-            contexto=contexto,
-            objetivo=objetivo,
-            nome=nome,
-            exemplos=exemplos,
-            estilo=self._estilo(),
-            tool_policy=tool_policy,
-            default_tool_policy=default_tool_policy,
-        )
+        """
+
+# -------- Resumo incremental da conversa (memory_summary, fora do caminho da requisição) --------
+SUMMARY_SYSTEM = """
+        Você mantém a MEMÓRIA de uma conversa de atendimento de {{ loja_nome }} no WhatsApp.
+        Recebe o resumo anterior e as mensagens novas (cliente/bot) e devolve o resumo ATUALIZADO.
+        Preserve: preferências e restrições do cliente, itens pedidos/trocados/recusados, endereço e forma de
+        pagamento citados, pendências e promessas do atendimento. Descarte saudações, repetições e valores que
+        as ferramentas recalculam (carrinho, subtotal).
+        No máximo {{ max_palavras }} palavras, em PT-BR, terceira pessoa.
+        Retorne **JSON**: {"resumo": "..."}
+        """
+
+# -------- Variantes do layout "cache" (estático primeiro, volátil no fim) --------
+ROUTER_TAREFA_CACHE = ROUTER_TAREFA.replace("histórico acima", "histórico abaixo").rstrip() + "\n\n"
+AGENT_TAIL_CACHE = AGENT_TAIL.rstrip() + "\n\n"
+
+LAYOUTS = ("classic", "cache")
+STATIC_CACHE_MAX = 512  # segmentos estáticos memoizados (agentes x versões de catálogo)
+
+@dataclass
+class PromptBuilder:
+    loja_nome: str = "ADK Burger"
+    persona_chave: str = "padrão"
+    estilo_chave: str = "neutro"
+    politicas_extra: str = ""
+    janela_coalescencia_ms: int = 1200
+    layout: str = "classic"  # classic | cache (ver LAYOUTS)
+    env: Environment = field(default_factory=lambda: Environment(
+        loader=BaseLoader(),
+        undefined=StrictUndefined,
+        trim_blocks=True,
+        lstrip_blocks=True,
+        keep_trailing_newline=True,  # segmentos terminam em quebra de linha; concatenação exata
+    ))
+    _compiled: Dict[str, Template] = field(default_factory=dict, init=False, repr=False)
+    _static: Dict[Tuple, str] = field(default_factory=dict, init=False, repr=False)
+    _version: str | None = field(default=None, init=False, repr=False)
+
+    @property
+    def version(self) -> str:
+        """Muda quando qualquer template/persona/política ou opção do builder muda (``core/llm_cache.py``)."""
+        if self._version is None:
+            fixed = sorted((k, repr(v)) for k, v in globals().items()
+                           if k.isupper() and isinstance(v, (str, dict, tuple)))
+            opts = (self.loja_nome, self.persona_chave, self.estilo_chave, self.politicas_extra,
+                    self.janela_coalescencia_ms, self.layout)
+            self._version = hashlib.sha256(repr((fixed, opts)).encode()).hexdigest()[:12]
+        return self._version
+
+    # ---------- Utils ----------
+    def _persona(self) -> str:
+        return PERSONAS.get(self.persona_chave, PERSONAS["padrão"])
+
+    def _estilo(self) -> str:
+        return ESTILOS.get(self.estilo_chave, ESTILOS["neutro"])
+
+    def _tpl(self, src: str) -> Template:
+        """Compila o segmento uma única vez (chaveado pelo próprio fonte)."""
+        tpl = self._compiled.get(src)
+        if tpl is None:
+            tpl = self._compiled[src] = self.env.from_string(src)
+        return tpl
+
+    def _base_vars(self) -> Dict[str, Any]:
+        return {
+            "loja_nome": self.loja_nome,
+            "persona": self._persona(),
+            "politicas_global": POLITICAS_PADRAO,
+            "politicas_extra": self.politicas_extra,
+            "janela_coalescencia_ms": self.janela_coalescencia_ms,
+            "estilo": self._estilo(),
+        }
+
+    def _render_static(self, src: str, key: Tuple, **variables: Any) -> str:
+        """Renderiza um segmento estático uma vez por chave (agente, versão de catálogo, ...) e memoiza."""
+        full_key = (src, self.loja_nome, self.persona_chave, self.estilo_chave, self.politicas_extra,
+                    self.janela_coalescencia_ms, key)
+        out = self._static.get(full_key)
+        if out is None:
+            if len(self._static) >= STATIC_CACHE_MAX:
+                self._static.clear()
+            out = self._static[full_key] = self._tpl(src).render(**self._base_vars(), **variables)
+        return out
+
+    def _render_dynamic(self, src: str, **variables: Any) -> str:
+        return self._tpl(src).render(**variables)
+
+    # ---------- Router System ----------
+    def router_system(self, *, contexto: Dict[str, Any], agentes: List[Dict[str, Any]], conversa: Dict[str, Any] | None = None) -> str:
+        """Prompt do Roteador com agentes + ferramentas, catálogo (``contexto["catalog_text"]`` e, se houver,
+        ``contexto["catalog_relevant"]``) e últimas mensagens."""
+        catalog_text = contexto.get("catalog_text", "")
+        catalog_relevant = contexto.get("catalog_relevant", "")
+        agentes_key = tuple((a["nome"], a["objetivo"], tuple(t["name"] for t in a.get("tools", []))) for a in agentes)
+        head = self._render_static(ROUTER_HEAD, ())
+        agentes_txt = self._render_static(ROUTER_AGENTES, agentes_key, agentes=agentes)
+        catalogo = self._render_static(ROUTER_CATALOGO, (catalog_text,), catalog_text=catalog_text)
+        ctx = self._render_dynamic(ROUTER_CONTEXTO, contexto=contexto)
+        ultimas = self._render_dynamic(ROUTER_ULTIMAS, conversa=conversa or {})
+        relevantes = (self._render_dynamic(ROUTER_CATALOGO_RELEVANTE, catalog_relevant=catalog_relevant)
+                      if catalog_relevant else "")
+        if self.layout == "cache":
+            return "".join((head, agentes_txt, catalogo, self._render_static(ROUTER_TAREFA_CACHE, ()), relevantes, ctx,
+                            ultimas))
+        return "".join((head, ctx, agentes_txt, catalogo, relevantes, ultimas, self._render_static(ROUTER_TAREFA, ())))
+
+    # ---------- Resumo da conversa ----------
+    def summary_system(self, *, max_palavras: int = 120) -> str:
+        """Prompt de sistema do resumo incremental (``tasks/memory_summarizer.py``)."""
+        return self._render_static(SUMMARY_SYSTEM, (max_palavras,), max_palavras=max_palavras)
+
+    # ---------- Agent System ----------
+    def agent_system(
+        self,
+        *,
+        nome: str,
+        objetivo: str,
+        ferramentas: List[Dict[str, str]],
+        contexto: Dict[str, Any],
+        exemplos: Optional[List[Dict[str, Any]]] = None,
+        tool_policy: str | None = None,
+    ) -> str:
+        """Prompt de sistema para agentes orientados a objetivo + tools + exemplos.
+
+        ``ferramentas`` aceita ``{"name", "description"}`` ou o formato OpenAI (``{"function": {...}}``).
+        """
+        fns = [f.get("function", f) for f in ferramentas]
+        tools = [{"nome": f["name"], "descricao": f.get("description", "")} for f in fns]
+        head_key = (nome, objetivo, tool_policy, tuple((t["nome"], t["descricao"]) for t in tools))
+        head = self._render_static(AGENT_HEAD, head_key, nome=nome, objetivo=objetivo, ferramentas=tools,
+                                   tool_policy=tool_policy, default_tool_policy=DEFAULT_TOOL_POLICY)
+        ctx = self._render_dynamic(AGENT_CONTEXTO, contexto=contexto)
+        if self.layout == "cache":
+            return "".join((head, self._render_static(AGENT_TAIL_CACHE, (nome, repr(exemplos)), exemplos=exemplos), ctx))
+        return "".join((head, ctx, self._render_static(AGENT_TAIL, (nome, repr(exemplos)), exemplos=exemplos)))
@@ -0,0 +1,35 @@
+
+"""Token bucket assíncrono (limite de taxa de envio, ex.: Graph API do WhatsApp)."""
+from __future__ import annotations
+import asyncio, time
+
+class TokenBucket:
+    """``rate`` fichas/s, acumulando até ``burst``. ``acquire`` espera a próxima ficha (FIFO via lock)."""
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock: asyncio.Lock | None = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> float:
+        """Consome uma ficha; retorna quanto tempo (s) esperou. ``rate <= 0`` desliga o limite."""
+        if self.rate <= 0:
+            return 0.0
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        waited = 0.0
+        async with self._lock:
+            self._refill()
+            if self._tokens < 1:
+                delay = (1 - self._tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited = delay
+                self._refill()
+            self._tokens -= 1
+        return waited
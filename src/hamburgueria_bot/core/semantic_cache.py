@@ -0,0 +1,171 @@
+
+"""Cache semântico de respostas de agentes read-only: paráfrases ("tem duplo bacon?", "vcs tem bacon duplo")
+reaproveitam a resposta já gerada, onde o cache exato (``core/llm_cache.py``) erra.
+
+- Assinatura: item do catálogo mais provável da pergunta (``Catalog.search`` top-1) + números citados. Hit só
+  com a mesma assinatura: "tem x-salada?" nunca responde "tem duplo bacon?", por mais parecidos que sejam.
+- Vetor: esqueleto da pergunta — palavras do item trocadas por ``ITEM``, stopwords fora e sinônimos de
+  preço/disponibilidade unificados (``_CANON``) — em n-gramas hasheados (``core.text.hashed_features``),
+  denso ``float32``; vizinho mais próximo por produto interno (= cosseno) numa matriz NumPy por balde.
+- Baldes por (agente, modelo, versão dos prompts, versão do catálogo); trocar o catálogo descarta os baldes da
+  versão anterior. Capacidade por balde (a entrada mais antiga sai primeiro) e TTL.
+- Só agentes com ``semantic_cache=True`` (respondem do catálogo, sem depender do contexto da conversa), só
+  turnos em que todas as tools chamadas são read-only e nunca mensagens com verbo de pedido ("quero", "adiciona"...,
+  ``cacheable``): essas podem levar a escrita no carrinho.
+- NumPy é opcional (``pip install -e .[semantic]``); sem ele o cache fica desligado (``available()``).
+- Métricas: ``llm.semcache.hit|miss|put`` (e ``.<tipo>``), ``llm.semcache.lookup_ms``, gauge ``llm.semcache.hit_ratio``.
+Avaliação offline (hit rate, falsos hits, latência economizada): ``scripts/report_semantic_cache.py``.
+"""
+from __future__ import annotations
+import re, threading, time, zlib
+from typing import Any, Dict, List, Tuple
+from kink import di
+from .catalog import Catalog
+from .metrics import metrics
+from .settings import Settings
+from .text import fold, hashed_features
+
+DEFAULT_DIM = 1024
+_STOP = frozenset("o a os as de do da dos das e um uma uns umas vc vcs voce voces ai la ta me eu por favor pf pfv "
+                  "qual quais ola oi moco moca amigo".split())
+_CANON = {w: "preco" for w in ("quanto", "qto", "qnto", "quantos", "valor", "custa", "custo", "sai")}
+_CANON |= {w: "tem" for w in ("teria", "tem", "tinha", "vende", "vendem", "possui", "rola", "existe")}
+_NUMBER = re.compile(r"\d+")
+_ACTION = frozenset("quero queria qro adiciona adicione coloca coloque bota bote manda mande pede pedir poe tira tire "
+                    "remove remova troca troque muda mude fecha fechar finaliza finalizar".split())
+
+def cacheable(texto: str) -> bool:
+    """Mensagem de consulta (sem verbo de pedido/alteração)."""
+    return not _ACTION.intersection(fold(texto).split())
+
+def available() -> bool:
+    try:
+        import numpy  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+class _Bucket:
+    """Vetores (linhas de uma matriz com capacidade que dobra) + assinatura, validade e valor por linha."""
+    def __init__(self, np: Any, dim: int, max_entries: int):
+        self.np = np
+        self.max_entries = max_entries
+        self.vecs = np.zeros((16, dim), dtype=np.float32)
+        self.sigs = np.zeros(16, dtype=np.int64)
+        self.expires = np.zeros(16, dtype=np.float64)
+        self.values: List[Dict[str, Any] | None] = [None] * 16
+        self.n = 0
+        self.next = 0  # próxima linha a sobrescrever quando cheio
+
+    def add(self, vec: Any, sig: int, expires: float, value: Dict[str, Any]) -> None:
+        np = self.np
+        if self.n < self.max_entries and self.n == len(self.vecs):
+            cap = min(self.max_entries, len(self.vecs) * 2)
+            self.vecs = np.vstack([self.vecs, np.zeros((cap - len(self.vecs), self.vecs.shape[1]), np.float32)])
+            self.sigs = np.concatenate([self.sigs, np.zeros(cap - len(self.sigs), np.int64)])
+            self.expires = np.concatenate([self.expires, np.zeros(cap - len(self.expires))])
+            self.values += [None] * (cap - len(self.values))
+        if self.n < self.max_entries:
+            i = self.n
+            self.n += 1
+        else:
+            i = self.next
+            self.next = (self.next + 1) % self.max_entries
+        self.vecs[i], self.sigs[i], self.expires[i], self.values[i] = vec, sig, expires, value
+
+    def nearest(self, vec: Any, sig: int, now: float) -> Tuple[int, float]:
+        if not self.n:
+            return -1, 0.0
+        np = self.np
+        sims = self.vecs[:self.n] @ vec
+        sims[(self.sigs[:self.n] != sig) | (self.expires[:self.n] <= now)] = -1.0
+        i = int(np.argmax(sims))
+        return i, float(sims[i])
+
+class SemanticCache:
+    """Índice de pares pergunta → resposta por balde (ver docstring do módulo)."""
+    def __init__(self, threshold: float = 0.8, max_entries: int = 5000, ttl_s: float = 3600.0,
+                 dim: int = DEFAULT_DIM, settings: Settings | None = None):
+        import numpy as np
+        self.np = np
+        self.settings = settings or di[Settings]
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.dim = dim
+        self._buckets: Dict[Tuple, _Bucket] = {}
+        self._lock = threading.Lock()
+
+    # ---------- representação ----------
+    @staticmethod
+    def _catalog() -> Catalog | None:
+        return di[Catalog] if Catalog in di else None
+
+    def signature(self, texto: str) -> Tuple[str, Tuple[str, ...], frozenset]:
+        """(sku do item mais provável ou "", números citados, palavras do nome do item)."""
+        cat = self._catalog()
+        top = cat.search(texto, 1) if cat is not None else []
+        name = frozenset(fold(top[0]["name"]).split()) if top else frozenset()
+        return (top[0]["sku"] if top else ""), tuple(_NUMBER.findall(texto)), name
+
+    def skeleton(self, texto: str, item_words: frozenset = frozenset()) -> str:
+        out: List[str] = []
+        for w in fold(texto).split():
+            if w in _STOP:
+                continue
+            w = "ITEM" if w in item_words else _CANON.get(w, w)
+            if not (w == "ITEM" and out and out[-1] == "ITEM"):
+                out.append(w)
+        return " ".join(out)
+
+    def vector(self, skeleton: str) -> Any:
+        vec = self.np.zeros(self.dim, dtype=self.np.float32)
+        for i, w in hashed_features(skeleton, self.dim).items():
+            vec[i] = w
+        return vec
+
+    def _prepare(self, texto: str) -> Tuple[Any, int]:
+        sku, nums, words = self.signature(texto)
+        return self.vector(self.skeleton(texto, words)), zlib.crc32(f"{sku}|{','.join(nums)}".encode())
+
+    def _bucket_key(self, kind: str, prompt_version: str) -> Tuple:
+        cat = self._catalog()
+        return kind, self.settings.litellm_model_primary, prompt_version, cat.version if cat is not None else ""
+
+    # ---------- API ----------
+    def lookup(self, kind: str, prompt_version: str, texto: str) -> Tuple[Dict[str, Any] | None, float]:
+        """Resposta mais próxima acima do limiar (ou None) e a similaridade encontrada."""
+        t0 = time.perf_counter()
+        vec, sig = self._prepare(texto)
+        key = self._bucket_key(kind, prompt_version)
+        with self._lock:
+            b = self._buckets.get(key)
+            i, sim = b.nearest(vec, sig, time.monotonic()) if b is not None else (-1, 0.0)
+            value = b.values[i] if b is not None and i >= 0 and sim >= self.threshold else None
+        metrics.observe("llm.semcache.lookup_ms", (time.perf_counter() - t0) * 1000)
+        return value, sim
+
+    def get(self, kind: str, prompt_version: str, texto: str) -> Dict[str, Any] | None:
+        value, _ = self.lookup(kind, prompt_version, texto)
+        what = "hit" if value is not None else "miss"
+        metrics.incr(f"llm.semcache.{what}")
+        metrics.incr(f"llm.semcache.{what}.{kind}")
+        hits = metrics.counter("llm.semcache.hit")
+        metrics.gauge("llm.semcache.hit_ratio", round(hits / (hits + metrics.counter("llm.semcache.miss")), 4))
+        return value
+
+    def put(self, kind: str, prompt_version: str, texto: str, value: Dict[str, Any]) -> None:
+        vec, sig = self._prepare(texto)
+        key = self._bucket_key(kind, prompt_version)
+        with self._lock:
+            b = self._buckets.get(key)
+            if b is None:
+                # catálogo novo: baldes de outras versões não servem mais
+                self._buckets = {k: v for k, v in self._buckets.items() if k[3] == key[3]}
+                b = self._buckets[key] = _Bucket(self.np, self.dim, self.max_entries)
+            b.add(vec, sig, time.monotonic() + self.ttl_s, value)
+        metrics.incr("llm.semcache.put")
+        metrics.incr(f"llm.semcache.put.{kind}")
+
+    def __len__(self) -> int:
+        return sum(b.n for b in self._buckets.values())
@@ -23,9 +23,45 @@ class Settings(BaseSettings):
     whatsapp_phone_number_id: str = Field(...)
     app_secret: str = Field(..., description="APP_SECRET para assinar Webhook")
     verify_token: str = Field(..., description="VERIFY_TOKEN para verificação do hub.challenge")
+    whatsapp_graph_base_url: str = Field(default="https://graph.facebook.com/v20.0")
+
+    # Dispatcher do outbox
+    dispatch_batch_size: int = Field(default=50, description="Mensagens reivindicadas por lote (FOR UPDATE SKIP LOCKED)")
+    dispatch_concurrency: int = Field(default=16, description="Envios simultâneos (conversas diferentes)")
+    dispatch_rate_per_s: float = Field(default=80.0, description="Limite de envio para a Graph API (token bucket)")
+    dispatch_burst: int = Field(default=20)
+    dispatch_poll_interval_ms: int = Field(default=250)
+    dispatch_max_attempts: int = Field(default=5)
+    dispatch_backoff_base_s: float = Field(default=2.0, description="Atraso do 1º reenvio; dobra a cada tentativa (com jitter)")
+    dispatch_backoff_max_s: float = Field(default=300.0)
+    dispatch_lease_s: float = Field(default=120.0, description="Tempo em 'sending' antes de outro dispatcher poder reivindicar a mensagem (dispatcher que caiu)")
+    dispatch_embedded: bool = Field(default=False, description="Sobe o dispatcher junto com a API")
 
     # Coalescência
     coalesce_window_ms: int = Field(default=1200)
+    coalesce_mode: str = Field(default="poll", description="poll (advisory lock + polling) | events (debounce em memória)")
+    coalesce_notify: str = Field(default="local", description="local (sinal in-process) | pg (LISTEN/NOTIFY, multi-processo)")
+
+    # Ingestão / workers de turno
+    ingest_mode: str = Field(default="inline", description="inline|async — em async o webhook só persiste na inbox")
+    turn_workers: int = Field(default=4, description="Tamanho do pool de workers de turno (modo async)")
+    turn_workers_embedded: bool = Field(default=True, description="Sobe o pool junto com a API no modo async")
+    turn_poll_interval_ms: int = Field(default=250)
+    turn_pending_horizon_s: int = Field(default=900, description="Ignora inbox mais antiga que isso ao buscar pendências")
+    turn_lanes: int = Field(default=0, description="Modo inline: filas de uma thread por fatia de conversas (0 = turno na thread da requisição)")
+    turn_supersede: bool = Field(default=False, description="Inbox nova aborta o roteador/agente em andamento da conversa e recomeça o turno")
+    turn_supersede_max_restarts: int = Field(default=2, description="Recomeços por turno; o último vai até o fim")
+    cluster_nodes: str = Field(default="", description="Nós do anel de hash consistente, separados por vírgula (modo async)")
+    cluster_node_id: str = Field(default="", description="Nome deste nó em HB_CLUSTER_NODES; busca só conversas do próprio nó")
+    asgi_db_threads: int = Field(default=64, description="App ASGI: threads para as etapas síncronas do turno (contexto, coalescência, flush)")
+
+    # Auditoria (conversation_events)
+    event_sink_mode: str = Field(default="sync", description="sync (um commit por evento) | async (fila + escrita em lote)")
+    event_queue_max: int = Field(default=10000)
+    event_batch_size: int = Field(default=500)
+    event_flush_interval_ms: int = Field(default=200)
+    event_overflow: str = Field(default="block", description="block (espera até event_block_timeout_ms) | drop")
+    event_block_timeout_ms: int = Field(default=1000)
 
     # LLM / LiteLLM
     litellm_base_url: str = Field(..., description="URL do gateway LiteLLM")
@@ -34,6 +70,42 @@ class Settings(BaseSettings):
     litellm_timeout_s: int = Field(default=12)
     litellm_max_tokens: int = Field(default=300)
     litellm_temperature: float = Field(default=0.1)
+    litellm_http2: bool = Field(default=False, description="HTTP/2 no pool do gateway (requer httpx[http2])")
+    litellm_max_connections: int = Field(default=50)
+    litellm_keepalive_expiry_s: float = Field(default=30.0)
+    litellm_hedge_enabled: bool = Field(default=True, description="Dispara o fallback em paralelo quando o primário atrasa")
+    litellm_hedge_percentile: float = Field(default=0.95, description="Percentil de latência do primário que dispara o hedge")
+    litellm_hedge_min_samples: int = Field(default=20, description="Amostras mínimas antes de usar o percentil")
+    litellm_hedge_initial_delay_ms: int = Field(default=4000, description="Atraso de hedge enquanto não há amostras")
+    tool_max_parallel: int = Field(default=4, description="Tool calls de um mesmo passo do LLM executadas em paralelo (sem conflito)")
+    litellm_stream: bool = Field(default=False, description="Agentes usam SSE (tools rodam assim que os argumentos fecham)")
+    stream_early_flush: bool = Field(default=False, description="Com streaming, envia antes o 1º trecho completo de respostas longas")
+    stream_flush_min_chars: int = Field(default=280, description="Tamanho a partir do qual a resposta é considerada longa")
+
+    # Cache de respostas do LLM (roteador e turnos sem tools)
+    llm_cache_enabled: bool = Field(default=False, description="Reaproveita respostas para prompt/contexto/mensagem equivalentes")
+    llm_cache_ttl_s: int = Field(default=600)
+    llm_cache_max_entries: int = Field(default=2000, description="Entradas do LRU em memória (por processo)")
+    llm_cache_shared: bool = Field(default=False, description="Camada compartilhada em Postgres (migração 0008)")
+    semantic_cache_enabled: bool = Field(default=False, description="Paráfrases de consultas read-only reaproveitam respostas (requer numpy)")
+    semantic_cache_threshold: float = Field(default=0.8, description="Similaridade mínima (cosseno) para o hit")
+    semantic_cache_ttl_s: int = Field(default=3600)
+    semantic_cache_max_entries: int = Field(default=5000, description="Pares pergunta → resposta por agente/catálogo")
+
+    # Prompts
+    prompt_layout: str = Field(default="classic", description="classic | cache (estático primeiro, volátil no fim: cache de prefixo)")
+
+    # Catálogo no prompt do roteador
+    catalog_prompt_max_items: int = Field(default=120, description="Itens no texto do catálogo (boot e reload)")
+    catalog_prompt_budget_tokens: int = Field(default=1200, description="Orçamento do catálogo no prompt; acima disso, resumo + itens relevantes")
+
+    # Pré-roteador (sem LLM para mensagens óbvias)
+    prerouter_enabled: bool = Field(default=True)
+    prerouter_threshold: float = Field(default=0.85, description="Confiança mínima para pular o roteador LLM")
+    prerouter_model_path: str = Field(default="", description="Modelo local treinado (scripts/report_prerouter.py --save)")
 
-    # Outros
-    ctx_summary_threshold: int = Field(default=30)
+    # Contexto da conversa no prompt
+    ctx_budget_tokens: int = Field(default=900, description="Orçamento de snapshot + memory_summary + últimas mensagens")
+    ctx_recent_messages: int = Field(default=8, description="Mensagens recentes (de cada sentido) carregadas e mantidas fora do resumo")
+    ctx_summary_threshold: int = Field(default=30, description="Mensagens de inbox fora do resumo que disparam o resumo em segundo plano")
+    ctx_summarizer_embedded: bool = Field(default=True, description="Sobe o summarizer junto com a API/pool de turnos")
@@ -0,0 +1,134 @@
+
+"""Cancelamento cooperativo de turnos superados por mensagens mais novas da mesma conversa.
+
+- ``supersedable(conversation_id, max_inbox_id)``: registra o turno em andamento (roteador + agente) e deixa
+  o ``TurnToken`` no contexto. ``notify_inbox`` (chamado por ``publish_inbox`` a cada inserção na inbox) cancela
+  o token quando chega inbox id maior que o coalescido pelo turno.
+- Pontos de parada: ``LLMClient`` cancela a chamada em voo (a task no event loop é cancelada no ``await``
+  HTTP atual) e os loops de tools checam ``check()`` a cada passo; ambos levantam ``TurnSuperseded``.
+  O pipeline (``adk/pipeline.py``) recomeça o turno com o texto coalescido de novo (antigas + novas).
+- ``freeze()``: depois que algo saiu para o cliente (trecho antecipado), o turno não pode mais ser superado.
+- Tokens: ``turn.superseded.tokens_spent`` (gastos no turno abortado) e ``turn.superseded.tokens_saved``
+  (estimativa: média móvel de um turno completo − gastos), gauge ``turn.superseded.tokens_saved_per_h``.
+"""
+from __future__ import annotations
+import threading, time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List
+from .metrics import metrics
+from .logging import get_logger
+
+log = get_logger()
+
+EMA_ALPHA = 0.1  # peso da última amostra na média de tokens de um turno completo
+
+class TurnSuperseded(Exception):
+    """O turno foi superado por inbox mais nova (``newer_inbox_id``)."""
+    def __init__(self, conversation_id: str, newer_inbox_id: int):
+        super().__init__(f"turno de {conversation_id} superado pela inbox {newer_inbox_id}")
+        self.conversation_id = conversation_id
+        self.newer_inbox_id = newer_inbox_id
+
+class TurnToken:
+    """Sinal de cancelamento de um turno; callbacks de ``on_cancel`` rodam na thread de quem cancela."""
+    def __init__(self, conversation_id: str, max_inbox_id: int):
+        self.conversation_id = conversation_id
+        self.max_inbox_id = max_inbox_id
+        self.newer_inbox_id = 0
+        self.frozen = False
+        self._lock = threading.Lock()
+        self._callbacks: List[Callable[[], None]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self.newer_inbox_id > 0
+
+    def cancel(self, newer_inbox_id: int) -> bool:
+        with self._lock:
+            if self.frozen or self.cancelled or newer_inbox_id <= self.max_inbox_id:
+                return False
+            self.newer_inbox_id = newer_inbox_id
+            callbacks, self._callbacks = self._callbacks, []
+        for cb in callbacks:
+            cb()
+        return True
+
+    def freeze(self) -> bool:
+        """Impede cancelamentos futuros; False se o turno já foi superado."""
+        with self._lock:
+            self.frozen = not self.cancelled
+            return self.frozen
+
+    def on_cancel(self, cb: Callable[[], None]) -> Callable[[], None]:
+        """Registra ``cb`` (chamado já, se cancelado); devolve a função que desfaz o registro."""
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(cb)
+                return lambda: self._discard(cb)
+        cb()
+        return lambda: None
+
+    def _discard(self, cb: Callable[[], None]) -> None:
+        with self._lock:
+            if cb in self._callbacks:
+                self._callbacks.remove(cb)
+
+    def check(self) -> None:
+        if self.cancelled:
+            raise TurnSuperseded(self.conversation_id, self.newer_inbox_id)
+
+_current: ContextVar[TurnToken | None] = ContextVar("turn_token", default=None)
+_active: Dict[str, TurnToken] = {}
+_active_lock = threading.Lock()
+_started_at = time.time()
+_turn_tokens = {"ema": 0.0}
+
+def current() -> TurnToken | None:
+    return _current.get()
+
+def check() -> None:
+    """Levanta ``TurnSuperseded`` se o turno do contexto atual foi superado (no-op fora de um turno)."""
+    t = _current.get()
+    if t is not None:
+        t.check()
+
+@contextmanager
+def supersedable(conversation_id: str, max_inbox_id: int) -> Iterator[TurnToken]:
+    token = TurnToken(conversation_id, max_inbox_id)
+    with _active_lock:
+        _active[conversation_id] = token
+    ctx = _current.set(token)
+    try:
+        yield token
+    finally:
+        _current.reset(ctx)
+        with _active_lock:
+            if _active.get(conversation_id) is token:
+                del _active[conversation_id]
+
+def notify_inbox(conversation_id: str, inbox_id: int | None) -> None:
+    """Nova inbox da conversa: supera o turno em andamento que não a coalesceu."""
+    with _active_lock:
+        token = _active.get(conversation_id)
+    if token is not None and inbox_id and token.cancel(inbox_id):
+        metrics.incr("turn.superseded.signals")
+        log.info("turn_supersede_signal", conversation_id=conversation_id, newer_inbox_id=inbox_id,
+                 max_inbox_id=token.max_inbox_id)
+
+def observe_turn_tokens(tokens: int) -> None:
+    """Tokens (entrada + saída) de um turno que chegou ao fim: base da estimativa de economia."""
+    if tokens <= 0:
+        return
+    ema = _turn_tokens["ema"]
+    _turn_tokens["ema"] = float(tokens) if not ema else ema + EMA_ALPHA * (tokens - ema)
+
+def record_superseded(spent_tokens: int) -> int:
+    """Contabiliza um turno abortado; devolve os tokens economizados estimados."""
+    saved = max(0, round(_turn_tokens["ema"]) - spent_tokens)
+    metrics.incr("turn.superseded")
+    metrics.incr("turn.superseded.tokens_spent", spent_tokens)
+    metrics.incr("turn.superseded.tokens_saved", saved)
+    hours = max(time.time() - _started_at, 1.0) / 3600
+    metrics.gauge("turn.superseded.tokens_saved_per_h", round(metrics.counter("turn.superseded.tokens_saved") / hours, 1))
+    return saved
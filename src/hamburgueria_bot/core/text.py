@@ -0,0 +1,34 @@
+
+"""Normalização de texto PT-BR para matching local (sem LLM): minúsculas, sem acentos, sem pontuação.
+
+``hashed_features``: n-gramas hasheados (palavras 1–2, caracteres 3; crc32, estável entre execuções) com norma
+L2 — entrada do classificador do pré-roteador e vetor do cache semântico.
+"""
+from __future__ import annotations
+import math, re, unicodedata, zlib
+from typing import Dict, List
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+def fold(text: str) -> str:
+    """Minúsculas, remove acentos e pontuação, colapsa espaços. Ex.: 'Tá aberto?' → 'ta aberto'."""
+    nfkd = unicodedata.normalize("NFKD", (text or "").lower())
+    ascii_ = "".join(c for c in nfkd if not unicodedata.combining(c))
+    return _NON_WORD.sub(" ", ascii_).strip()
+
+def tokens(text: str) -> List[str]:
+    """Tokens do texto normalizado por ``fold``."""
+    return fold(text).split()
+
+def hashed_features(text: str, dim: int) -> Dict[int, float]:
+    """Texto → {índice: peso} esparso e normalizado (ver docstring do módulo)."""
+    toks = fold(text).split()
+    feats = [f"w:{t}" for t in toks] + [f"b:{a}_{b}" for a, b in zip(toks, toks[1:])]
+    padded = f" {' '.join(toks)} "
+    feats += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    out: Dict[int, float] = {}
+    for f in feats:
+        idx = zlib.crc32(f.encode()) % dim
+        out[idx] = out.get(idx, 0.0) + 1.0
+    norm = math.sqrt(sum(v * v for v in out.values())) or 1.0
+    return {k: v / norm for k, v in out.items()}
@@ -1,29 +1,77 @@
 
-"""Serviço de carrinho: operações idempotentes por conversa."""
+"""Serviço de carrinho: operações idempotentes por conversa.
+
+Cada mutação é UM statement (CTE com ``INSERT ... ON CONFLICT (conversation_id, sku) DO UPDATE`` /
+``UPDATE``/``DELETE ... RETURNING``) que já devolve o carrinho inteiro com o subtotal calculado no SQL
+(``sum(...) OVER ()``) — uma ida ao banco por tool, sem corrida entre SELECT e INSERT.
+"""
 from __future__ import annotations
 from kink import di
-from sqlalchemy import select, delete
+from pydantic import BaseModel
+from sqlalchemy import delete, text
 from ...repo.models import CartItem
 
-def add_item(conversation_id: str, sku: str, name: str, unit_price_cents: int, qty: int = 1) -> None:
-    """Adiciona (ou incrementa) item no carrinho."""
+class CartState(BaseModel):
+    items: list[dict]
+    subtotal_cents: int
+
+_COLS = "id, sku, name, qty, unit_price_cents"
+
+# A consulta principal de uma CTE não enxerga as linhas alteradas pela própria CTE: o carrinho resultante
+# é o RETURNING da linha alterada somado às demais linhas da conversa.
+_STATE_FROM = f"""
+    SELECT sku, name, qty, unit_price_cents, sum(qty * unit_price_cents) OVER () AS subtotal_cents
+    FROM (SELECT {_COLS} FROM changed
+          UNION ALL
+          SELECT {_COLS} FROM cart_items WHERE conversation_id = :cid AND sku <> :sku) c
+    ORDER BY id
+"""
+
+_ADD_SQL = text(f"""
+    WITH changed AS (
+        INSERT INTO cart_items (conversation_id, sku, name, qty, unit_price_cents)
+        VALUES (:cid, :sku, :name, :qty, :price)
+        ON CONFLICT (conversation_id, sku) DO UPDATE SET qty = cart_items.qty + EXCLUDED.qty
+        RETURNING {_COLS}
+    )
+""" + _STATE_FROM)
+
+_REMOVE_SQL = text(f"""
+    WITH changed AS (
+        UPDATE cart_items SET qty = qty - :qty
+        WHERE conversation_id = :cid AND sku = :sku AND qty > :qty
+        RETURNING {_COLS}
+    ), removed AS (
+        DELETE FROM cart_items
+        WHERE conversation_id = :cid AND sku = :sku AND qty <= :qty
+        RETURNING id
+    )
+""" + _STATE_FROM)
+
+_STATE_SQL = text("""
+    SELECT sku, name, qty, unit_price_cents, sum(qty * unit_price_cents) OVER () AS subtotal_cents
+    FROM cart_items WHERE conversation_id = :cid
+    ORDER BY id
+""")
+
+def _state(rows) -> CartState:
+    items = [{"sku": r.sku, "name": r.name, "qty": r.qty, "unit_price_cents": r.unit_price_cents} for r in rows]
+    return CartState(items=items, subtotal_cents=int(rows[0].subtotal_cents) if rows else 0)
+
+def add_item(conversation_id: str, sku: str, name: str, unit_price_cents: int, qty: int = 1) -> CartState:
+    """Adiciona (ou incrementa) item no carrinho e retorna o estado."""
     Session = di["session_factory"]
     with Session() as s, s.begin():
-        row = s.execute(select(CartItem).where(CartItem.conversation_id==conversation_id, CartItem.sku==sku)).scalars().first()
-        if row:
-            row.qty += qty
-        else:
-            s.add(CartItem(conversation_id=conversation_id, sku=sku, name=name, qty=qty, unit_price_cents=unit_price_cents))
-
-def remove_item(conversation_id: str, sku: str, qty: int = 1) -> None:
-    """Decrementa item e remove se zerar."""
+        rows = s.execute(_ADD_SQL, {"cid": conversation_id, "sku": sku, "name": name, "qty": qty,
+                                    "price": unit_price_cents}).all()
+    return _state(rows)
+
+def remove_item(conversation_id: str, sku: str, qty: int = 1) -> CartState:
+    """Decrementa item, remove se zerar, e retorna o estado."""
     Session = di["session_factory"]
     with Session() as s, s.begin():
-        row = s.execute(select(CartItem).where(CartItem.conversation_id==conversation_id, CartItem.sku==sku)).scalars().first()
-        if row:
-            row.qty -= qty
-            if row.qty <= 0:
-                s.delete(row)
+        rows = s.execute(_REMOVE_SQL, {"cid": conversation_id, "sku": sku, "qty": qty}).all()
+    return _state(rows)
 
 def clear_cart(conversation_id: str) -> None:
     """Esvazia carrinho."""
@@ -31,14 +79,16 @@ def clear_cart(conversation_id: str) -> None:
     with Session() as s, s.begin():
         s.execute(delete(CartItem).where(CartItem.conversation_id==conversation_id))
 
-def get_items(conversation_id: str) -> list[dict]:
-    """Lista itens atuais do carrinho."""
+def get_state(conversation_id: str) -> CartState:
+    """Itens atuais e subtotal (calculado no SQL) numa única query."""
     Session = di["session_factory"]
     with Session() as s:
-        rows = s.execute(select(CartItem).where(CartItem.conversation_id==conversation_id)).scalars().all()
-        return [{"sku":r.sku,"name":r.name,"qty":r.qty,"unit_price_cents":r.unit_price_cents} for r in rows]
+        return _state(s.execute(_STATE_SQL, {"cid": conversation_id}).all())
+
+def get_items(conversation_id: str) -> list[dict]:
+    """Lista itens atuais do carrinho."""
+    return get_state(conversation_id).items
 
 def calc_subtotal_cents(conversation_id: str) -> int:
     """Calcula subtotal em centavos."""
-    items = get_items(conversation_id)
-    return sum(i["qty"] * i["unit_price_cents"] for i in items)
+    return get_state(conversation_id).subtotal_cents
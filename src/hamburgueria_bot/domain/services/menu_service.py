@@ -1,13 +1,10 @@
 
-"""Serviço de cardápio (estático no MVP)."""
+"""Serviço de cardápio: visão simplificada do catálogo vigente (``di[Catalog]``)."""
 from typing import List, Dict
+from kink import di
+from ...core.catalog import Catalog
 
 def get_menu() -> List[Dict]:
     """Retorna cardápio simples com SKUs e preços em centavos (idempotente)."""
-    return [
-        {"sku":"BX1","name":"Burger Clássico","price_cents":2500},
-        {"sku":"BX2","name":"Cheese Burger","price_cents":2800},
-        {"sku":"BX3","name":"Duplo Bacon","price_cents":3400},
-        {"sku":"AC1","name":"Batata Média","price_cents":1200},
-        {"sku":"RV1","name":"Refrigerante Lata","price_cents":800},
-    ]
+    return [{"sku": it["sku"], "name": it["name"], "price_cents": it["price_cents"]}
+            for it in di[Catalog].items if it.get("sku")]
@@ -22,6 +22,7 @@ class EntregaDTO(BaseModel):
     provider_message_id: str | None = None
     error_code: str | None = None
     error_detail: str | None = None
+    retry_after_s: float | None = None  # espera pedida pelo provedor (Retry-After / códigos de rate limit)
 
 class IngressPort(Protocol):
     def receive(self, raw: dict) -> MensagemEntradaDTO: ...
@@ -34,3 +35,8 @@ class AckPort(Protocol):
 
 class OutboxRelay(Protocol):
     def dispatch_pending(self) -> int: ...
+
+class TurnSignals(Protocol):
+    """Avisos do pipeline de turno aos serviços de segundo plano (implementação em ``tasks/turn_signals.py``)."""
+    def outbox_enqueued(self, conversation_id: str) -> None: ...
+    def summary_due(self, conversation_id: str) -> None: ...
@@ -0,0 +1,38 @@
+
+"""Versões asyncio das operações do repositório usadas na borda HTTP do app ASGI (``api/asgi.py``).
+
+Mesmos statements de ``repo.py`` (``_inbox_row``, ``_upsert_state_stmt``, ``_paused_query``), executados numa
+``AsyncSession`` de ``di["async_session_factory"]`` (``core/db.create_async_session_factory``).
+"""
+from __future__ import annotations
+from kink import di
+from ..core.logging import get_logger
+from ..core.coalesce_events import publish_inbox
+from .repo import _inbox_row, _paused_query, _upsert_state_stmt
+
+log = get_logger()
+
+async def save_inbox(dto) -> int:
+    """Insere na Inbox com chave de idempotência (conversation_id, provider_message_id)."""
+    Session = di["async_session_factory"]
+    async with Session() as s, s.begin():
+        im = _inbox_row(dto)
+        s.add(im)
+    log.info("inbox_saved", conversation_id=dto.conversation_id, provider_message_id=dto.provider_message_id)
+    publish_inbox(dto.conversation_id, im.id)
+    return im.id
+
+async def set_handoff(conversation_id: str, paused: bool, reason: str | None = None) -> None:
+    """Liga/desliga o modo pausado para LLM (transbordo humano)."""
+    Session = di["async_session_factory"]
+    async with Session() as s, s.begin():
+        await s.execute(_upsert_state_stmt(conversation_id, handoff_paused=paused,
+                                           **({"handoff_reason": reason} if reason else {})))
+    log.info("handoff_set", conversation_id=conversation_id, paused=paused, reason=reason)
+
+async def list_paused(limit: int = 100, after: str | None = None) -> list[dict]:
+    """Conversas pausadas, paginadas por ``conversation_id`` (keyset em ``after``)."""
+    Session = di["async_session_factory"]
+    async with Session() as s:
+        rows = (await s.execute(_paused_query(limit, after))).all()
+    return [{"conversation_id": r.conversation_id, "reason": r.handoff_reason} for r in rows]
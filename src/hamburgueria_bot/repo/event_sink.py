@@ -0,0 +1,156 @@
+
+"""Gravação assíncrona e em lote dos eventos de auditoria (``conversation_events``).
+
+- ``EventSink.emit`` só enfileira (fila limitada em memória); uma thread escritora drena a fila e grava
+  com INSERT multi-linha (``executemany`` → insertmanyvalues do SQLAlchemy/psycopg) quando junta
+  ``batch_size`` eventos ou quando ``flush_interval_ms`` passa desde o primeiro evento do lote.
+- Fila cheia: ``overflow="block"`` espera até ``block_timeout_ms`` por espaço; ``"drop"`` descarta na hora.
+  Descartes contam em ``events.dropped``.
+- Ordem por conversa: ``ts`` é estritamente crescente por conversa, atribuído sob lock na ordem de ``emit``;
+  o ``put`` (que pode esperar com a fila cheia) roda fora do lock, então uma conversa lenta não trava as outras.
+  Leitores ordenam por ``ts``.
+- ``stop()``/atexit drenam e gravam o que restou. Métricas: gauge ``events.queue_depth``, histograma
+  ``events.flush_ms``, contadores ``events.written``, ``events.dropped``, ``events.flush_errors``.
+"""
+from __future__ import annotations
+import atexit, queue, threading, time
+from typing import Any, Dict, List
+from kink import di
+from sqlalchemy import insert
+from .models import ConversationEvent
+from ..core.settings import Settings
+from ..core.metrics import metrics
+from ..core.logging import get_logger
+
+log = get_logger()
+
+_LAST_TS_MAX = 50_000  # conversas lembradas para a ordem de ts; acima disso esquece as inativas
+
+class EventSink:
+    """Fila limitada + thread escritora de ``conversation_events`` (ver docstring do módulo)."""
+    def __init__(self, max_queue: int = 10_000, batch_size: int = 500, flush_interval_ms: int = 200,
+                 overflow: str = "block", block_timeout_ms: int = 1000, write_retries: int = 3):
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_ms / 1000.0
+        self.overflow = overflow
+        self.block_timeout_s = block_timeout_ms / 1000.0
+        self.write_retries = write_retries
+        self._q: queue.Queue[Dict[str, Any]] = queue.Queue(maxsize=max_queue)
+        self._order_lock = threading.Lock()
+        self._last_ts: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "EventSink":
+        self._thread = threading.Thread(target=self._run, name="event-sink", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Para de aceitar espera por novos lotes, drena a fila e grava o restante."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+    def emit(self, conversation_id: str, kind: str, data: dict, ts: int | None = None) -> bool:
+        """Enfileira um evento. Retorna False se foi descartado (fila cheia)."""
+        now = ts if ts is not None else int(time.time() * 1000)
+        with self._order_lock:  # só a atribuição do ts; a espera por espaço na fila fica fora do lock
+            ts = max(now, self._last_ts.get(conversation_id, 0) + 1)
+            self._last_ts[conversation_id] = ts
+            if len(self._last_ts) > _LAST_TS_MAX:
+                horizon = now - 60_000
+                self._last_ts = {c: t for c, t in self._last_ts.items() if t > horizon}
+        row = {"conversation_id": conversation_id, "kind": kind, "data": data, "ts": ts}
+        try:
+            if self.overflow == "drop":
+                self._q.put_nowait(row)
+            else:
+                self._q.put(row, timeout=self.block_timeout_s)
+        except queue.Full:
+            metrics.incr("events.dropped")
+            log.info("event_dropped", conversation_id=conversation_id, kind=kind, overflow=self.overflow)
+            return False
+        metrics.gauge("events.queue_depth", self._q.qsize())
+        return True
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Espera a fila esvaziar e os lotes em voo serem gravados. Retorna False no timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._q.all_tasks_done:
+            while self._q.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._q.all_tasks_done.wait(remaining)
+        return True
+
+    # ---------- escritor ----------
+    def _take(self) -> List[Dict[str, Any]]:
+        """Bloqueia pelo primeiro evento; completa o lote até ``batch_size`` ou até o intervalo vencer."""
+        try:
+            batch = [self._q.get(timeout=self.flush_interval_s)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval_s
+        while len(batch) < self.batch_size:
+            remaining = 0 if self._stop.is_set() else deadline - time.monotonic()
+            try:
+                batch.append(self._q.get(timeout=remaining) if remaining > 0 else self._q.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take()
+            if batch:
+                try:
+                    self._write(batch)
+                finally:
+                    for _ in batch:
+                        self._q.task_done()
+                    metrics.gauge("events.queue_depth", self._q.qsize())
+            elif self._stop.is_set():
+                return
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        Session = di["session_factory"]
+        for attempt in range(1, self.write_retries + 1):
+            t0 = time.perf_counter()
+            try:
+                with Session() as s, s.begin():
+                    s.execute(insert(ConversationEvent), batch)
+                metrics.observe("events.flush_ms", (time.perf_counter() - t0) * 1000)
+                metrics.incr("events.written", len(batch))
+                return
+            except Exception as e:
+                metrics.incr("events.flush_errors")
+                log.info("event_flush_error", attempt=attempt, size=len(batch), error=str(e))
+                if attempt < self.write_retries:
+                    time.sleep(0.2 * attempt)
+        metrics.incr("events.dropped", len(batch))
+
+_sink: EventSink | None = None
+_sink_lock = threading.Lock()
+
+def get_event_sink() -> EventSink:
+    """Sink do processo (criado e iniciado no primeiro uso; drenado no encerramento via atexit)."""
+    global _sink
+    if _sink is None:
+        with _sink_lock:
+            if _sink is None:
+                s: Settings = di[Settings]
+                sink = EventSink(
+                    max_queue=s.event_queue_max,
+                    batch_size=s.event_batch_size,
+                    flush_interval_ms=s.event_flush_interval_ms,
+                    overflow=s.event_overflow,
+                    block_timeout_ms=s.event_block_timeout_ms,
+                ).start()
+                atexit.register(sink.stop)
+                _sink = sink
+    return _sink
+
+def sink_enabled() -> bool:
+    return di[Settings].event_sink_mode == "async"
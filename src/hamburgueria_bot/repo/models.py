@@ -2,7 +2,8 @@
 """Modelos SQLAlchemy para Inbox/Outbox/State/Cart."""
 from __future__ import annotations
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import String, Integer, JSON, UniqueConstraint, BigInteger, TIMESTAMP
+from sqlalchemy import String, Integer, Boolean, JSON, UniqueConstraint, Index, BigInteger, TIMESTAMP, text
+from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
 
 class Base(DeclarativeBase):
@@ -20,6 +21,8 @@ class InboxMessage(Base):
     trace_id: Mapped[str] = mapped_column(String(64), default="-")
     __table_args__ = (
         UniqueConstraint("conversation_id", "provider_message_id", name="uq_inbox_idem"),
+        Index("ix_inbox_conv_id", "conversation_id", "id"),
+        Index("ix_inbox_received_at", "received_at"),
     )
 
 class OutboxMessage(Base):
@@ -27,18 +30,31 @@ class OutboxMessage(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     conversation_id: Mapped[str] = mapped_column(String(64))
     body: Mapped[dict] = mapped_column(JSON)
-    status: Mapped[str] = mapped_column(String(16), default="queued")  # queued|sent|dead_letter
+    status: Mapped[str] = mapped_column(String(16), default="queued")  # queued|sending|sent|cancelled|dead_letter
     attempts: Mapped[int] = mapped_column(Integer, default=0)
     last_error: Mapped[str | None]
     provider_message_id: Mapped[str | None]
     created_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=False), default=datetime.utcnow)
     sent_at: Mapped[datetime | None]
+    next_attempt_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=False), default=datetime.utcnow)  # reenvio agendado
+    __table_args__ = (
+        Index("ix_outbox_queued_due", "next_attempt_at", "id", postgresql_where=text("status IN ('queued', 'sending')")),
+        Index("ix_outbox_queued_conv", "conversation_id", "id", postgresql_where=text("status IN ('queued', 'sending')")),
+        Index("ix_outbox_conv_id", "conversation_id", "id"),
+    )
 
 class ConversationState(Base):
     __tablename__ = "conversation_state"
     conversation_id: Mapped[str] = mapped_column(String(64), primary_key=True)
     memory_summary: Mapped[str | None]
-    snapshot: Mapped[dict] = mapped_column(JSON, default=dict)
+    snapshot: Mapped[dict] = mapped_column(JSON().with_variant(JSONB(), "postgresql"), default=dict)  # JSONB (0005)
+    handoff_paused: Mapped[bool] = mapped_column(Boolean, default=False, server_default=text("false"))
+    handoff_reason: Mapped[str | None]
+    last_processed_inbox_id: Mapped[int | None] = mapped_column(BigInteger)
+    summary_upto_inbox_id: Mapped[int | None] = mapped_column(BigInteger)  # inbox já incorporada ao memory_summary
+    __table_args__ = (
+        Index("ix_state_handoff_paused", "conversation_id", postgresql_where=text("handoff_paused")),
+    )
 
 class ConversationEvent(Base):
     __tablename__ = "conversation_events"
@@ -47,6 +63,20 @@ class ConversationEvent(Base):
     kind: Mapped[str] = mapped_column(String(32))
     data: Mapped[dict] = mapped_column(JSON)
     ts: Mapped[int] = mapped_column(BigInteger)  # epoch ms
+    __table_args__ = (
+        Index("ix_events_conv_id", "conversation_id", "id"),
+    )
+
+class LlmResponseCache(Base):
+    __tablename__ = "llm_response_cache"  # camada compartilhada do cache de respostas (core/llm_cache.py)
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(48))
+    catalog_version: Mapped[str] = mapped_column(String(16))
+    value: Mapped[dict] = mapped_column(JSON().with_variant(JSONB(), "postgresql"))
+    expires_at: Mapped[datetime] = mapped_column(TIMESTAMP(timezone=False))
+    __table_args__ = (
+        Index("ix_llm_cache_expires", "expires_at"),
+    )
 
 class CartItem(Base):
     __tablename__ = "cart_items"
@@ -56,3 +86,6 @@ class CartItem(Base):
     name: Mapped[str] = mapped_column(String(120))
     qty: Mapped[int] = mapped_column(Integer)
     unit_price_cents: Mapped[int] = mapped_column(Integer)
+    __table_args__ = (
+        UniqueConstraint("conversation_id", "sku", name="uq_cart_item"),
+    )
@@ -1,11 +1,17 @@
 
 """Repositório: Inbox/Outbox/State + Coalescência + Handoff (pausa por contato)."""
 from __future__ import annotations
-from typing import Dict, Any
-from sqlalchemy import select
+from functools import lru_cache
+from typing import Dict, Any, Tuple
+import time, random
+from sqlalchemy import select, text, bindparam, func
+from sqlalchemy.dialects.postgresql import JSONB, insert as pg_insert
+from sqlalchemy.sql.elements import TextClause
 from kink import di
 from ..repo.models import InboxMessage, OutboxMessage, ConversationState, ConversationEvent
 from ..core.logging import get_logger
+from ..core.coalesce_events import publish_inbox
+from .event_sink import get_event_sink, sink_enabled
 
 log = get_logger()
 
@@ -13,60 +19,162 @@ def save_inbox(dto) -> int:
     """Insere na Inbox com chave de idempotência (conversation_id, provider_message_id)."""
     Session = di["session_factory"]
     with Session() as s, s.begin():
-        im = InboxMessage(
-            conversation_id=dto.conversation_id,
-            provider_message_id=dto.provider_message_id,
-            wa_id=dto.wa_id,
-            payload=dto.model_dump(mode="json"),
-        )
+        im = _inbox_row(dto)
         s.add(im)
     log.info("inbox_saved", conversation_id=dto.conversation_id, provider_message_id=dto.provider_message_id)
+    publish_inbox(dto.conversation_id, im.id)
     return im.id
 
-def get_last_processed_inbox_id(conversation_id: str) -> int | None:
-    """Obtém do snapshot a última inbox id já processada/enviada."""
+def _inbox_row(dto) -> InboxMessage:
+    return InboxMessage(conversation_id=dto.conversation_id, provider_message_id=dto.provider_message_id,
+                        wa_id=dto.wa_id, payload=dto.model_dump(mode="json"))
+
+# ---------- Snapshot (JSONB, atualizações parciais no servidor) ----------
+@lru_cache(maxsize=32)
+def _upsert_sql(advance_keys: Tuple[str, ...]) -> TextClause:
+    """Upsert de uma linha de estado: ``snapshot || :patch`` e, para cada chave de ``advance_keys``,
+    ``GREATEST`` entre o valor gravado e o novo (chaves que só avançam)."""
+    new = "".join(f" || jsonb_build_object(CAST(:ak{i} AS text), CAST(:av{i} AS bigint))" for i in range(len(advance_keys)))
+    upd = "".join(
+        f" || jsonb_build_object(CAST(:ak{i} AS text), GREATEST("
+        f"COALESCE((conversation_state.snapshot->>CAST(:ak{i} AS text))::bigint, 0),"
+        f" CAST(:av{i} AS bigint)))" for i in range(len(advance_keys)))
+    return text(f"""
+        INSERT INTO conversation_state (conversation_id, memory_summary, snapshot)
+        VALUES (:cid, NULL, :patch{new})
+        ON CONFLICT (conversation_id) DO UPDATE
+        SET snapshot = COALESCE(conversation_state.snapshot, '{{}}'::jsonb) || :patch{upd}
+    """).bindparams(bindparam("patch", type_=JSONB))
+
+def _upsert_params(conversation_id: str, patch: Dict[str, Any] | None, advance: Dict[str, int] | None) -> Dict[str, Any]:
+    params: Dict[str, Any] = {"cid": conversation_id, "patch": patch or {}}
+    for i, (k, v) in enumerate((advance or {}).items()):
+        params[f"ak{i}"], params[f"av{i}"] = k, int(v)
+    return params
+
+def patch_snapshot(conversation_id: str, patch: Dict[str, Any] | None = None, advance: Dict[str, int] | None = None,
+                   session=None) -> None:
+    """Atualiza chaves do snapshot em UM statement, sem SELECT prévio nem reescrever o documento.
+
+    :param patch: chaves de topo gravadas por cima (``||``); as demais chaves ficam intactas.
+    :param advance: chaves numéricas que só avançam (``GREATEST`` no servidor).
+    :param session: executa na transação do chamador (padrão: transação própria).
+    """
+    stmt = _upsert_sql(tuple(advance or ()))
+    params = _upsert_params(conversation_id, patch, advance)
+    if session is not None:
+        session.execute(stmt, params)
+        return
+    Session = di["session_factory"]
+    with Session() as s, s.begin():
+        s.execute(stmt, params)
+
+def _snapshot_key(conversation_id: str, key: str) -> Any:
+    """Lê uma única chave do snapshot (``snapshot->key``), sem trazer o documento inteiro."""
     Session = di["session_factory"]
     with Session() as s:
-        st = s.get(ConversationState, conversation_id)
-        if not st or not st.snapshot:
-            return None
-        return st.snapshot.get("last_processed_inbox_id")
+        return s.execute(text("SELECT snapshot->CAST(:key AS text) FROM conversation_state WHERE conversation_id = :cid"),
+                         {"cid": conversation_id, "key": key}).scalar()
 
-def set_last_processed_inbox_id(conversation_id: str, inbox_id: int) -> None:
-    """Atualiza snapshot com a última inbox id processada (após envio)."""
+# ---------- Colunas tipadas do estado (0006) ----------
+def upsert_state(conversation_id: str, session=None, **columns: Any) -> None:
+    """Grava colunas de ``conversation_state`` (handoff_paused, handoff_reason, last_processed_inbox_id)
+    num único upsert; as colunas não informadas ficam como estão."""
+    stmt = _upsert_state_stmt(conversation_id, **columns)
+    if session is not None:
+        session.execute(stmt)
+        return
     Session = di["session_factory"]
     with Session() as s, s.begin():
-        st = s.get(ConversationState, conversation_id)
-        if not st:
-            st = ConversationState(conversation_id=conversation_id, memory_summary=None, snapshot={})
-            s.add(st)
-        snap = dict(st.snapshot or {})
-        snap["last_processed_inbox_id"] = inbox_id
-        st.snapshot = snap
+        s.execute(stmt)
+
+def _upsert_state_stmt(conversation_id: str, **columns: Any):
+    stmt = pg_insert(ConversationState).values(conversation_id=conversation_id, snapshot={}, **columns)
+    return stmt.on_conflict_do_update(index_elements=[ConversationState.conversation_id],
+                                      set_={k: stmt.excluded[k] for k in columns})
+
+def advance_processed_many(session, values: Dict[str, int]) -> None:
+    """Avança ``last_processed_inbox_id`` (só para frente) de várias conversas em um executemany."""
+    if not values:
+        return
+    stmt = pg_insert(ConversationState)
+    stmt = stmt.on_conflict_do_update(index_elements=[ConversationState.conversation_id], set_={
+        "last_processed_inbox_id": func.greatest(func.coalesce(ConversationState.last_processed_inbox_id, 0),
+                                                 stmt.excluded.last_processed_inbox_id)})
+    session.execute(stmt, [{"conversation_id": cid, "snapshot": {}, "last_processed_inbox_id": v}
+                           for cid, v in values.items()])
+
+def get_gate(conversation_id: str) -> Tuple[bool, int | None]:
+    """Gate do webhook numa leitura estreita pela PK: ``(handoff_paused, last_processed_inbox_id)``."""
+    Session = di["session_factory"]
+    with Session() as s:
+        row = s.execute(select(ConversationState.handoff_paused, ConversationState.last_processed_inbox_id)
+                        .where(ConversationState.conversation_id == conversation_id)).first()
+    return (bool(row.handoff_paused), row.last_processed_inbox_id) if row else (False, None)
+
+def get_last_processed_inbox_id(conversation_id: str) -> int | None:
+    """Obtém a última inbox id já processada/enviada."""
+    return get_gate(conversation_id)[1]
+
+def set_last_processed_inbox_id(conversation_id: str, inbox_id: int) -> None:
+    """Atualiza a última inbox id processada (após envio)."""
+    upsert_state(conversation_id, last_processed_inbox_id=inbox_id)
     log.info("snapshot_advanced", conversation_id=conversation_id, last_processed_inbox_id=inbox_id)
 
-def get_handoff(conversation_id: str) -> bool:
-    """Retorna se a conversa está pausada para atendimento humano (handoff)."""
+def set_last_turn_inbox_id(conversation_id: str, inbox_id: int) -> None:
+    """Marca no snapshot a maior inbox id já consumida por um turno (só avança).
+
+    Diferente de ``last_processed_inbox_id`` (avança no envio), serve para o pool de workers
+    não reprocessar mensagens cujo turno já foi executado e aguarda o dispatcher.
+    """
+    patch_snapshot(conversation_id, advance={"last_turn_inbox_id": inbox_id})
+
+def list_pending_conversations(limit: int = 20, horizon_s: int = 900) -> list[dict]:
+    """Conversas com inbox não consumida por turno (id > last_turn_inbox_id), mais antigas primeiro.
+
+    :param limit: máximo de conversas retornadas.
+    :param horizon_s: ignora mensagens recebidas há mais de ``horizon_s`` segundos (histórico antigo).
+    :return: lista de dicts ``{"conversation_id", "wa_id", "max_inbox_id"}``.
+    """
     Session = di["session_factory"]
     with Session() as s:
-        st = s.get(ConversationState, conversation_id)
-        return bool((st.snapshot or {}).get("handoff_paused")) if st else False
+        rows = s.execute(text("""
+            SELECT i.conversation_id, max(i.wa_id) AS wa_id, max(i.id) AS max_inbox_id
+            FROM inbox_messages i
+            LEFT JOIN conversation_state cs ON cs.conversation_id = i.conversation_id
+            WHERE i.id > COALESCE((cs.snapshot->>'last_turn_inbox_id')::bigint, 0)
+              AND i.received_at > (now() at time zone 'utc') - make_interval(secs => :horizon)
+            GROUP BY i.conversation_id
+            ORDER BY min(i.id)
+            LIMIT :limit
+        """), {"limit": limit, "horizon": horizon_s}).mappings().all()
+        return [dict(r) for r in rows]
+
+def get_handoff(conversation_id: str) -> bool:
+    """Retorna se a conversa está pausada para atendimento humano (handoff)."""
+    return get_gate(conversation_id)[0]
 
 def set_handoff(conversation_id: str, paused: bool, reason: str | None = None) -> None:
     """Liga/desliga o modo pausado para LLM (transbordo humano)."""
-    Session = di["session_factory"]
-    with Session() as s, s.begin():
-        st = s.get(ConversationState, conversation_id)
-        if not st:
-            st = ConversationState(conversation_id=conversation_id, memory_summary=None, snapshot={})
-            s.add(st)
-        snap = dict(st.snapshot or {})
-        snap["handoff_paused"] = paused
-        if reason:
-            snap["handoff_reason"] = reason
-        st.snapshot = snap
+    upsert_state(conversation_id, handoff_paused=paused, **({"handoff_reason": reason} if reason else {}))
     log.info("handoff_set", conversation_id=conversation_id, paused=paused, reason=reason)
 
+def list_paused(limit: int = 100, after: str | None = None) -> list[dict]:
+    """Conversas pausadas (índice parcial ``ix_state_handoff_paused``), paginadas por ``conversation_id``.
+
+    :param after: último ``conversation_id`` da página anterior (keyset).
+    """
+    Session = di["session_factory"]
+    with Session() as s:
+        rows = s.execute(_paused_query(limit, after)).all()
+    return [{"conversation_id": r.conversation_id, "reason": r.handoff_reason} for r in rows]
+
+def _paused_query(limit: int, after: str | None):
+    q = select(ConversationState.conversation_id, ConversationState.handoff_reason).where(ConversationState.handoff_paused)
+    if after:
+        q = q.where(ConversationState.conversation_id > after)
+    return q.order_by(ConversationState.conversation_id).limit(limit)
+
 def load_context(conversation_id: str) -> dict:
     """Obtém memory_summary e snapshot atuais da conversa."""
     Session = di["session_factory"]
@@ -106,7 +214,11 @@ def has_newer_inbox(conversation_id: str, since_inbox_id: int) -> bool:
         return row is not None
 
 def log_event(conversation_id: str, kind: str, data: dict) -> None:
-    """Registra um evento de auditoria em conversation_events."""
+    """Registra um evento de auditoria em conversation_events (em lote, fora do request, se HB_EVENT_SINK_MODE=async)."""
+    if sink_enabled():
+        get_event_sink().emit(conversation_id, kind, data)
+        log.info("conv_event", conversation_id=conversation_id, kind=kind)
+        return
     Session = di["session_factory"]
     with Session() as s, s.begin():
         ev = ConversationEvent(conversation_id=conversation_id, kind=kind, data=data, ts=int(__import__("time").time()*1000))
@@ -117,52 +229,56 @@ def log_event(conversation_id: str, kind: str, data: dict) -> None:
 # ---------- Address helpers (snapshot) ----------
 def get_address(conversation_id: str) -> dict | None:
     """Retorna endereço salvo no snapshot (se existir)."""
-    Session = di["session_factory"]
-    with Session() as s:
-        st = s.get(ConversationState, conversation_id)
-        if not st or not st.snapshot:
-            return None
-        return st.snapshot.get("address")
+    return _snapshot_key(conversation_id, "address")
 
 def set_address(conversation_id: str, address: dict) -> None:
     """Atualiza endereço no snapshot (normalizado/validado)."""
-    Session = di["session_factory"]
-    with Session() as s, s.begin():
-        st = s.get(ConversationState, conversation_id)
-        if not st:
-            st = ConversationState(conversation_id=conversation_id, memory_summary=None, snapshot={})
-            s.add(st)
-        snap = dict(st.snapshot or {})
-        snap["address"] = address
-        st.snapshot = snap
+    patch_snapshot(conversation_id, {"address": address})
     log.info("address_upsert", conversation_id=conversation_id)
 
 # ---------- Payment helpers (snapshot PIX-mock) ----------
+_APPEND_PAYMENT_SQL = text("""
+    INSERT INTO conversation_state (conversation_id, memory_summary, snapshot)
+    VALUES (:cid, NULL, jsonb_build_object('payments', jsonb_build_array(:intent)))
+    ON CONFLICT (conversation_id) DO UPDATE
+    SET snapshot = jsonb_set(COALESCE(conversation_state.snapshot, '{}'::jsonb), '{payments}',
+                             COALESCE(conversation_state.snapshot->'payments', '[]'::jsonb) || jsonb_build_array(:intent))
+""").bindparams(bindparam("intent", type_=JSONB))
+
+_GET_PAYMENT_SQL = text("""
+    SELECT p FROM conversation_state, jsonb_array_elements(snapshot->'payments') p
+    WHERE conversation_id = :cid AND p->>'id' = :pid
+    LIMIT 1
+""")
+
+_UPDATE_PAYMENT_SQL = text("""
+    UPDATE conversation_state
+    SET snapshot = jsonb_set(snapshot, '{payments}', (
+        SELECT jsonb_agg(CASE WHEN p->>'id' = :pid THEN p || jsonb_build_object('status', CAST(:status AS text)) ELSE p END
+                         ORDER BY n)
+        FROM jsonb_array_elements(snapshot->'payments') WITH ORDINALITY AS t(p, n)))
+    WHERE conversation_id = :cid
+      AND snapshot->'payments' @> jsonb_build_array(jsonb_build_object('id', CAST(:pid AS text)))
+    RETURNING (SELECT p FROM jsonb_array_elements(snapshot->'payments') p WHERE p->>'id' = :pid LIMIT 1)
+""")
+
 def _gen_payment_id() -> str:
     """Gera um ID simples para intents de pagamento."""
     return f"pix_{int(time.time()*1000)}_{random.randint(1000,9999)}"
 
 def create_payment_intent(conversation_id: str, amount_cents: int) -> dict:
-    """Cria uma intenção de pagamento PIX (mock) no snapshot."""
+    """Cria uma intenção de pagamento PIX (mock) no snapshot (append atômico em ``payments``)."""
+    pid = _gen_payment_id()
+    intent = {
+        "id": pid,
+        "amount_cents": amount_cents,
+        "status": "pending",
+        "pix_code": f"000201BR.GOV.BCB.PIX|ADK|{pid}|{amount_cents}",  # string mock
+        "created_ts": int(time.time()*1000),
+    }
     Session = di["session_factory"]
     with Session() as s, s.begin():
-        st = s.get(ConversationState, conversation_id)
-        if not st:
-            st = ConversationState(conversation_id=conversation_id, memory_summary=None, snapshot={})
-            s.add(st)
-        snap = dict(st.snapshot or {})
-        payments = list(snap.get("payments", []))
-        pid = _gen_payment_id()
-        intent = {
-            "id": pid,
-            "amount_cents": amount_cents,
-            "status": "pending",
-            "pix_code": f"000201BR.GOV.BCB.PIX|ADK|{pid}|{amount_cents}",  # string mock
-            "created_ts": int(time.time()*1000),
-        }
-        payments.append(intent)
-        snap["payments"] = payments
-        st.snapshot = snap
+        s.execute(_APPEND_PAYMENT_SQL, {"cid": conversation_id, "intent": intent})
     log.info("payment_created", conversation_id=conversation_id, payment_id=pid, amount_cents=amount_cents)
     return intent
 
@@ -170,30 +286,14 @@ def get_payment_intent(conversation_id: str, payment_id: str) -> dict | None:
     """Recupera uma intenção de pagamento do snapshot."""
     Session = di["session_factory"]
     with Session() as s:
-        st = s.get(ConversationState, conversation_id)
-        if not st or not st.snapshot:
-            return None
-        for p in st.snapshot.get("payments", []):
-            if p.get("id") == payment_id:
-                return p
-    return None
+        return s.execute(_GET_PAYMENT_SQL, {"cid": conversation_id, "pid": payment_id}).scalar()
 
 def update_payment_status(conversation_id: str, payment_id: str, status: str) -> dict | None:
-    """Atualiza status de pagamento (pending|approved|expired|cancelled)."""
+    """Atualiza status de pagamento (pending|approved|expired|cancelled) no próprio servidor."""
     Session = di["session_factory"]
     with Session() as s, s.begin():
-        st = s.get(ConversationState, conversation_id)
-        if not st or not st.snapshot:
-            return None
-        payments = list(st.snapshot.get("payments", []))
-        updated = None
-        for p in payments:
-            if p.get("id") == payment_id:
-                p["status"] = status
-                updated = p
-                break
-        snap = dict(st.snapshot or {})
-        snap["payments"] = payments
-        st.snapshot = snap
+        updated = s.execute(_UPDATE_PAYMENT_SQL, {"cid": conversation_id, "pid": payment_id, "status": status}).scalar()
+    if updated is None:
+        return None
     log.info("payment_status", conversation_id=conversation_id, payment_id=payment_id, status=status)
     return updated
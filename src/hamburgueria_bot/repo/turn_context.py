@@ -0,0 +1,183 @@
+
+"""Unidade de trabalho de um turno: estado da conversa carregado uma vez, escritas em um único commit.
+
+- ``TurnContext.load``: UMA ida ao banco traz ``conversation_state`` (memory_summary, snapshot e as colunas
+  ``handoff_paused``/``handoff_reason``/``last_processed_inbox_id``), as últimas mensagens da inbox e do
+  outbox (respostas do bot), quantas mensagens ainda estão fora do ``memory_summary`` e os SKUs do carrinho
+  (para a seleção do catálogo no prompt, ``core/catalog_prompt.py``).
+- Leituras seguintes (gate de handoff, contexto, últimas mensagens) saem da memória; contexto e últimas
+  mensagens passam pelo orçamento de tokens de ``core.context.build_context``.
+- Escritas do turno (chaves do snapshot, eventos de auditoria, outbox) ficam em buffer e ``flush``
+  grava tudo em uma transação. O snapshot é mesclado no servidor (``repo.patch_snapshot``: ``||`` e
+  ``GREATEST`` num único upsert), sem sobrescrever chaves gravadas no meio do turno pelas tools
+  (endereço, pagamentos); colunas do estado (handoff) vão num upsert próprio (``repo.upsert_state``).
+  Com o sink assíncrono (``repo/event_sink.py``) os eventos vão para a fila em vez da transação.
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Tuple
+import time
+from sqlalchemy import text
+from kink import di
+from .models import ConversationEvent, OutboxMessage
+from .event_sink import get_event_sink, sink_enabled
+from .repo import patch_snapshot, upsert_state
+from ..core.context import DEFAULT_BUDGET_TOKENS, build_context
+from ..core.logging import get_logger
+
+log = get_logger()
+
+_LOAD_SQL = text("""
+    SELECT cs.memory_summary, cs.snapshot, cs.handoff_paused, cs.handoff_reason, cs.last_processed_inbox_id,
+           (SELECT COALESCE(json_agg(json_build_object('id', r.id, 'payload', r.payload) ORDER BY r.id), '[]'::json)
+              FROM (SELECT id, payload FROM inbox_messages
+                     WHERE conversation_id = k.cid ORDER BY id DESC LIMIT :n) r) AS recent,
+           (SELECT COALESCE(json_agg(json_build_object('src', r.src, 'texto', r.texto) ORDER BY r.id), '[]'::json)
+              FROM (SELECT id, body->>'texto' AS texto, (body->'_meta'->>'source_max_inbox_id')::bigint AS src
+                      FROM outbox_messages
+                     WHERE conversation_id = k.cid AND status IN ('queued', 'sending', 'sent')
+                     ORDER BY id DESC LIMIT :n) r) AS replies,
+           (SELECT count(*) FROM (SELECT 1 FROM inbox_messages
+                                   WHERE conversation_id = k.cid AND id > COALESCE(cs.summary_upto_inbox_id, 0)
+                                   LIMIT :unsummarized_cap) u) AS unsummarized,
+           ARRAY(SELECT sku FROM cart_items WHERE conversation_id = k.cid ORDER BY id) AS cart_skus
+    FROM (SELECT CAST(:cid AS varchar) AS cid) k
+    LEFT JOIN conversation_state cs ON cs.conversation_id = k.cid
+""")
+
+class TurnContext:
+    """Estado de uma conversa durante um turno (ver docstring do módulo)."""
+    def __init__(self, conversation_id: str, *, memory_summary: str | None = None, snapshot: Dict[str, Any] | None = None,
+                 recent: Dict[int, str] | None = None, handoff_paused: bool = False, handoff_reason: str | None = None,
+                 last_processed_inbox_id: int | None = None, cart_skus: List[str] | None = None,
+                 replies: List[Tuple[int, str]] | None = None, unsummarized: int = 0,
+                 budget_tokens: int = DEFAULT_BUDGET_TOKENS):
+        self.conversation_id = conversation_id
+        self.unsummarized = unsummarized  # mensagens de inbox ainda fora do memory_summary (limitado no load)
+        self.budget_tokens = budget_tokens
+        self.cart_skus: List[str] = list(cart_skus or [])  # SKUs no carrinho no início do turno
+        self.memory_summary = memory_summary
+        self._columns: Dict[str, Any] = {"handoff_paused": bool(handoff_paused), "handoff_reason": handoff_reason}
+        self._last_processed_inbox_id = last_processed_inbox_id
+        self._state: Dict[str, Any] = {}  # colunas de conversation_state pendentes
+        self._snapshot: Dict[str, Any] = dict(snapshot or {})
+        self._recent: Dict[int, str] = dict(recent or {})
+        self._replies: List[Tuple[int, str]] = list(replies or [])  # (source_max_inbox_id, texto) do bot
+        self._patch: Dict[str, Any] = {}
+        self._advance: Dict[str, int] = {}
+        self._events: List[Tuple[str, dict, int]] = []
+        self._outbox: List[dict] = []
+        self.enqueued = 0  # mensagens de outbox gravadas pelos flushes deste turno
+
+    @classmethod
+    def load(cls, conversation_id: str, recent_limit: int = 8, budget_tokens: int = DEFAULT_BUDGET_TOKENS,
+             unsummarized_cap: int = 1000) -> "TurnContext":
+        """Carrega estado + últimas ``recent_limit`` mensagens de inbox e de outbox em uma única query."""
+        Session = di["session_factory"]
+        with Session() as s:
+            row = s.execute(_LOAD_SQL, {"cid": conversation_id, "n": recent_limit,
+                                        "unsummarized_cap": unsummarized_cap}).mappings().one()
+        recent = {int(r["id"]): (r["payload"] or {}).get("texto", "") for r in (row["recent"] or [])}
+        replies = [(int(r["src"] or 0), r["texto"] or "") for r in (row["replies"] or [])]
+        return cls(conversation_id, memory_summary=row["memory_summary"], snapshot=row["snapshot"], recent=recent,
+                   handoff_paused=row["handoff_paused"], handoff_reason=row["handoff_reason"],
+                   last_processed_inbox_id=row["last_processed_inbox_id"], cart_skus=row["cart_skus"],
+                   replies=replies, unsummarized=int(row["unsummarized"] or 0), budget_tokens=budget_tokens)
+
+    # ---------- leituras (memória) ----------
+    @property
+    def snapshot(self) -> Dict[str, Any]:
+        """Snapshot carregado com as escritas pendentes do turno aplicadas."""
+        snap = self._snapshot | self._patch
+        for k, v in self._advance.items():
+            snap[k] = max(int(snap.get(k) or 0), v)
+        return snap
+
+    @property
+    def handoff_paused(self) -> bool:
+        return bool((self._columns | self._state)["handoff_paused"])
+
+    @property
+    def last_processed_inbox_id(self) -> int | None:
+        return self._last_processed_inbox_id
+
+    def context(self) -> Dict[str, Any]:
+        """Mesmo formato de ``repo.load_context``, com snapshot projetado e resumo dentro do orçamento."""
+        ctx = self._build()
+        return {"memory_summary": ctx["memory_summary"], "snapshot": ctx["snapshot"]}
+
+    def absorb_batch(self, pacote: Dict[str, Any]) -> None:
+        """Inclui as mensagens coalescidas (chegadas depois do load) nas últimas mensagens."""
+        for mid, texto in zip(pacote.get("message_ids", []), pacote.get("textos", [])):
+            self._recent[mid] = texto
+
+    def last_messages(self, limit: int | None = None) -> Dict[str, Any]:
+        """Mesmo formato de ``core.context.last_messages``: últimas mensagens (cliente e bot) em ordem
+        cronológica, até ``limit`` e dentro do orçamento."""
+        ultimas = self._build()["ultimas"]
+        return {"ultimas": ultimas[-limit:] if limit else ultimas}
+
+    def turns(self) -> List[Tuple[str, str]]:
+        """Mensagens recentes nos dois sentidos; cada resposta vem logo após a inbox que ela respondeu."""
+        keyed = [((mid, 0), "cliente", t) for mid, t in self._recent.items()]
+        keyed += [((src, 1), "bot", t) for src, t in self._replies]
+        return [(papel, t) for _, papel, t in sorted(keyed, key=lambda x: x[0])]
+
+    def context_tokens(self) -> int:
+        """Tokens estimados do contexto montado (snapshot + resumo + últimas mensagens)."""
+        return self._build()["tokens"]
+
+    def _build(self) -> Dict[str, Any]:
+        return build_context(self.memory_summary, self.snapshot, self.turns(), self.budget_tokens)
+
+    # ---------- escritas (buffer até o flush) ----------
+    def set_snapshot(self, **values: Any) -> None:
+        self._patch.update(values)
+
+    def advance(self, key: str, value: int) -> None:
+        """Chave numérica do snapshot que só avança (ex.: ``last_turn_inbox_id``)."""
+        if value > self._advance.get(key, 0):
+            self._advance[key] = value
+
+    def set_handoff(self, paused: bool, reason: str | None = None) -> None:
+        self._state.update(handoff_paused=paused, **({"handoff_reason": reason} if reason else {}))
+
+    def log_event(self, kind: str, data: dict) -> None:
+        self._events.append((kind, data, int(time.time() * 1000)))
+
+    def enqueue_outbox(self, body: dict, source_max_inbox_id: int | None = None) -> None:
+        if source_max_inbox_id is not None:
+            body = dict(body)
+            body["_meta"] = dict(body.get("_meta", {})) | {"source_max_inbox_id": source_max_inbox_id}
+        self._outbox.append(body)
+
+    def flush(self) -> None:
+        """Grava snapshot, eventos e outbox pendentes em uma transação (no-op se não houver nada)."""
+        if not (self._patch or self._advance or self._state or self._events or self._outbox):
+            return
+        cid = self.conversation_id
+        if self._events and sink_enabled():
+            sink = get_event_sink()
+            for kind, data, ts in self._events:
+                sink.emit(cid, kind, data, ts)
+                log.info("conv_event", conversation_id=cid, kind=kind)
+            self._events = []
+            if not (self._patch or self._advance or self._state or self._outbox):
+                return
+        Session = di["session_factory"]
+        with Session() as s, s.begin():
+            if self._patch or self._advance:
+                patch_snapshot(cid, self._patch, self._advance, session=s)
+            if self._state:
+                upsert_state(cid, session=s, **self._state)
+            s.add_all(ConversationEvent(conversation_id=cid, kind=kind, data=data, ts=ts) for kind, data, ts in self._events)
+            outbox = [OutboxMessage(conversation_id=cid, body=body) for body in self._outbox]
+            s.add_all(outbox)
+            s.flush()
+        for kind, _, _ in self._events:
+            log.info("conv_event", conversation_id=cid, kind=kind)
+        for ob in outbox:
+            log.info("outbox_enqueued", conversation_id=cid, outbox_id=ob.id)
+        self.enqueued += len(outbox)
+        self._snapshot, self._patch, self._advance = self.snapshot, {}, {}
+        self._columns, self._state = self._columns | self._state, {}
+        self._events, self._outbox = [], []
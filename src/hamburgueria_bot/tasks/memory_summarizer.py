@@ -0,0 +1,189 @@
+
+"""Resumo incremental da conversa (``conversation_state.memory_summary``), fora do caminho da requisição.
+
+- O turno só pede (``request_summary``) quando a conversa tem ``HB_CTX_SUMMARY_THRESHOLD`` mensagens de inbox
+  além de ``summary_upto_inbox_id``; o pedido entra numa fila (uma entrada por conversa) e uma thread
+  resume em segundo plano. Sem summarizer no processo, o pedido é ignorado (o próximo turno pede de novo).
+- Cada passada incorpora ao resumo anterior as mensagens (cliente e respostas do bot) até antes das últimas
+  ``HB_CTX_RECENT_MESSAGES`` — que seguem literais no prompt — no máximo ``batch_messages`` por vez.
+- Gravação com compare-and-set em ``summary_upto_inbox_id``: dois processos resumindo a mesma conversa não
+  sobrescrevem um ao outro (o segundo descarta o seu resumo).
+- Métricas: ``summary.runs|skipped|conflicts|errors|dropped``, ``summary.ms``, gauge ``summary.queue_depth``.
+
+Execução standalone (varre conversas acima do limiar periodicamente):
+    python -m hamburgueria_bot.tasks.memory_summarizer
+"""
+from __future__ import annotations
+import queue, threading, time
+from typing import List, Tuple
+from pydantic import BaseModel
+from sqlalchemy import text
+from kink import di
+from ..core.settings import Settings
+from ..core.llm_client import LLMClient
+from ..core.prompting import PromptBuilder
+from ..core.metrics import metrics
+from ..core.logging import get_logger
+
+log = get_logger()
+
+SUMMARY_MAX_CHARS = 2000
+
+_STATE_SQL = text("""
+    SELECT memory_summary, COALESCE(summary_upto_inbox_id, 0) AS upto
+    FROM conversation_state WHERE conversation_id = :cid
+""")
+
+# Corte: fica de fora (literal no prompt) a janela das ``keep`` mensagens mais novas; no máximo ``batch`` por passada.
+_CUT_SQL = text("""
+    SELECT (SELECT id FROM inbox_messages WHERE conversation_id = :cid ORDER BY id DESC OFFSET :keep LIMIT 1) AS window_start,
+           (SELECT max(id) FROM (SELECT id FROM inbox_messages WHERE conversation_id = :cid AND id > :upto
+                                 ORDER BY id LIMIT :batch) b) AS batch_end
+""")
+
+_FOLD_SQL = text("""
+    SELECT papel, texto FROM (
+        SELECT id AS k, 0 AS ord, 'cliente' AS papel, payload->>'texto' AS texto
+          FROM inbox_messages WHERE conversation_id = :cid AND id > :upto AND id <= :cut
+        UNION ALL
+        SELECT (body->'_meta'->>'source_max_inbox_id')::bigint, 1, 'bot', body->>'texto'
+          FROM outbox_messages
+         WHERE conversation_id = :cid AND status IN ('queued', 'sending', 'sent')
+           AND (body->'_meta'->>'source_max_inbox_id')::bigint > :upto
+           AND (body->'_meta'->>'source_max_inbox_id')::bigint <= :cut
+    ) m WHERE texto IS NOT NULL ORDER BY k, ord
+""")
+
+_SAVE_SQL = text("""
+    UPDATE conversation_state SET memory_summary = :summary, summary_upto_inbox_id = :cut
+    WHERE conversation_id = :cid AND COALESCE(summary_upto_inbox_id, 0) = :upto
+""")
+
+_DUE_SQL = text("""
+    SELECT cs.conversation_id FROM conversation_state cs
+    WHERE (SELECT count(*) FROM (SELECT 1 FROM inbox_messages i
+                                  WHERE i.conversation_id = cs.conversation_id
+                                    AND i.id > COALESCE(cs.summary_upto_inbox_id, 0)
+                                  LIMIT :threshold) u) >= :threshold
+    LIMIT :limit
+""")
+
+class _Resumo(BaseModel):
+    resumo: str
+
+def summarize_conversation(conversation_id: str, keep_recent: int, batch_messages: int = 60,
+                           max_words: int = 120) -> bool:
+    """Uma passada de resumo incremental. Retorna True se gravou um novo resumo."""
+    Session = di["session_factory"]
+    with Session() as s:
+        st = s.execute(_STATE_SQL, {"cid": conversation_id}).first()
+        if st is None:
+            return False
+        bounds = s.execute(_CUT_SQL, {"cid": conversation_id, "keep": keep_recent, "upto": st.upto,
+                                      "batch": batch_messages}).one()
+        if bounds.window_start is None or bounds.batch_end is None:
+            return False
+        cut = min(bounds.window_start, bounds.batch_end)
+        if cut <= st.upto:
+            return False
+        rows: List[Tuple[str, str]] = [tuple(r) for r in s.execute(
+            _FOLD_SQL, {"cid": conversation_id, "upto": st.upto, "cut": cut}).all()]
+    user = ("Resumo anterior:\n" + (st.memory_summary or "(vazio)") + "\n\nMensagens novas:\n"
+            + "\n".join(f"- {papel}: {texto}" for papel, texto in rows))
+    out = di[LLMClient].complete_json(di[PromptBuilder].summary_system(max_palavras=max_words), user, _Resumo)
+    with Session() as s, s.begin():
+        saved = s.execute(_SAVE_SQL, {"cid": conversation_id, "summary": out.resumo.strip()[:SUMMARY_MAX_CHARS],
+                                      "cut": cut, "upto": st.upto}).rowcount
+    if not saved:
+        metrics.incr("summary.conflicts")
+        return False
+    log.info("memory_summary_updated", conversation_id=conversation_id, upto=cut, messages=len(rows))
+    return True
+
+class MemorySummarizer:
+    """Fila de conversas a resumir + thread de trabalho (ver docstring do módulo)."""
+    def __init__(self, keep_recent: int | None = None, max_queue: int = 1000, max_words: int = 120):
+        settings: Settings = di[Settings]
+        self.keep_recent = keep_recent or settings.ctx_recent_messages
+        self.threshold = settings.ctx_summary_threshold
+        self.max_words = max_words
+        self._q: queue.Queue[str] = queue.Queue(maxsize=max_queue)
+        self._pending: set[str] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> "MemorySummarizer":
+        self._thread = threading.Thread(target=self._run, name="memory-summarizer", daemon=True)
+        self._thread.start()
+        log.info("summarizer_started", threshold=self.threshold, keep_recent=self.keep_recent)
+        return self
+
+    def stop(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+    def request(self, conversation_id: str) -> bool:
+        """Enfileira a conversa (no-op se já está na fila). Nunca bloqueia: fila cheia descarta."""
+        with self._lock:
+            if conversation_id in self._pending:
+                return False
+            try:
+                self._q.put_nowait(conversation_id)
+            except queue.Full:
+                metrics.incr("summary.dropped")
+                return False
+            self._pending.add(conversation_id)
+        metrics.gauge("summary.queue_depth", self._q.qsize())
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                cid = self._q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            with self._lock:
+                self._pending.discard(cid)
+            metrics.gauge("summary.queue_depth", self._q.qsize())
+            t0 = time.perf_counter()
+            try:
+                done = summarize_conversation(cid, self.keep_recent, max_words=self.max_words)
+                metrics.incr("summary.runs" if done else "summary.skipped")
+            except Exception as e:
+                metrics.incr("summary.errors")
+                log.info("summary_error", conversation_id=cid, error=str(e))
+            metrics.observe("summary.ms", (time.perf_counter() - t0) * 1000)
+
+    def sweep(self, limit: int = 100) -> int:
+        """Enfileira conversas acima do limiar (modo standalone). Retorna quantas entraram na fila."""
+        Session = di["session_factory"]
+        with Session() as s:
+            cids = s.execute(_DUE_SQL, {"threshold": self.threshold, "limit": limit}).scalars().all()
+        return sum(self.request(cid) for cid in cids)
+
+def request_summary(conversation_id: str) -> bool:
+    """Pede um resumo em segundo plano, se houver summarizer neste processo."""
+    if MemorySummarizer not in di:
+        return False
+    return di[MemorySummarizer].request(conversation_id)
+
+def main() -> None:
+    """Roda o summarizer standalone, varrendo conversas acima do limiar, até SIGINT/SIGTERM."""
+    from ..core.di import bootstrap_di
+    bootstrap_di()
+    summarizer = MemorySummarizer().start()
+    try:
+        while True:
+            queued = summarizer.sweep()
+            if queued:
+                log.info("summary_sweep", queued=queued)
+            time.sleep(30)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        summarizer.stop()
+
+if __name__ == "__main__":
+    main()
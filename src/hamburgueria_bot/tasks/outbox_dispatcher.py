@@ -1,50 +1,330 @@
 
-"""Despacho de outbox com preflight e logs detalhados."""
+"""Despacho de outbox com preflight e logs detalhados.
+
+- Reivindica lotes com ``FOR UPDATE SKIP LOCKED`` e advisory lock de transação por conversa
+  (``outbox:<conversation_id>``) numa transação curta que marca as linhas ``sending`` com lease
+  (``next_attempt_at`` = agora + ``HB_DISPATCH_LEASE_S``) e faz commit; os envios rodam sem transação aberta e
+  os desfechos são gravados numa segunda transação curta. Conversa com cabeça em ``sending`` não é reivindicada
+  até o lease vencer (dispatcher que caiu no meio): um dispatcher por conversa, mensagens em ordem de ``id``.
+- Envia conversas diferentes em paralelo (``HB_DISPATCH_CONCURRENCY``) sobre o pool ``httpx.AsyncClient``
+  do adapter, limitado por token bucket (``HB_DISPATCH_RATE_PER_S`` / ``HB_DISPATCH_BURST``, por processo).
+  Se um envio falha, o restante daquela conversa espera o próximo lote.
+- Falhas reagendam com ``next_attempt_at`` (backoff exponencial com jitter, ``HB_DISPATCH_BACKOFF_*``),
+  respeitando ``Retry-After``/códigos de rate limit da Graph API (``EntregaDTO.retry_after_s``); só linhas
+  vencidas são reivindicadas, e só conversas cuja mensagem mais antiga está vencida (ordem preservada).
+  Rate limit da conta (4, 80007, 130429) suspende todos os envios do processo pelo tempo pedido.
+- Preflight (inbox mais nova que ``source_max_inbox_id`` → cancela) na transação do claim; avanço de
+  ``last_processed_inbox_id`` e eventos de auditoria em lote, na transação dos desfechos.
+- Métricas: ``outbox.sent|retry|dead_letter|cancelled``, ``outbox.send_ms``, ``outbox.batch_ms`` e
+  gauge ``outbox.batch_msgs_per_s``; ``stats()`` com msgs/s desde o start.
+
+Execução standalone:
+    python -m hamburgueria_bot.tasks.outbox_dispatcher
+"""
 from __future__ import annotations
-from sqlalchemy import select
-from datetime import datetime
+import asyncio, random, threading, time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Dict, List, Tuple, TypeVar
+from sqlalchemy import select, func, text
 from kink import di
-from ..repo.models import OutboxMessage
-from ..ports.interfaces import MensagemSaidaDTO
-from ..connectors.whatsapp.cloud_api_adapter import WhatsAppCloudAdapter
-from ..repo import repo
+from ..repo.models import OutboxMessage, InboxMessage, ConversationEvent
+from ..repo.repo import advance_processed_many
+from ..repo.event_sink import get_event_sink, sink_enabled
+from ..ports.interfaces import MensagemSaidaDTO, EntregaDTO
+from ..connectors.whatsapp.cloud_api_adapter import WhatsAppCloudAdapter, ACCOUNT_RATE_LIMIT_CODES
+from ..core.settings import Settings
+from ..core.ratelimit import TokenBucket
+from ..core.metrics import metrics
 from ..core.logging import get_logger
 
 log = get_logger()
 
-def dispatch_once() -> int:
-    """Envia até 20 mensagens 'queued' e retorna quantas foram enviadas com sucesso."""
-    Session = di["session_factory"]
-    adapter = WhatsAppCloudAdapter()
-    sent = 0
-    with Session() as s, s.begin():
-        rows = s.execute(select(OutboxMessage).where(OutboxMessage.status=="queued").limit(20)).scalars().all()
-        for ob in rows:
-            meta = (ob.body or {}).get("_meta", {}) if ob.body else {}
-            src_max = meta.get("source_max_inbox_id")
-            if isinstance(src_max, int) and repo.has_newer_inbox(ob.conversation_id, src_max):
-                ob.status = "cancelled"
-                repo.log_event(ob.conversation_id, "dispatch_cancelled_newer", {"outbox_id": ob.id, "since": src_max})
-                log.info("dispatch_cancelled", conversation_id=ob.conversation_id, outbox_id=ob.id)
+T = TypeVar("T")
+
+_CLAIM_SQL = text("""
+    WITH heads AS MATERIALIZED (
+        SELECT DISTINCT ON (conversation_id) conversation_id, id, next_attempt_at
+        FROM outbox_messages
+        WHERE status IN ('queued', 'sending')
+        ORDER BY conversation_id, id
+    ), convs AS MATERIALIZED (
+        SELECT conversation_id FROM heads
+        WHERE next_attempt_at <= (now() at time zone 'utc')
+        ORDER BY id
+        LIMIT :limit
+    ), owned AS MATERIALIZED (
+        SELECT conversation_id FROM convs
+        WHERE pg_try_advisory_xact_lock(hashtextextended('outbox:' || conversation_id, 0))
+    )
+    SELECT o.* FROM outbox_messages o
+    JOIN owned ON owned.conversation_id = o.conversation_id
+    WHERE o.status IN ('queued', 'sending') AND o.next_attempt_at <= (now() at time zone 'utc')
+    ORDER BY o.id
+    LIMIT :limit
+    FOR UPDATE OF o SKIP LOCKED
+""")
+
+def backoff_s(attempts: int, base_s: float, max_s: float, retry_after_s: float | None = None) -> float:
+    """Atraso do próximo envio: ``base * 2^(tentativas-1)`` limitado a ``max_s``, com jitter (50–100%);
+    nunca menor que o ``Retry-After`` pedido pelo provedor."""
+    delay = min(max_s, base_s * (2 ** max(attempts - 1, 0)))
+    delay *= 0.5 + random.random() * 0.5
+    return max(delay, retry_after_s or 0.0)
+
+class OutboxDispatcher:
+    """Serviço de despacho do outbox (ver docstring do módulo)."""
+    def __init__(self, batch_size: int | None = None, concurrency: int | None = None, rate_per_s: float | None = None,
+                 poll_interval_ms: int | None = None, adapter: WhatsAppCloudAdapter | None = None):
+        settings: Settings = di[Settings]
+        self.batch_size = batch_size or settings.dispatch_batch_size
+        self.concurrency = concurrency or settings.dispatch_concurrency
+        self.poll_interval_s = (poll_interval_ms or settings.dispatch_poll_interval_ms) / 1000.0
+        self.max_attempts = settings.dispatch_max_attempts
+        self.lease_s = settings.dispatch_lease_s
+        self.backoff_base_s = settings.dispatch_backoff_base_s
+        self.backoff_max_s = settings.dispatch_backoff_max_s
+        self._hold_until = 0.0  # monotonic; rate limit da conta suspende os envios até aqui
+        self.bucket = TokenBucket(settings.dispatch_rate_per_s if rate_per_s is None else rate_per_s, settings.dispatch_burst)
+        self.adapter = adapter or WhatsAppCloudAdapter(settings)
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._loop_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._started_at = time.time()
+
+    # ---------- ciclo de vida ----------
+    def start(self) -> "OutboxDispatcher":
+        self._started_at = time.time()
+        self._thread = threading.Thread(target=self._poll_loop, name="outbox-dispatcher", daemon=True)
+        self._thread.start()
+        log.info("dispatcher_started", batch_size=self.batch_size, concurrency=self.concurrency)
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+        self.close()
+        log.info("dispatcher_stopped")
+
+    def close(self) -> None:
+        """Fecha o pool HTTP e encerra o loop dedicado."""
+        if self._loop is not None:
+            self._run(self.adapter.aclose())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+    def notify(self) -> None:
+        """Acorda o dispatcher imediatamente (chamado quando um turno enfileira resposta)."""
+        self._wake.set()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None:
+            with self._loop_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name="outbox-loop", daemon=True).start()
+                    self._loop = loop
+        return self._loop
+
+    def _run(self, coro: Awaitable[T]) -> T:
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop()).result()
+
+    def _poll_loop(self) -> None:
+        while not self._stop.is_set():
+            hold = self._hold_until - time.monotonic()
+            if hold > 0:
+                self._stop.wait(hold)
                 continue
+            claimed = 0
+            try:
+                claimed = self.run_once()["claimed"]
+            except Exception as e:
+                log.info("dispatch_error", error=str(e))
+            if claimed < self.batch_size:  # lote cheio: provavelmente há mais, segue sem esperar
+                self._wake.wait(self.poll_interval_s)
+                self._wake.clear()
+
+    # ---------- lote ----------
+    def run_once(self) -> Dict[str, int]:
+        """Reivindica (commit), envia sem transação aberta e grava os desfechos. Retorna contagens por desfecho."""
+        t0 = time.perf_counter()
+        counts = {"claimed": 0, "sent": 0, "retry": 0, "dead_letter": 0, "cancelled": 0}
+        plan = self._claim(counts)
+        if plan:
+            results = self._run(self._send_all(plan))
+            self._finish(plan, results, counts)
 
-            dto = MensagemSaidaDTO.model_validate(ob.body)
-            res = adapter.send(dto)
-            if res.ok:
-                ob.status = "sent"
-                ob.sent_at = datetime.utcnow()
-                ob.provider_message_id = res.provider_message_id
-                if isinstance(src_max, int):
-                    repo.set_last_processed_inbox_id(ob.conversation_id, src_max)
-                repo.log_event(ob.conversation_id, "dispatch_sent", {"outbox_id": ob.id, "provider_message_id": res.provider_message_id})
-                log.info("dispatch_sent", conversation_id=ob.conversation_id, outbox_id=ob.id)
-                sent += 1
-            else:
+        elapsed = time.perf_counter() - t0
+        metrics.observe("outbox.batch_ms", elapsed * 1000)
+        for k in ("sent", "retry", "dead_letter", "cancelled"):
+            if counts[k]:
+                metrics.incr(f"outbox.{k}", counts[k])
+        metrics.gauge("outbox.batch_msgs_per_s", round(counts["sent"] / elapsed, 2) if elapsed else 0.0)
+        return counts
+
+    def _claim(self, counts: Dict[str, int]) -> Dict[str, List[Tuple[int, MensagemSaidaDTO]]]:
+        """Transação curta: reivindica o lote, aplica o preflight e marca o resto ``sending`` (lease)."""
+        Session = di["session_factory"]
+        events: List[Tuple[str, str, dict]] = []
+        plan: Dict[str, List[Tuple[int, MensagemSaidaDTO]]] = defaultdict(list)
+        with Session() as s, s.begin():
+            rows = s.scalars(select(OutboxMessage).from_statement(_CLAIM_SQL), {"limit": self.batch_size}).all()
+            if not rows:
+                return plan
+            counts["claimed"] = len(rows)
+            newest = dict(s.execute(
+                select(InboxMessage.conversation_id, func.max(InboxMessage.id))
+                .where(InboxMessage.conversation_id.in_({ob.conversation_id for ob in rows}))
+                .group_by(InboxMessage.conversation_id)
+            ).all())
+            lease_until = datetime.utcnow() + timedelta(seconds=self.lease_s)
+            for ob in rows:
+                src_max = ((ob.body or {}).get("_meta") or {}).get("source_max_inbox_id")
+                if isinstance(src_max, int) and (newest.get(ob.conversation_id) or 0) > src_max:
+                    ob.status = "cancelled"
+                    counts["cancelled"] += 1
+                    events.append((ob.conversation_id, "dispatch_cancelled_newer", {"outbox_id": ob.id, "since": src_max}))
+                    log.info("dispatch_cancelled", conversation_id=ob.conversation_id, outbox_id=ob.id)
+                    continue
+                try:
+                    dto = MensagemSaidaDTO.model_validate(ob.body)
+                except Exception as e:
+                    ob.status = "dead_letter"
+                    ob.last_error = f"invalid body: {e}"[:500]
+                    counts["dead_letter"] += 1
+                    events.append((ob.conversation_id, "dispatch_dead_letter", {"outbox_id": ob.id, "error": ob.last_error}))
+                    continue
+                ob.status = "sending"
+                ob.next_attempt_at = lease_until
+                plan[ob.conversation_id].append((ob.id, dto))
+            self._log_events(s, events)
+        return plan
+
+    def _finish(self, plan: Dict[str, List[Tuple[int, MensagemSaidaDTO]]], results: Dict[int, EntregaDTO],
+                counts: Dict[str, int]) -> None:
+        """Transação curta com os desfechos; linhas sem envio (falha anterior na conversa, rate limit da conta)
+        voltam para ``queued`` sem gastar tentativa."""
+        Session = di["session_factory"]
+        events: List[Tuple[str, str, dict]] = []
+        processed: Dict[str, int] = {}
+        with Session() as s, s.begin():
+            ids = [ob_id for items in plan.values() for ob_id, _ in items]
+            rows = s.scalars(select(OutboxMessage).where(OutboxMessage.id.in_(ids),
+                                                         OutboxMessage.status == "sending")).all()
+            now = datetime.utcnow()
+            for ob in rows:
+                res = results.get(ob.id)
+                if res is None:
+                    ob.status = "queued"
+                    ob.next_attempt_at = now
+                    continue
+                if res.ok:
+                    ob.status = "sent"
+                    ob.sent_at = now
+                    ob.provider_message_id = res.provider_message_id
+                    src_max = ((ob.body or {}).get("_meta") or {}).get("source_max_inbox_id")
+                    if isinstance(src_max, int):
+                        processed[ob.conversation_id] = max(processed.get(ob.conversation_id, 0), src_max)
+                    counts["sent"] += 1
+                    events.append((ob.conversation_id, "dispatch_sent", {"outbox_id": ob.id, "provider_message_id": res.provider_message_id}))
+                    log.info("dispatch_sent", conversation_id=ob.conversation_id, outbox_id=ob.id)
+                    continue
                 ob.attempts += 1
                 ob.last_error = res.error_detail
-                if ob.attempts >= 5:
+                if ob.attempts >= self.max_attempts:
                     ob.status = "dead_letter"
-                    repo.log_event(ob.conversation_id, "dispatch_dead_letter", {"outbox_id": ob.id, "error": res.error_detail})
+                    counts["dead_letter"] += 1
+                    events.append((ob.conversation_id, "dispatch_dead_letter", {"outbox_id": ob.id, "error": res.error_detail}))
                 else:
-                    repo.log_event(ob.conversation_id, "dispatch_retry", {"outbox_id": ob.id, "attempts": ob.attempts, "error": res.error_detail})
-    return sent
+                    delay = backoff_s(ob.attempts, self.backoff_base_s, self.backoff_max_s, res.retry_after_s)
+                    ob.status = "queued"
+                    ob.next_attempt_at = now + timedelta(seconds=delay)
+                    counts["retry"] += 1
+                    events.append((ob.conversation_id, "dispatch_retry", {
+                        "outbox_id": ob.id, "attempts": ob.attempts, "error": res.error_detail,
+                        "error_code": res.error_code, "retry_in_s": round(delay, 1)}))
+            self._advance_processed(s, processed)
+            self._log_events(s, events)
+
+    async def _send_all(self, plan: Dict[str, List[Tuple[int, MensagemSaidaDTO]]]) -> Dict[int, EntregaDTO]:
+        """Conversas em paralelo (semáforo), mensagens de cada conversa em sequência."""
+        sem = asyncio.Semaphore(self.concurrency)
+        out: Dict[int, EntregaDTO] = {}
+
+        async def conversation(items: List[Tuple[int, MensagemSaidaDTO]]) -> None:
+            async with sem:
+                for ob_id, dto in items:
+                    await self.bucket.acquire()
+                    if time.monotonic() < self._hold_until:
+                        return  # conta em rate limit: o resto fica na fila, sem gastar tentativa
+                    t0 = time.perf_counter()
+                    try:
+                        res = await self.adapter.asend(dto)
+                    except Exception as e:
+                        res = EntregaDTO(ok=False, error_code="transport", error_detail=str(e))
+                    metrics.observe("outbox.send_ms", (time.perf_counter() - t0) * 1000)
+                    out[ob_id] = res
+                    if not res.ok and res.error_code and res.error_code.isdigit() \
+                            and int(res.error_code) in ACCOUNT_RATE_LIMIT_CODES:
+                        self._hold_until = max(self._hold_until, time.monotonic() + (res.retry_after_s or 0.0))
+                        metrics.incr("outbox.rate_limited")
+                        log.info("dispatch_rate_limited", error_code=res.error_code, hold_s=res.retry_after_s)
+                    if not res.ok:
+                        break  # mantém a ordem: o resto da conversa fica para o próximo lote
+
+        await asyncio.gather(*(conversation(items) for items in plan.values()))
+        return out
+
+    @staticmethod
+    def _advance_processed(s, processed: Dict[str, int]) -> None:
+        """Avança ``last_processed_inbox_id`` de todas as conversas do lote (só para frente, no servidor)."""
+        advance_processed_many(s, processed)
+        for cid, inbox_id in processed.items():
+            log.info("snapshot_advanced", conversation_id=cid, last_processed_inbox_id=inbox_id)
+
+    @staticmethod
+    def _log_events(s, events: List[Tuple[str, str, dict]]) -> None:
+        if sink_enabled():
+            sink = get_event_sink()
+            for cid, kind, data in events:
+                sink.emit(cid, kind, data)
+            return
+        ts = int(time.time() * 1000)
+        s.add_all(ConversationEvent(conversation_id=cid, kind=kind, data=data, ts=ts) for cid, kind, data in events)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores do processo e throughput (msgs/s desde o start)."""
+        snap = metrics.snapshot("outbox.")
+        uptime = max(time.time() - self._started_at, 1e-9)
+        sent = snap["counters"].get("outbox.sent", 0)
+        return {"uptime_s": round(uptime, 1), "msgs_per_s": round(sent / uptime, 3)} | snap
+
+def dispatch_once() -> int:
+    """Envia um lote de mensagens 'queued' e retorna quantas foram enviadas com sucesso."""
+    dispatcher = OutboxDispatcher()
+    try:
+        return dispatcher.run_once()["sent"]
+    finally:
+        dispatcher.close()
+
+def main() -> None:
+    """Roda o dispatcher standalone até SIGINT/SIGTERM."""
+    from ..core.di import bootstrap_di
+    bootstrap_di()
+    dispatcher = OutboxDispatcher().start()
+    try:
+        while True:
+            time.sleep(60)
+            stats = dispatcher.stats()
+            log.info("dispatcher_stats", uptime_s=stats["uptime_s"], msgs_per_s=stats["msgs_per_s"])
+    except KeyboardInterrupt:
+        pass
+    finally:
+        dispatcher.stop()
+
+if __name__ == "__main__":
+    main()
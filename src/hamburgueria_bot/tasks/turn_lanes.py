@@ -0,0 +1,168 @@
+
+"""Agendador de turnos por conversa (modelo de atores): nenhuma conversa roda dois turnos ao mesmo tempo.
+
+- ``HB_TURN_LANES`` filas de uma thread cada; a conversa vai sempre para a fila ``_hash64(conversation_id) % N``.
+  Turnos da mesma conversa ficam em série; conversas diferentes correm em paralelo nas outras filas.
+- Merge: pedido de turno para uma conversa que já tem turno *esperando* na fila entra nesse turno (os
+  chamadores recebem o mesmo resultado). A coalescência do turno lê todas as mensagens novas de uma vez, então
+  cada merge é uma execução de roteador + agente a menos (``turn_lanes.merged``).
+- Um turno lento segura a sua fila (head-of-line); dimensione ``HB_TURN_LANES`` como ``HB_TURN_WORKERS``.
+- ``HashRing``: anel de hash consistente (nós virtuais) que reparte conversas entre nós
+  (``HB_CLUSTER_NODES``/``HB_CLUSTER_NODE_ID``); o pool do modo async só busca conversas do próprio nó.
+- Métricas: ``turn_lanes.submitted``, ``turn_lanes.merged``, gauges ``turn_lanes.depth.<fila>``,
+  latência em ``turn_lanes.latency_ms``; ``stats()`` em ``GET /admin/turn-lanes``.
+"""
+from __future__ import annotations
+import bisect, contextvars, threading, time
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Sequence
+from ..core.coalesce import _hash64
+from ..core.logging import get_logger
+from ..core.metrics import metrics
+
+log = get_logger()
+
+class HashRing:
+    """Anel de hash consistente: cada nó ocupa ``vnodes`` pontos; a chave pertence ao próximo ponto no anel."""
+    def __init__(self, nodes: Sequence[str] = (), vnodes: int = 64):
+        self.vnodes = vnodes
+        self._points: List[int] = []
+        self._owners: List[str] = []
+        for n in nodes:
+            self.add(n)
+
+    def add(self, node: str) -> None:
+        for i in range(self.vnodes):
+            p = _hash64(f"{node}#{i}")
+            j = bisect.bisect_left(self._points, p)
+            self._points.insert(j, p)
+            self._owners.insert(j, node)
+
+    def remove(self, node: str) -> None:
+        keep = [(p, o) for p, o in zip(self._points, self._owners) if o != node]
+        self._points = [p for p, _ in keep]
+        self._owners = [o for _, o in keep]
+
+    @property
+    def nodes(self) -> List[str]:
+        return sorted(set(self._owners))
+
+    def owner(self, key: str) -> str | None:
+        if not self._points:
+            return None
+        i = bisect.bisect_right(self._points, _hash64(key)) % len(self._points)
+        return self._owners[i]
+
+@dataclass
+class _Job:
+    conversation_id: str
+    wa_id: str
+    kwargs: Dict[str, Any]
+    ctx: contextvars.Context
+    futures: List[Future] = field(default_factory=list)
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+class _Lane:
+    def __init__(self, index: int):
+        self.index = index
+        self.queue: Deque[_Job] = deque()
+        self.waiting: Dict[str, _Job] = {}  # conversa → turno ainda não iniciado (alvo do merge)
+        self.cv = threading.Condition()
+        self.thread: threading.Thread | None = None
+
+class TurnLanes:
+    """Filas de uma thread por fatia de conversas (ver docstring do módulo)."""
+    def __init__(self, lanes: int, runner: Callable[..., Dict[str, Any]] | None = None):
+        if runner is None:
+            from ..adk.pipeline import run_turn
+            runner = run_turn
+        self.runner = runner
+        self._lanes = [_Lane(i) for i in range(max(1, lanes))]
+        self._stop = False
+
+    # ---------- ciclo de vida ----------
+    def start(self) -> "TurnLanes":
+        for lane in self._lanes:
+            lane.thread = threading.Thread(target=self._loop, args=(lane,), name=f"lane-{lane.index}", daemon=True)
+            lane.thread.start()
+        log.info("turn_lanes_started", lanes=len(self._lanes))
+        return self
+
+    def stop(self, wait: bool = True) -> None:
+        self._stop = True
+        for lane in self._lanes:
+            with lane.cv:
+                lane.cv.notify_all()
+        if wait:
+            for lane in self._lanes:
+                if lane.thread:
+                    lane.thread.join(timeout=5)
+        log.info("turn_lanes_stopped")
+
+    # ---------- API ----------
+    def lane_of(self, conversation_id: str) -> int:
+        return _hash64(conversation_id) % len(self._lanes)
+
+    def submit(self, conversation_id: str, wa_id: str, **kwargs: Any) -> Future:
+        """Agenda um turno (argumentos de ``run_turn``); junta-se ao turno em espera da conversa, se houver."""
+        fut: Future = Future()
+        lane = self._lanes[self.lane_of(conversation_id)]
+        with lane.cv:
+            job = lane.waiting.get(conversation_id)
+            if job is not None and job.kwargs.get("simulate") == kwargs.get("simulate"):
+                job.futures.append(fut)
+                metrics.incr("turn_lanes.merged")
+                return fut
+            job = _Job(conversation_id, wa_id, kwargs, contextvars.copy_context(), [fut])
+            lane.waiting[conversation_id] = job
+            lane.queue.append(job)
+            metrics.gauge(f"turn_lanes.depth.{lane.index}", len(lane.queue))
+            lane.cv.notify()
+        metrics.incr("turn_lanes.submitted")
+        return fut
+
+    def run(self, conversation_id: str, wa_id: str, **kwargs: Any) -> Dict[str, Any]:
+        """``submit`` + espera o resultado (caminho síncrono do webhook)."""
+        return self.submit(conversation_id, wa_id, **kwargs).result()
+
+    # ---------- execução ----------
+    def _loop(self, lane: _Lane) -> None:
+        while True:
+            with lane.cv:
+                while not lane.queue and not self._stop:
+                    lane.cv.wait()
+                if not lane.queue:
+                    return
+                job = lane.queue.popleft()
+                if lane.waiting.get(job.conversation_id) is job:
+                    del lane.waiting[job.conversation_id]
+                metrics.gauge(f"turn_lanes.depth.{lane.index}", len(lane.queue))
+            metrics.observe("turn_lanes.queue_wait_ms", (time.perf_counter() - job.enqueued_at) * 1000)
+            self._execute(job)
+
+    def _execute(self, job: _Job) -> None:
+        t0 = time.perf_counter()
+        try:
+            res = job.ctx.run(self.runner, job.conversation_id, job.wa_id, **job.kwargs)
+        except Exception as e:
+            log.info("turn_lane_error", conversation_id=job.conversation_id, error=str(e))
+            for f in job.futures:
+                f.set_exception(e)
+        else:
+            if len(job.futures) > 1:
+                log.info("turn_lane_merged", conversation_id=job.conversation_id, callers=len(job.futures))
+            for f in job.futures:
+                f.set_result(res)
+        finally:
+            metrics.observe("turn_lanes.latency_ms", (time.perf_counter() - t0) * 1000)
+
+    def stats(self) -> Dict[str, Any]:
+        """Profundidade por fila e turnos economizados por merge."""
+        depths = []
+        for lane in self._lanes:
+            with lane.cv:
+                depths.append(len(lane.queue))
+        return {"lanes": len(self._lanes), "depths": depths,
+                "submitted": metrics.counter("turn_lanes.submitted"), "merged": metrics.counter("turn_lanes.merged")}
@@ -0,0 +1,15 @@
+
+"""``TurnSignals`` (porta do pipeline, ``ports/interfaces.py``) para os serviços embutidos deste processo."""
+from __future__ import annotations
+from kink import di
+from .outbox_dispatcher import OutboxDispatcher
+from .memory_summarizer import request_summary
+
+class BackgroundSignals:
+    """Acorda o dispatcher do outbox e pede resumos ao summarizer, quando rodam neste processo."""
+    def outbox_enqueued(self, conversation_id: str) -> None:
+        if OutboxDispatcher in di:
+            di[OutboxDispatcher].notify()
+
+    def summary_due(self, conversation_id: str) -> None:
+        request_summary(conversation_id)
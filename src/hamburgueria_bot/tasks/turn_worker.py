@@ -0,0 +1,181 @@
+
+"""Pool de workers de turno (modo de ingestão ``async``).
+
+- O webhook apenas verifica, normaliza e grava na inbox; este pool busca conversas com inbox
+  ainda não consumida por turno e executa ``run_turn`` (coalescência → roteador → agente → outbox).
+- Exclusão por conversa: conjunto local de conversas em voo + advisory lock no Postgres
+  (chave ``turn:<conversation_id>``), permitindo vários processos de worker em paralelo.
+- Vários nós: com ``HB_CLUSTER_NODES``/``HB_CLUSTER_NODE_ID`` o pool só pega conversas que o anel de hash
+  consistente (``tasks/turn_lanes.HashRing``) atribui a este nó, em vez de disputar o advisory lock.
+- Contadores por worker (turnos, erros, latência, throughput) via ``core.metrics``.
+
+Execução standalone (um processo por instância; cada um com ``HB_TURN_WORKERS`` threads):
+    python -m hamburgueria_bot.tasks.turn_worker
+"""
+from __future__ import annotations
+import threading, time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+from sqlalchemy import text
+from kink import di
+from ..core.settings import Settings
+from ..core.coalesce import _hash64
+from ..core.logging import get_logger, set_trace_id
+from ..core.metrics import metrics
+from ..repo import repo
+from ..adk.pipeline import run_turn
+from .turn_lanes import HashRing
+
+log = get_logger()
+
+@contextmanager
+def _turn_lock(conversation_id: str) -> Iterator[bool]:
+    """Advisory lock de sessão por conversa durante o turno. Cede ``False`` se outro processo detém.
+
+    Lock e unlock na mesma conexão (fora do pool durante o turno, em autocommit para não deixar transação
+    aberta); se o unlock falhar, a conexão é invalidada — fechar a sessão do Postgres solta o lock.
+    """
+    engine = di["session_factory"].kw["bind"]
+    key = _hash64(f"turn:{conversation_id}")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        got = bool(conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": key}).scalar())
+        try:
+            yield got
+        finally:
+            if got:
+                try:
+                    conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": key})
+                except Exception as e:
+                    log.info("turn_unlock_failed", conversation_id=conversation_id, error=str(e))
+                    conn.invalidate()
+
+class TurnWorkerPool:
+    """Pool de threads que processa turnos de conversas pendentes."""
+    def __init__(self, size: int | None = None, poll_interval_ms: int | None = None):
+        settings: Settings = di[Settings]
+        self.size = size or settings.turn_workers
+        self.poll_interval_s = (poll_interval_ms or settings.turn_poll_interval_ms) / 1000.0
+        self.horizon_s = settings.turn_pending_horizon_s
+        nodes = [n.strip() for n in settings.cluster_nodes.split(",") if n.strip()]
+        self.node_id = settings.cluster_node_id
+        self.ring = HashRing(nodes) if nodes and self.node_id else None
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="turn")
+        self._inflight: set[str] = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._poller: threading.Thread | None = None
+        self._started_at = time.time()
+
+    # ---------- ciclo de vida ----------
+    def start(self) -> "TurnWorkerPool":
+        self._started_at = time.time()
+        self._poller = threading.Thread(target=self._poll_loop, name="turn-poller", daemon=True)
+        self._poller.start()
+        log.info("turn_pool_started", size=self.size)
+        return self
+
+    def stop(self, wait: bool = True) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._poller:
+            self._poller.join(timeout=5)
+        self._executor.shutdown(wait=wait)
+        log.info("turn_pool_stopped")
+
+    def notify(self) -> None:
+        """Acorda o poller imediatamente (chamado pelo webhook após gravar a inbox)."""
+        self._wake.set()
+
+    # ---------- polling ----------
+    def _poll_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.poll_once()
+            except Exception as e:
+                log.info("turn_poll_error", error=str(e))
+            self._wake.wait(self.poll_interval_s)
+            self._wake.clear()
+
+    def poll_once(self) -> int:
+        """Submete conversas pendentes que não estão em voo. Retorna quantas foram submetidas."""
+        with self._lock:
+            free = self.size - len(self._inflight)
+        if free <= 0:
+            return 0
+        share = len(self.ring.nodes) if self.ring is not None else 1
+        pending = repo.list_pending_conversations(limit=self.size * 2 * share, horizon_s=self.horizon_s)
+        submitted = 0
+        for p in pending:
+            cid = p["conversation_id"]
+            if self.ring is not None and self.ring.owner(cid) != self.node_id:
+                continue
+            with self._lock:
+                if cid in self._inflight or len(self._inflight) >= self.size:
+                    continue
+                self._inflight.add(cid)
+            self._executor.submit(self._run, cid, p["wa_id"], p["max_inbox_id"])
+            submitted += 1
+        return submitted
+
+    # ---------- execução ----------
+    def _run(self, conversation_id: str, wa_id: str, max_inbox_id: int) -> None:
+        worker = threading.current_thread().name
+        set_trace_id()
+        t0 = time.perf_counter()
+        try:
+            with _turn_lock(conversation_id) as got:
+                if not got:
+                    metrics.incr(f"turn_worker.{worker}.skipped_locked")
+                    return
+                # O turno marca ``max_inbox_id`` como consumido no seu flush, mesmo sem enfileirar.
+                res = run_turn(conversation_id, wa_id, consumed_inbox_id=max_inbox_id)
+            metrics.incr(f"turn_worker.{worker}.turns")
+            metrics.incr(f"turn_worker.status.{res['status']}")
+        except Exception as e:
+            metrics.incr(f"turn_worker.{worker}.errors")
+            log.info("turn_error", conversation_id=conversation_id, error=str(e))
+        finally:
+            metrics.observe(f"turn_worker.{worker}.latency_ms", (time.perf_counter() - t0) * 1000)
+            with self._lock:
+                self._inflight.discard(conversation_id)
+            self._wake.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores por worker: turnos, erros, latência e throughput (turnos/s desde o start)."""
+        snap = metrics.snapshot("turn_worker.")
+        uptime = max(time.time() - self._started_at, 1e-9)
+        workers: Dict[str, Dict[str, Any]] = {}
+        for name, h in snap["histograms"].items():
+            worker = name.split(".")[1]
+            turns = snap["counters"].get(f"turn_worker.{worker}.turns", 0)
+            workers[worker] = {
+                "turns": turns,
+                "errors": snap["counters"].get(f"turn_worker.{worker}.errors", 0),
+                "latency": h,
+                "throughput_tps": round(turns / uptime, 3),
+            }
+        with self._lock:
+            inflight = len(self._inflight)
+        return {"size": self.size, "inflight": inflight, "uptime_s": round(uptime, 1), "workers": workers}
+
+def main() -> None:
+    """Roda o pool standalone até SIGINT/SIGTERM."""
+    from ..core.di import bootstrap_di
+    bootstrap_di()
+    if di[Settings].ctx_summarizer_embedded:
+        from .memory_summarizer import MemorySummarizer
+        di[MemorySummarizer] = MemorySummarizer().start()
+    pool = TurnWorkerPool().start()
+    try:
+        while True:
+            time.sleep(60)
+            log.info("turn_pool_stats", **pool.stats())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.stop()
+
+if __name__ == "__main__":
+    main()